@@ -6,11 +6,33 @@ from flask_login import LoginManager
 from flask_dropzone import Dropzone
 from flask_wtf.csrf import CSRFProtect, CSRFError
 from flask_moment import Moment
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from .cache import UserCache, FeedCache, SuggestionCache
+from .last_seen import LastSeen
+from .passwords import PasswordHasher, HasherBusy
+from .throttle import LoginThrottle
+from .pool import PoolMonitor
+from .queries import QueryCounter
+from .metrics import Metrics
+from .slow_queries import SlowQueryLog
+from .profiler import SamplingProfiler, profile_token_command
 
 lm = LoginManager()
 dz = Dropzone()
 csrf = CSRFProtect()
 moment = Moment()
+last_seen = LastSeen()
+user_cache = UserCache()
+feed_cache = FeedCache()
+suggestion_cache = SuggestionCache()
+hasher = PasswordHasher()
+throttle = LoginThrottle()
+pool_monitor = PoolMonitor()
+query_counter = QueryCounter()
+metrics = Metrics()
+slow_query_log = SlowQueryLog()
+profiler = SamplingProfiler()
 
 
 def create_app():
@@ -31,17 +53,47 @@ def create_app():
         print('Created user upload directory:',
               app.config['UPLOAD_FOLDER'])
 
-    toolbar = DebugToolbarExtension(app)
+    # trust X-Forwarded-For from the router so request.remote_addr is the client
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+    # the toolbar is for local development only, production requests are profiled with the sampling profiler
+    if app.debug:
+        DebugToolbarExtension(app)
 
-    # initialize SQLalchemy
-    from .models import db
+    # initialize SQLalchemy, after the pool monitor sets the pool class
+    pool_monitor.init_app(app)
+    from .models import db, events, recount_command, import_vehicles_command, sync_feeds_command
     db.init_app(app)
+    events.init_app(app)
+    query_counter.init_app(app)
+    metrics.init_app(app)
+    slow_query_log.init_app(app)
+    app.cli.add_command(recount_command)
+    app.cli.add_command(import_vehicles_command)
+    app.cli.add_command(sync_feeds_command)
+
+    from .migrations import upgrade, upgrade_command, check_indexes_command
+    app.cli.add_command(upgrade_command)
+    app.cli.add_command(check_indexes_command)
 
     lm.login_view = 'root.login'
     lm.init_app(app)
     dz.init_app(app)
     csrf.init_app(app)
     moment.init_app(app)
+    last_seen.init_app(app)
+    user_cache.init_app(app)
+    feed_cache.init_app(app)
+    suggestion_cache.init_app(app)
+    hasher.init_app(app)
+    throttle.init_app(app)
+    profiler.init_app(app)
+    app.cli.add_command(profile_token_command)
+    metrics.track_cache('user', user_cache)
+    metrics.track_cache('feed', feed_cache)
+    metrics.track_cache('autocomplete', suggestion_cache)
 
     with app.app_context():
 
@@ -49,13 +101,26 @@ def create_app():
         def handle_csrf_error(e):
             return e.description, 400
 
+        @app.errorhandler(HasherBusy)
+        def handle_hasher_busy(e):
+            return 'Server busy, please try again shortly', 503, {'Retry-After': '1'}
+
         from .blueprints.root import bp as root_bp
         from .blueprints.project import bp as project_bp
         from .blueprints.profile import bp as profile_bp
+        from .blueprints.catalog import bp as catalog_bp
+        from .blueprints.internal import bp as internal_bp
 
         app.register_blueprint(root_bp, url_prefix='/')
         app.register_blueprint(profile_bp, url_prefix='/u')
         app.register_blueprint(project_bp, url_prefix='/p')
+        app.register_blueprint(catalog_bp, url_prefix='/catalog')
+        app.register_blueprint(internal_bp, url_prefix='/_internal')
 
         db.create_all()
+        if app.config['MIGRATE_ON_START']:
+            upgrade(db.engine)
+        # workers boot without --preload, so each one fills its own pools before taking traffic
+        pool_monitor.prewarm(
+            db.engines, app.config['SQLALCHEMY_POOL_PREWARM'])
         return app
@@ -0,0 +1,8 @@
+''' Blueprint for vehicle catalog lookups '''
+# app > catalog > __init__.py
+
+from flask import Blueprint
+
+bp = Blueprint('catalog', __name__)
+
+from . import routes
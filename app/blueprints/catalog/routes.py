@@ -0,0 +1,48 @@
+# app > catalog > routes.py
+from flask import current_app, request, jsonify, abort
+
+from . import bp
+from app.models.vehicles import Vehicle
+
+
+def catalog_response(**payload):
+    '''Returns payload as JSON with an ETag and a long lived public Cache-Control, or 304 if the ETag matches'''
+    resp = jsonify(payload)
+    resp.add_etag()
+    resp.cache_control.public = True
+    resp.cache_control.max_age = current_app.config['CATALOG_MAX_AGE']
+    return resp.make_conditional(request)
+
+
+def get_year():
+    year = request.args.get('year', type=int)
+    if year is None:
+        abort(400)
+    return year
+
+
+@bp.route('/years')
+def years():
+    '''Every catalog year, newest first'''
+    return catalog_response(years=Vehicle.get_years())
+
+
+@bp.route('/makes')
+def makes():
+    '''Makes sold in the year query param'''
+    return catalog_response(makes=[{'id': make_id, 'display': make}
+                                   for make_id, make in Vehicle.get_makes(get_year())])
+
+
+@bp.route('/models')
+def models():
+    '''Models of the make query param sold in the year query param'''
+    return catalog_response(models=Vehicle.get_models(get_year(), request.args.get('make', '')))
+
+
+@bp.route('/trims')
+def trims():
+    '''Trims of a year, make and model with their specs converted to the units projects use'''
+    vehicles = Vehicle.get_trims(get_year(), request.args.get('make', ''),
+                                 request.args.get('model', ''))
+    return catalog_response(trims=[vehicle.to_dict() for vehicle in vehicles])
@@ -0,0 +1,8 @@
+''' Blueprint for operational endpoints that are not part of the site '''
+# app > internal > __init__.py
+
+from flask import Blueprint
+
+bp = Blueprint('internal', __name__, template_folder='templates')
+
+from . import routes
@@ -0,0 +1,22 @@
+# app > internal > routes.py
+from flask import jsonify, render_template
+
+from . import bp
+from app import pool_monitor, slow_query_log
+from app.models import db
+from app.utils import admin_required, internal_only
+
+
+@bp.route('/pool')
+@internal_only
+def pool():
+    '''Live connection pool stats for this worker, per database bind'''
+    return jsonify(pool_monitor.stats(db.engines))
+
+
+@bp.route('/slow-queries')
+@admin_required
+def slow_queries():
+    '''The newest entries of the slow query log'''
+    return render_template('slow_queries.html', entries=slow_query_log.entries(), enabled=slow_query_log.enabled,
+                           threshold=slow_query_log.app.config['SLOW_QUERY_THRESHOLD'])
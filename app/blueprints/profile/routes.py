@@ -1,11 +1,14 @@
 # app > profile > routes.py
 
 from sqlalchemy.exc import NoResultFound, IntegrityError
-from flask import render_template, redirect, g, url_for, abort, flash
+from flask import render_template, redirect, request, g, url_for, abort, flash, jsonify
 from flask_login import login_required, current_user
 
 from app.models.users import User
+from app.models.projects import Project
 from app.forms import UserEdit
+from app import feed_cache
+from app.utils import wants_json
 
 from . import bp
 
@@ -30,7 +33,13 @@ def show(username):
     # return 403 is profile is private and the current_user is not the owner
     if g.user.private.value == 'PRIVATE' and g.owner is False:
         abort(404)
-    return render_template('profile.html')
+
+    projects = Project.get_listing(g.user.pk, include_private=g.owner)
+    followed = set()
+    if g.get('current_user') and not g.owner:
+        followed = g.current_user.following_among(
+            project.pk for project in projects)
+    return render_template('profile.html', projects=projects, followed=followed)
 
 
 @bp.route('/edit', methods=['GET', 'POST'])
@@ -70,3 +79,17 @@ def edit():
 @login_required
 def show_following():
     return render_template('profile_following.html')
+
+
+@bp.route('/feed')
+@login_required
+def feed():
+    '''Activity feed of the projects the current user follows. Script requests for later pages get JSON'''
+    try:
+        items, cursor = feed_cache.get_page(
+            current_user, cursor=request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    if wants_json():
+        return jsonify(html=render_template('feed_list.html', items=items), cursor=cursor)
+    return render_template('profile_feed.html', items=items, cursor=cursor)
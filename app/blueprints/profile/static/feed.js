@@ -0,0 +1,23 @@
+async function loadFeed(e) {
+  // Appends the next page of the feed and advances the button's cursor
+  const btn = $(e.currentTarget);
+  btn.prop("disabled", true);
+  const res = await axios.get(btn.data("url"), {
+    params: { cursor: btn.data("cursor") },
+    headers: { Accept: "application/json" },
+  });
+  $("#feed-list").append($.parseHTML(res.data.html));
+  if (typeof flask_moment_render_all === "function") {
+    flask_moment_render_all();
+  }
+
+  if (!res.data.cursor) {
+    btn.remove();
+    return;
+  }
+  btn.data("cursor", res.data.cursor).prop("disabled", false);
+}
+
+$(document).ready(() => {
+  $("#feed-more").on("click", loadFeed);
+});
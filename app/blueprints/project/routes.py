@@ -1,14 +1,16 @@
 # app > project > route.py
 import os
 from sqlalchemy.exc import NoResultFound
-from flask import current_app, render_template, request, redirect, url_for, g, flash, abort
+from flask import current_app, render_template, request, redirect, url_for, g, flash, abort, jsonify
 from flask_login import current_user, login_required
 
 from . import bp
-from app.models.projects import Project, Update, Comment
+from app import feed_cache
+from app.models.projects import Project, Update, Comment, ModConflict
 from app.models.images import ProjectPicture
+from app.models.mixins import transaction
 from app.forms import NewProjectForm, EditProjectForm, AddModForm, UpdateForm, CommentForm
-from app.utils import owner_required, save_image_file, delete_image_file
+from app.utils import owner_required, save_image_file, delete_image_file, wants_json
 
 from app.bcolors import bcolors
 
@@ -17,7 +19,10 @@ from app.bcolors import bcolors
 def get_project_object(endpoint, values):
     '''Gets the project object from database and adds it and the users ownership status to flask global'''
     try:
-        g.project = Project.get_by_id(id=values['project_id'])
+        if endpoint == 'project.show':
+            g.project = Project.get_for_page(id=values['project_id'])
+        else:
+            g.project = Project.get_by_id(id=values['project_id'])
         g.owner = True if g.project.user == current_user else False
     except NoResultFound:
         abort(404)
@@ -59,7 +64,8 @@ def get_modal_form(project_id):
 
     if type == 'followers':
         title = 'Followers'
-        return render_template('modal_followers.html', title=title)
+        followers, cursor = g.project.get_followers_page()
+        return render_template('modal_followers.html', title=title, followers=followers, cursor=cursor)
 
     if type == 'editComment':
         if not current_user:
@@ -73,6 +79,17 @@ def get_modal_form(project_id):
     abort(400)
 
 
+@bp.route('/<project_id>/followers')
+def followers(project_id):
+    '''Returns the next page of a project's followers as HTML along with the cursor for the page after it'''
+    try:
+        followers, cursor = g.project.get_followers_page(
+            cursor=request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    return jsonify(html=render_template('follower_list.html', followers=followers), cursor=cursor)
+
+
 @bp.route('/<project_id>')
 def show(project_id):
     '''Retreives the page for the project car if found and if the requesting client has access to the page.'''
@@ -83,7 +100,34 @@ def show(project_id):
     except AttributeError:
         comment_form = None
 
-    return render_template('project.html', comment_form=comment_form)
+    updates, updates_cursor = Update.get_page(g.project.pk)
+    comments, comments_cursor = Comment.get_page(g.project.pk)
+
+    return render_template('project.html', comment_form=comment_form,
+                           updates=updates, updates_cursor=updates_cursor,
+                           comments=comments, comments_cursor=comments_cursor)
+
+
+@bp.route('/<project_id>/updates')
+def updates(project_id):
+    '''Returns the next page of a project's updates as HTML along with the cursor for the page after it'''
+    try:
+        updates, cursor = Update.get_page(
+            g.project.pk, cursor=request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    return jsonify(html=render_template('update_list.html', updates=updates), cursor=cursor)
+
+
+@bp.route('/<project_id>/comments')
+def comments(project_id):
+    '''Returns the next page of a project's comments as HTML along with the cursor for the page after it'''
+    try:
+        comments, cursor = Comment.get_page(
+            g.project.pk, cursor=request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    return jsonify(html=render_template('comment_list.html', comments=comments), cursor=cursor)
 
 
 @bp.route('/new', methods=['GET', 'POST'])
@@ -146,52 +190,59 @@ def edit(project_id):
     return render_template('project_edit.html', form=form, user=current_user)
 
 
-@bp.route('/<project_id>/add-follow')
+@bp.route('/<project_id>/add-follow', methods=['POST'])
 @login_required
 def add_follow(project_id):
-    '''Route to add a project to a users following list'''
-    try:
-        g.project.add_follow(user=current_user)
-        flash(f'Now following {g.project.name}', 'info')
-    except:
-        flash('Error occured', 'error')
-        abort(500)
-    return redirect(request.referrer)
+    '''Route to add a project to a users following list. Returns JSON to script requests'''
+    g.project.add_follow(user=current_user)
+    # dropped only once the follow is committed, so a concurrent request can't cache the old follow set
+    feed_cache.invalidate(current_user)
+    if wants_json():
+        return jsonify(following=True, followers=g.project.follower_count)
+
+    flash(f'Now following {g.project.name}', 'info')
+    return redirect(request.referrer or url_for('project.show', project_id=project_id))
 
 
-@bp.route('/<project_id>/remove-follow')
+@bp.route('/<project_id>/remove-follow', methods=['POST'])
 @login_required
 def remove_follow(project_id):
-    '''Route to remove a project to a users following list'''
-    try:
-        g.project.remove_follow(user=current_user)
-        flash(f'No longer following {g.project.name}', 'info')
-    except:
-        flash('Error occured', 'error')
-        abort(500)
+    '''Route to remove a project from a users following list. Returns JSON to script requests'''
+    g.project.remove_follow(user=current_user)
+    feed_cache.invalidate(current_user)
+    if wants_json():
+        return jsonify(following=False, followers=g.project.follower_count)
 
-    return redirect(request.referrer)
+    flash(f'No longer following {g.project.name}', 'info')
+    return redirect(request.referrer or url_for('project.show', project_id=project_id))
 
 
 @bp.route('/<project_id>/add-picture', methods=['POST'])
 @owner_required
 def add_picture(project_id):
-    '''Route to add a picture to a users project'''
+    '''Route to add one or more pictures to a users project'''
     ip = request.remote_addr
-    file = request.files['file']
+    files = [file for key in request.files for file in request.files.getlist(key)]
+    if not files:
+        abort(400)
 
-    image = ProjectPicture.create(
-        filename=file.filename, project=g.project, ip=ip)
-    save_image_file(
-        file=file,
-        fn=image.filename,
-        path=os.path.join(
-            current_app.config['UPLOAD_FOLDER'], 'project_pictures'),
-        tb_size=(350, 350))
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'project_pictures')
+    saved = []
+    # a failed save rolls back every picture in the batch, along with the files already written for it
+    try:
+        with transaction():
+            for file in files:
+                image = ProjectPicture.create(
+                    filename=file.filename, project=g.project, ip=ip)
+                saved.append(image.filename)
+                save_image_file(file=file, fn=image.filename,
+                                path=path, tb_size=(350, 350))
+    except Exception:
+        for fn in saved:
+            delete_image_file(path=path, fn=fn)
+        raise
 
-    if image:
-        return 'Success', 200
-    abort(500)
+    return 'Success', 200
 
 
 @bp.route('/<project_id>/<picture_id>/delete')
@@ -230,11 +281,13 @@ def add_mod(project_id):
 @bp.route('/<project_id>/delete-mod/<int:index>', methods=['DELETE'])
 @owner_required
 def delete_mod(project_id, index):
-    '''Route to delete a mod from a project's mod list'''
+    '''Route to delete a mod from a project's mod list. Takes the expected mod text in the 'mod' query param'''
     try:
-        g.project.delete_mod(index=index)
+        g.project.delete_mod(index=index, expected=request.args.get('mod'))
     except IndexError:
         abort(404)
+    except ModConflict:
+        abort(409)
     return 'Success', 200
 
 
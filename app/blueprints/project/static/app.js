@@ -4,12 +4,20 @@ const USER_INPUTS = $("#updates, #comments, #mods");
 async function deleteMod(e) {
   const index = $(e.target).data("index");
   const url = `${postPath}/delete-mod/${index}`;
-  const res = await axiosCSRF.delete(url);
 
-  if (res.status == 200) {
+  try {
+    await axiosCSRF.delete(url, { params: { mod: $(e.target).attr("data-mod") } });
     $(e.target).parent().remove();
-  } else {
-    console.error("Error deleting mod. ", res.status);
+    $("#mods button").each((i, btn) => {
+      $(btn).data("index", i);
+    });
+  } catch (err) {
+    // 404 and 409 mean the list changed since the page loaded, so indexes on the page are stale
+    if (err.response && [404, 409].includes(err.response.status)) {
+      location.reload();
+    } else {
+      console.error("Error deleting mod. ", err);
+    }
   }
 }
 
@@ -22,10 +30,10 @@ function confirmDelete(e) {
   }
 }
 
-function linkify() {
+function linkify(elements = USER_INPUTS) {
   // Turns plaintext links into anchor tags
   const regex = /(\b((https?:\/\/)|(www\.))[-A-Z0-9+&@#\/%?=~_|!:,.;]*[-A-Z0-9+&@#\/%=~_|])/gi;
-  USER_INPUTS.each((i, element) => {
+  elements.each((i, element) => {
     $(element).html(function (i, html) {
       return html.replace(regex, function (link, i, i, http) {
         return `<a href="${!http ? "http://" : ""}${link}" rel="nofollow noreferrer">${link}</a>`;
@@ -34,6 +42,60 @@ function linkify() {
   });
 }
 
+// Clicks "load more" buttons marked data-autoload as they scroll into view
+const autoloader = new IntersectionObserver((entries) => {
+  entries.filter((entry) => entry.isIntersecting).forEach((entry) => $(entry.target).click());
+});
+
+async function loadMore(e) {
+  // Appends the next page of a list and advances the button's cursor
+  const btn = $(e.currentTarget);
+  if (btn.prop("disabled")) {
+    return;
+  }
+  btn.prop("disabled", true);
+  const res = await axiosCSRF.get(btn.data("url"), {
+    params: { cursor: btn.data("cursor") },
+  });
+  const items = $($.parseHTML(res.data.html)).filter("*");
+
+  $(btn.data("target")).append(items);
+  linkify(items);
+  if (typeof flask_moment_render_all === "function") {
+    flask_moment_render_all();
+  }
+
+  if (!res.data.cursor) {
+    autoloader.unobserve(btn[0]);
+    btn.remove();
+    return;
+  }
+  btn.data("cursor", res.data.cursor).prop("disabled", false);
+  if (btn.is("[data-autoload]")) {
+    // observing again reports whether the button is still in view after the new items
+    autoloader.unobserve(btn[0]);
+    autoloader.observe(btn[0]);
+  }
+}
+
+async function toggleFollow(e) {
+  // Follows or unfollows without reloading the page
+  e.preventDefault();
+  const btn = $(e.currentTarget);
+  const form = btn.closest("form");
+  const res = await axiosCSRF.post(form.attr("action"), null, {
+    headers: { Accept: "application/json" },
+  });
+  const following = res.data.following;
+
+  btn
+    .text(following ? "Following" : "Follow")
+    .toggleClass("btn-outline-success", following)
+    .toggleClass("btn-success", !following);
+  form.attr("action", btn.data(following ? "remove-url" : "add-url"));
+  $("#follower-count").text(res.data.followers);
+}
+
 async function populateModal(e) {
   const type = $(e.relatedTarget).data("modal-type");
   const updateId = $(e.relatedTarget).data("update-id");
@@ -48,6 +110,7 @@ async function populateModal(e) {
     },
   });
   modalContent.html(res.data);
+  modalContent.find(".load-more[data-autoload]").each((i, btn) => autoloader.observe(btn));
 }
 
 function start() {
@@ -55,6 +118,8 @@ function start() {
 
   $("#mods").on("click", "button", deleteMod);
   $(".delete-pic").on("click", confirmDelete);
+  $(document).on("click", ".load-more", loadMore);
+  $("#follow-toggle").on("click", toggleFollow);
 
   $("#addModModal").on("hidden.bs.modal", () => {
     location.reload();
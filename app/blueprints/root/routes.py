@@ -2,23 +2,25 @@
 from functools import wraps
 
 from sqlalchemy.exc import IntegrityError, NoResultFound
-from flask import current_app as app, render_template, redirect, url_for, flash, request, g
+from flask import current_app as app, Response, render_template, redirect, url_for, flash, request, g, abort, jsonify
 from flask_login import current_user, login_required, login_user, logout_user
 
 from . import bp
-from app import lm
+from app import lm, last_seen, user_cache, throttle, suggestion_cache, metrics
 from app.forms import SignupForm, LoginForm
 from app.models.users import User
+from app.models.search import search_projects, search_updates
+from app.utils import wants_json, internal_only
 
 from app.bcolors import bcolors
 
 
 @lm.user_loader
 def load_user(user_id):
-    '''Get logged in user before request. Also adds user to flask global and updates last login time for user'''
+    '''Get logged in user before request. Also adds user to flask global and records last login time for user'''
     try:
-        user = User.get_by_id(user_id)
-        user.update_login_time()
+        user = user_cache.get_user(user_id)
+        last_seen.record(user)
         g.current_user = user
     except NoResultFound:
         g.current_user = None
@@ -86,6 +88,10 @@ def login():
     form = LoginForm()
 
     if form.validate_on_submit():
+        if not throttle.allow(ip=request.remote_addr, username=form.username.data):
+            flash('Too many login attempts, please try again later', 'danger')
+            return render_template('home_form.html', form=form, signup=False), 429
+
         try:
             user = User.authenticate(username=form.username.data,
                                      password=form.password.data)
@@ -109,3 +115,52 @@ def logout():
     setattr(g, 'current_user', None)
     flash('Successfully logged out')
     return redirect(url_for('root.homepage'))
+
+
+SEARCHES = {'projects': search_projects, 'updates': search_updates}
+
+
+@bp.route('/search')
+def search():
+    '''Ranked full text search over projects or updates. Script requests for later pages get JSON'''
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'projects')
+    if kind not in SEARCHES:
+        abort(400)
+
+    results, cursor = [], None
+    if q:
+        viewer_pk = current_user.pk if current_user.is_authenticated else None
+        try:
+            results, cursor = SEARCHES[kind](
+                q, viewer_pk=viewer_pk, cursor=request.args.get('cursor'))
+        except ValueError:
+            abort(400)
+
+    if wants_json():
+        return jsonify(html=render_template('search_list.html', results=results, kind=kind), cursor=cursor)
+    return render_template('search.html', results=results, cursor=cursor, q=q, kind=kind)
+
+
+@bp.route('/autocomplete/<field>')
+def autocomplete(field):
+    '''Returns JSON suggestions for the q query param in one of makes, models, mods or usernames'''
+    try:
+        suggestions = suggestion_cache.suggest(field, request.args.get('q', ''))
+    except KeyError:
+        abort(404)
+    resp = jsonify(suggestions=suggestions)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = app.config['AUTOCOMPLETE_CACHE_TTL']
+    return resp
+
+
+@bp.route('/metrics')
+@internal_only
+def prometheus_metrics():
+    '''Request latency, cache and login throttle metrics for every worker in the Prometheus text format'''
+    if not metrics.enabled:
+        abort(404)
+    login_attempts = [('modlog_login_attempts_total', (('result', result),), count)
+                      for result, count in throttle.counters.items()]
+    return Response(metrics.render(extra=login_attempts), mimetype='text/plain; version=0.0.4')
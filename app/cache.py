@@ -0,0 +1,218 @@
+# app > cache.py
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class TTLCache(object):
+    '''Thread safe in-process LRU cache whose entries expire after ttl seconds'''
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        '''Returns the cached value for key or default if missing or expired'''
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        '''Caches value under key, evicting the least recently used entries over maxsize'''
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def stats(self):
+        '''Hit, miss and eviction counters along with the current size'''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+
+class UserCache(object):
+    '''Caches the logged in user's columns so the user loader can skip the database.
+
+    Entries are keyed by user id and a per-user version kept in a SQLite file at USER_CACHE_VERSIONS_DB, which
+    every worker on the host reads on each lookup. User.signup, User.edit and User.delete bump the version, so
+    every worker misses on its next lookup for that user and a deleted user is never rebuilt from the cache.
+    '''
+
+    def __init__(self, app=None):
+        self.app = None
+        self.cache = TTLCache(0)
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_SIZE', 1024)
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        app.config.setdefault('USER_CACHE_VERSIONS_DB', os.path.join(
+            tempfile.gettempdir(), 'modlog_user_versions.sqlite3'))
+        self.app = app
+        self.cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'],
+                              ttl=app.config['USER_CACHE_TTL'])
+        app.extensions['user_cache'] = self
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def _connect(self):
+        '''Returns a SQLite connection for this thread, creating the table on first use'''
+        path = self.app.config['USER_CACHE_VERSIONS_DB']
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.key == (os.getpid(), path):
+            return conn
+
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS versions (user_id TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        self._local.conn = conn
+        self._local.key = (os.getpid(), path)
+        return conn
+
+    def _version(self, user_id):
+        row = self._connect().execute(
+            'SELECT version FROM versions WHERE user_id = ?', (str(user_id),)).fetchone()
+        return row[0] if row else 0
+
+    def get_user(self, user_id):
+        '''Returns the user for user_id attached to the current db session. Raises NoResultFound'''
+        from .models import db
+        from .models.users import User
+
+        key = (user_id, self._version(user_id))
+        columns = self.cache.get(key)
+        if columns is None:
+            user = User.get_by_id(user_id)
+            self.cache.set(key, {attr.key: getattr(user, attr.key)
+                                 for attr in inspect(User).column_attrs})
+            return user
+
+        user = User(**columns)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def bump(self, user):
+        '''Invalidates cached copies of user in every worker'''
+        self.cache.pop((user.id, self._version(user.id)))
+        self._connect().execute('INSERT INTO versions (user_id, version) VALUES (?, 1) '
+                                'ON CONFLICT(user_id) DO UPDATE SET version = version + 1', (str(user.id),))
+
+
+class FeedCache(object):
+    '''Short lived cache of activity feed pages, keyed by user, cursor and page size.
+
+    The follow routes drop the user's first page in this worker after the follow commits. Other workers and later
+    pages catch up within FEED_CACHE_TTL seconds.
+    '''
+
+    def __init__(self, app=None):
+        self.cache = TTLCache(0)
+        self.per_page = 20
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEED_CACHE_SIZE', 512)
+        app.config.setdefault('FEED_CACHE_TTL', 30)
+        app.config.setdefault('FEED_PER_PAGE', 20)
+        app.config.setdefault('FEED_MATERIALIZE_THRESHOLD', 1000)
+        self.cache = TTLCache(maxsize=app.config['FEED_CACHE_SIZE'],
+                              ttl=app.config['FEED_CACHE_TTL'])
+        self.per_page = app.config['FEED_PER_PAGE']
+        app.extensions['feed_cache'] = self
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def get_page(self, user, cursor=None):
+        '''Returns (rows, next cursor) for a page of user's activity feed. Raises ValueError on a bad cursor'''
+        from .models.activity import get_feed_page
+
+        key = (user.pk, cursor, self.per_page)
+        page = self.cache.get(key)
+        if page is None:
+            page = get_feed_page(user.pk, cursor=cursor, per_page=self.per_page,
+                                 materialized=user.feed_materialized)
+            self.cache.set(key, page)
+        return page
+
+    def invalidate(self, user):
+        '''Drops the cached first page of user's feed'''
+        self.cache.pop((user.pk, None, self.per_page))
+
+
+class SuggestionCache(object):
+    '''Caches autocomplete suggestions by field and lowercased query, so the hottest prefixes skip the database'''
+
+    def __init__(self, app=None):
+        self.cache = TTLCache(0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTOCOMPLETE_CACHE_SIZE', 256)
+        app.config.setdefault('AUTOCOMPLETE_CACHE_TTL', 300)
+        self.cache = TTLCache(maxsize=app.config['AUTOCOMPLETE_CACHE_SIZE'],
+                              ttl=app.config['AUTOCOMPLETE_CACHE_TTL'])
+        app.extensions['suggestion_cache'] = self
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def suggest(self, field, q):
+        '''Returns suggestions for q in field. Raises KeyError for an unknown field'''
+        from .models.autocomplete import suggest
+
+        key = (field, q.strip().lower())
+        suggestions = self.cache.get(key)
+        if suggestions is None:
+            suggestions = suggest(field, q)
+            self.cache.set(key, suggestions)
+        return suggestions
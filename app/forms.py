@@ -67,14 +67,16 @@ class NewProjectForm(FlaskForm):
 class EditProjectForm(NewProjectForm, FlaskForm):
     '''Form for editing a project car'''
     year = IntegerField('Year', widget=TextInput())
-    make = StringField('Make', validators=[Length(max=40)])
-    model = StringField('Model', validators=[Length(max=40)])
+    make = StringField('Make', validators=[Length(max=40)], render_kw={
+                       'autocomplete': 'off', 'data-autocomplete': 'makes'})
+    model = StringField('Model', validators=[Length(max=40)], render_kw={
+                        'autocomplete': 'off', 'data-autocomplete': 'models'})
 
 
 class AddModForm(FlaskForm):
     '''Form for adding a mod to a project'''
     mod = StringField('Describe Mod', validators=[
-                      Length(max=50), InputRequired()], render_kw={'autocomplete': 'off'})
+                      Length(max=50), InputRequired()], render_kw={'autocomplete': 'off', 'data-autocomplete': 'mods'})
 
 
 class UpdateForm(FlaskForm):
@@ -0,0 +1,81 @@
+# app > last_seen.py
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, column, update, values
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class LastSeen(object):
+    '''Write-behind buffer for users' last_login time.
+
+    Activity is recorded in memory per worker and written to the database in one multi-row UPDATE,
+    at most once every LAST_SEEN_FLUSH_INTERVAL seconds per user. Pending times are flushed on worker exit.
+    '''
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._written = {}
+        self._last_flush = time.monotonic()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LAST_SEEN_FLUSH_INTERVAL', 60)
+        if self.app is None:
+            atexit.register(self.flush)
+        self.app = app
+        app.extensions['last_seen'] = self
+
+    @property
+    def interval(self):
+        return self.app.config['LAST_SEEN_FLUSH_INTERVAL']
+
+    def record(self, user):
+        '''Records activity for a user and flushes the buffer if the flush interval has passed'''
+        now = time.monotonic()
+        with self._lock:
+            if now - self._written.get(user.pk, float('-inf')) >= self.interval:
+                self._pending[user.pk] = datetime.utcnow()
+            due = now - self._last_flush >= self.interval
+        if due:
+            try:
+                self.flush()
+            except SQLAlchemyError:
+                self.app.logger.exception('Failed to flush last seen times')
+
+    def flush(self):
+        '''Writes every pending last_login time with a single UPDATE and clears the buffer'''
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            now = time.monotonic()
+            self._last_flush = now
+            self._written = {pk: written for pk, written in self._written.items()
+                             if now - written < self.interval}
+            for pk in pending:
+                self._written[pk] = now
+        if not pending or self.app is None:
+            return
+
+        from .models import db
+        from .models.users import User
+
+        rows = values(column('pk', Integer), column('last_login', DateTime),
+                      name='seen').data(list(pending.items()))
+        stmt = update(User.__table__).where(
+            User.__table__.c.pk == rows.c.pk).values(last_login=rows.c.last_login)
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(stmt)
+        except Exception:
+            # put the times back so the next flush retries them
+            with self._lock:
+                for pk, seen in pending.items():
+                    self._pending.setdefault(pk, seen)
+                    self._written.pop(pk, None)
+            raise
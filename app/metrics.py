@@ -0,0 +1,258 @@
+# app > metrics.py
+import atexit
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import g, request, request_started, request_finished, before_render_template, template_rendered
+
+# request phases timed separately, app is whatever the total leaves after db and render
+PHASES = ('db', 'render', 'app', 'total')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    '''Returns labels as a Prometheus label set body, like endpoint="root.homepage",phase="db"'''
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+def format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Metrics(object):
+    '''Per endpoint request latency histograms, Server-Timing headers and a Prometheus text exposition.
+
+    Each request is split into db time (from the query counter), template render time, app time for the rest,
+    and the total. Samples accumulate in memory and every METRICS_FLUSH_INTERVAL seconds each worker writes its
+    running totals to its own rows of the SQLite file at METRICS_DB, so a scrape of any worker sums all of them.
+    Must be initialized after the query counter.
+    '''
+    TYPES = {
+        'modlog_request_duration_seconds': 'histogram',
+        'modlog_requests_total': 'counter',
+        'modlog_cache_hits_total': 'counter',
+        'modlog_cache_misses_total': 'counter',
+        'modlog_cache_evictions_total': 'counter',
+        'modlog_login_attempts_total': 'counter',
+    }
+    TIMING_KEY = '_request_timing'
+
+    def __init__(self, app=None):
+        self.app = None
+        self.caches = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._samples = {}
+        self._process = None
+        self._last_flush = time.monotonic()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_DB', os.path.join(
+            tempfile.gettempdir(), 'modlog_metrics.sqlite3'))
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 10)
+        app.config.setdefault('METRICS_BUCKETS', (
+            .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+        if self.app is None:
+            atexit.register(self.flush)
+        self.app = app
+
+        request_started.connect(self._request_started, app)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        request_finished.connect(self._request_finished, app)
+        app.extensions['metrics'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['METRICS_ENABLED']
+
+    def track_cache(self, name, cache):
+        '''Exports the hit, miss and eviction counters of an extension with a stats property'''
+        self.caches[name] = cache
+
+    def _connect(self):
+        '''Returns a SQLite connection for this thread, creating the table on first use'''
+        path = self.app.config['METRICS_DB']
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.key == (os.getpid(), path):
+            return conn
+
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS samples (process TEXT NOT NULL, name TEXT NOT NULL, '
+                     'labels TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (process, name, labels))')
+        self._local.conn = conn
+        self._local.key = (os.getpid(), path)
+        return conn
+
+    def _process_key(self):
+        '''Identifies this worker's rows. Unique per process so a recycled pid never overwrites a dead worker's totals'''
+        if self._process is None or self._process[0] != os.getpid():
+            with self._lock:
+                self._samples = {}
+            self._process = (os.getpid(), f'{os.getpid()}-{uuid.uuid4().hex[:8]}')
+        return self._process[1]
+
+    def _inc(self, name, labels, value=1):
+        key = (name, format_labels(labels))
+        self._samples[key] = self._samples.get(key, 0) + value
+
+    def observe(self, endpoint, phase, seconds):
+        '''Adds one observation to the request duration histogram of an endpoint and phase'''
+        self._process_key()
+        labels = (('endpoint', endpoint), ('phase', phase))
+        with self._lock:
+            for bound in self.app.config['METRICS_BUCKETS']:
+                self._inc('modlog_request_duration_seconds_bucket',
+                          labels + (('le', format_value(bound)),), int(seconds <= bound))
+            self._inc('modlog_request_duration_seconds_bucket',
+                      labels + (('le', '+Inf'),))
+            self._inc('modlog_request_duration_seconds_sum', labels, seconds)
+            self._inc('modlog_request_duration_seconds_count', labels)
+
+    def _request_started(self, sender, **extra):
+        if self.enabled:
+            setattr(g, self.TIMING_KEY, {
+                'start': time.perf_counter(), 'render': 0.0, 'rendering': []})
+
+    def _db_time(self):
+        from . import query_counter
+
+        stats = query_counter.stats
+        return stats.duration if stats else 0.0
+
+    def _render_started(self, sender, template, context, **extra):
+        timing = g.get(self.TIMING_KEY)
+        if timing is not None:
+            timing['rendering'].append((time.perf_counter(), self._db_time()))
+
+    def _render_finished(self, sender, template, context, **extra):
+        timing = g.get(self.TIMING_KEY)
+        if timing is not None and timing['rendering']:
+            started, db_started = timing['rendering'].pop()
+            # a template rendered while rendering another is already inside the outer timing, and queries
+            # lazy loaded by the template count as db time rather than render time
+            if not timing['rendering']:
+                timing['render'] += time.perf_counter() - started - \
+                    (self._db_time() - db_started)
+
+    def _request_finished(self, sender, response, **extra):
+        timing = g.pop(self.TIMING_KEY, None)
+        if timing is None:
+            return
+        from . import query_counter
+
+        stats = query_counter.stats
+        total = time.perf_counter() - timing['start']
+        durations = {
+            'db': stats.duration if stats else 0.0,
+            'render': timing['render'],
+            'total': total,
+        }
+        durations['app'] = max(
+            total - durations['db'] - durations['render'], 0.0)
+
+        endpoint = request.endpoint or 'unmatched'
+        for phase in PHASES:
+            self.observe(endpoint, phase, durations[phase])
+        with self._lock:
+            self._inc('modlog_requests_total', (('endpoint', endpoint),
+                                                ('method', request.method), ('status', response.status_code)))
+
+        db_desc = f';desc="{stats.count} queries"' if stats else ''
+        response.headers['Server-Timing'] = ', '.join(
+            f'{phase}{db_desc if phase == "db" else ""};dur={durations[phase] * 1000:.1f}' for phase in PHASES)
+
+        if time.monotonic() - self._last_flush >= sender.config['METRICS_FLUSH_INTERVAL']:
+            try:
+                self.flush()
+            except sqlite3.Error:
+                sender.logger.exception('Failed to flush metrics')
+
+    def flush(self):
+        '''Writes this worker's running totals, including tracked cache counters, to the shared store'''
+        if not self.enabled:
+            return
+        process = self._process_key()
+        with self._lock:
+            self._last_flush = time.monotonic()
+            for name, cache in self.caches.items():
+                stats = cache.stats
+                for counter in ('hits', 'misses', 'evictions'):
+                    self._samples[(f'modlog_cache_{counter}_total',
+                                   format_labels((('cache', name),)))] = stats[counter]
+            rows = [(process, name, labels, value)
+                    for (name, labels), value in self._samples.items()]
+        if not rows:
+            return
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO samples (process, name, labels, value) VALUES (?, ?, ?, ?) '
+                             'ON CONFLICT(process, name, labels) DO UPDATE SET value = excluded.value', rows)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    def collect(self):
+        '''Returns {(sample name, labels): value} summed across every worker that has flushed'''
+        self.flush()
+        rows = self._connect().execute(
+            'SELECT name, labels, SUM(value) FROM samples GROUP BY name, labels').fetchall()
+        return {(name, labels): value for name, labels, value in rows}
+
+    def render(self, extra=()):
+        '''Returns every metric in the Prometheus text format.
+
+        extra is an iterable of (name, labels, value) for samples already shared across workers, like the
+        login throttle counters, which are reported as they are.
+        '''
+        samples = self.collect()
+        for name, labels, value in extra:
+            samples[(name, format_labels(labels))] = value
+
+        def sort_key(sample):
+            (name, labels), _ = sample
+            base = self._base_name(name)
+            # keep each label set's buckets together and in bound order, ahead of its _count and _sum
+            le = labels.rsplit('le="', 1)[1].rstrip('"') if 'le="' in labels else None
+            series = labels.rsplit(',le="', 1)[0] if le is not None else labels
+            return base, series, name, float(le) if le is not None else 0.0
+
+        lines = []
+        current = None
+        for (name, labels), value in sorted(samples.items(), key=sort_key):
+            base = self._base_name(name)
+            if base != current:
+                lines.append(f'# TYPE {base} {self.TYPES.get(base, "untyped")}')
+                current = base
+            lines.append(f'{name}{{{labels}}} {format_value(value)}' if labels
+                         else f'{name} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _base_name(self, name):
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in self.TYPES:
+                return name[:-len(suffix)]
+        return name
+
+    def reset(self):
+        '''Drops every sample, in memory and in the shared store'''
+        with self._lock:
+            self._samples = {}
+        self._connect().execute('DELETE FROM samples')
@@ -0,0 +1,115 @@
+'''Versioned schema migrations that ship with the app.
+
+Every module in this package named m<version>_<name>.py is a migration. It defines DESCRIPTION and upgrade(conn),
+and may define PROBES, a dict of index name to a query that should use that index, and DROPPED_INDEXES, the names
+of earlier migrations' indexes it replaces. Applied versions are recorded in
+the schema_versions table. Fresh databases get the current schema from db.create_all(), so every upgrade must be
+safe to run against a schema that already has its changes. Migrations spell out their schema changes in SQL rather
+than importing models, so later model changes never change what an old migration does.
+'''
+# app > migrations > __init__.py
+import importlib
+import json
+import pkgutil
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+# arbitrary key for the advisory lock that keeps booting workers from migrating at once
+LOCK_KEY = 5_140_123
+
+
+def get_migrations():
+    '''Returns (version, module) for every migration in version order'''
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith('m'):
+            continue
+        version = int(info.name[1:].split('_')[0])
+        migrations.append(
+            (version, importlib.import_module(f'{__name__}.{info.name}')))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def upgrade(engine):
+    '''Applies every migration not yet recorded in schema_versions. Returns the applied versions'''
+    applied = []
+    with engine.begin() as conn:
+        # backfills scan whole tables, and waiting on another worker's migration takes as long as it does,
+        # so neither may be cancelled by the app's statement_timeout
+        conn.execute(text('SET LOCAL statement_timeout = 0'))
+        conn.execute(text('SELECT pg_advisory_xact_lock(:key)'),
+                     {'key': LOCK_KEY})
+        conn.execute(text('''CREATE TABLE IF NOT EXISTS schema_versions (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now())'''))
+        done = set(conn.execute(
+            text('SELECT version FROM schema_versions')).scalars())
+
+        for version, migration in get_migrations():
+            if version in done:
+                continue
+            migration.upgrade(conn)
+            conn.execute(text('INSERT INTO schema_versions (version, description) VALUES (:version, :description)'),
+                         {'version': version, 'description': migration.DESCRIPTION})
+            applied.append(version)
+    return applied
+
+
+def _index_names(plan):
+    '''Yields every index name used anywhere in an EXPLAIN (FORMAT JSON) plan node'''
+    if 'Index Name' in plan:
+        yield plan['Index Name']
+    for child in plan.get('Plans', []):
+        yield from _index_names(child)
+
+
+def check_indexes(engine):
+    '''Runs each migration's probe queries through EXPLAIN and returns {index name: True if the plan uses it}.
+    Indexes a later migration dropped are skipped.
+
+    Sequential scans are disabled for the check so a near empty table still reports whether the index is usable.
+    '''
+    results = {}
+    migrations = get_migrations()
+    dropped = {name for _, migration in migrations
+               for name in getattr(migration, 'DROPPED_INDEXES', ())}
+    with engine.connect() as conn:
+        for _, migration in migrations:
+            for name, probe in getattr(migration, 'PROBES', {}).items():
+                if name in dropped:
+                    continue
+                with conn.begin():
+                    conn.execute(text('SET LOCAL enable_seqscan = off'))
+                    plan = conn.execute(
+                        text('EXPLAIN (FORMAT JSON) ' + probe)).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                results[name] = name in set(_index_names(plan[0]['Plan']))
+    return results
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def upgrade_command():
+    '''Applies pending schema migrations'''
+    from app.models import db
+
+    applied = upgrade(db.engine)
+    click.echo(f'Applied migrations: {applied}' if applied
+               else 'Database is up to date')
+
+
+@click.command('db-check-indexes')
+@with_appcontext
+def check_indexes_command():
+    '''Checks with EXPLAIN that the planner uses each migration's indexes'''
+    from app.models import db
+
+    results = check_indexes(db.engine)
+    for name, used in results.items():
+        click.echo(f'{"ok" if used else "NOT USED"}\t{name}')
+    if not all(results.values()):
+        raise SystemExit(1)
@@ -0,0 +1,43 @@
+'''Adds the denormalized counters on projects and the triggers that maintain them'''
+# app > migrations > m0001_project_counters.py
+from sqlalchemy import DDL, text
+
+DESCRIPTION = 'Project follower, comment, update and picture counters'
+
+# counter column on projects: child table counted by it
+COUNTERS = {
+    'follower_count': 'followers',
+    'comment_count': 'comments',
+    'update_count': 'updates',
+    'picture_count': 'project_pictures',
+}
+
+# DDL runs the statement through %-formatting, so literal percent signs are doubled
+COUNTER_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION projects_count_children() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('UPDATE projects SET %%1$I = %%1$I + 1 WHERE pk = $1', TG_ARGV[0]) USING NEW.project_pk;
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE format('UPDATE projects SET %%1$I = %%1$I - 1 WHERE pk = $1', TG_ARGV[0]) USING OLD.project_pk;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+RECOUNT = text('UPDATE projects SET ' + ', '.join(
+    f'{column} = (SELECT count(*) FROM {table} WHERE {table}.project_pk = projects.pk)'
+    for column, table in COUNTERS.items()))
+
+
+def upgrade(conn):
+    for column in COUNTERS:
+        conn.execute(text(
+            f'ALTER TABLE projects ADD COLUMN IF NOT EXISTS {column} INTEGER NOT NULL DEFAULT 0'))
+    conn.execute(COUNTER_FUNCTION)
+    for column, table in COUNTERS.items():
+        conn.execute(DDL(f'''
+DROP TRIGGER IF EXISTS {table}_count ON {table};
+CREATE TRIGGER {table}_count AFTER INSERT OR DELETE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE projects_count_children('{column}')'''))
+    conn.execute(RECOUNT)
@@ -0,0 +1,33 @@
+'''Adds indexes for the foreign key and ordering lookups every page makes'''
+# app > migrations > m0002_hot_indexes.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Indexes for project, follower, picture, update and comment lookups'
+
+PROBES = {
+    'ix_comments_project_pk_created_at':
+        'SELECT pk FROM comments WHERE project_pk = 1 ORDER BY created_at DESC, pk DESC LIMIT 20',
+    'ix_updates_project_pk_created_at':
+        'SELECT pk FROM updates WHERE project_pk = 1 ORDER BY created_at DESC, pk DESC LIMIT 20',
+    'ix_projects_user_pk_private':
+        "SELECT pk FROM projects WHERE user_pk = 1 AND private = 'PUBLIC'",
+    'ix_followers_project_pk':
+        'SELECT user_pk FROM followers WHERE project_pk = 1',
+    'ix_project_pictures_project_pk':
+        'SELECT pk FROM project_pictures WHERE project_pk = 1',
+}
+
+# index name: (table, columns)
+INDEXES = {
+    'ix_comments_project_pk_created_at': ('comments', ('project_pk', 'created_at', 'pk')),
+    'ix_updates_project_pk_created_at': ('updates', ('project_pk', 'created_at', 'pk')),
+    'ix_projects_user_pk_private': ('projects', ('user_pk', 'private')),
+    'ix_followers_project_pk': ('followers', ('project_pk',)),
+    'ix_project_pictures_project_pk': ('project_pictures', ('project_pk',)),
+}
+
+
+def upgrade(conn):
+    for name, (table, columns) in INDEXES.items():
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
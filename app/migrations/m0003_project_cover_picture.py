@@ -0,0 +1,23 @@
+'''Adds the cover picture shown for each project in profile listings'''
+# app > migrations > m0003_project_cover_picture.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Project cover picture'
+
+# a fresh schema already has the constraint from create_all
+ADD_CONSTRAINT = text('''DO $$ BEGIN
+    ALTER TABLE projects ADD CONSTRAINT fk_projects_cover_picture
+        FOREIGN KEY (cover_picture_pk) REFERENCES project_pictures (pk) ON DELETE SET NULL;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$''')
+
+BACKFILL = text('''UPDATE projects SET cover_picture_pk = (
+    SELECT min(pk) FROM project_pictures WHERE project_pictures.project_pk = projects.pk)
+WHERE cover_picture_pk IS NULL''')
+
+
+def upgrade(conn):
+    conn.execute(text(
+        'ALTER TABLE projects ADD COLUMN IF NOT EXISTS cover_picture_pk INTEGER'))
+    conn.execute(ADD_CONSTRAINT)
+    conn.execute(BACKFILL)
@@ -0,0 +1,27 @@
+'''Adds the log of added mods that activity feeds read from'''
+# app > migrations > m0004_mod_additions.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Mod additions log for activity feeds'
+
+PROBES = {
+    'ix_mod_additions_project_pk_created_at':
+        'SELECT pk FROM mod_additions WHERE project_pk = 1 ORDER BY created_at DESC, pk DESC LIMIT 20',
+}
+
+
+CREATE_TABLE = text('''CREATE TABLE IF NOT EXISTS mod_additions (
+    pk SERIAL PRIMARY KEY,
+    id VARCHAR(32) NOT NULL UNIQUE,
+    project_pk INTEGER NOT NULL REFERENCES projects (pk) ON DELETE CASCADE,
+    mod VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    last_edit TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    is_edited BOOLEAN
+)''')
+
+
+def upgrade(conn):
+    conn.execute(CREATE_TABLE)
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_mod_additions_project_pk_created_at '
+                      'ON mod_additions (project_pk, created_at, pk)'))
@@ -0,0 +1,48 @@
+'''Adds full text search vectors to projects and updates'''
+# app > migrations > m0005_search.py
+from sqlalchemy import DDL, text
+
+DESCRIPTION = 'Full text search over projects and updates'
+
+PROBES = {
+    'ix_projects_search_vector':
+        "SELECT pk FROM projects WHERE search_vector @@ websearch_to_tsquery('english', 'mustang')",
+    'ix_updates_search_vector':
+        "SELECT pk FROM updates WHERE search_vector @@ websearch_to_tsquery('english', 'turbo')",
+}
+
+# table: (expression building NEW.search_vector, columns that feed it), as they were when this migration shipped
+SEARCH_VECTORS = {
+    'projects': ('''
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.make, '') || ' ' || coalesce(NEW.model, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(array_to_string(NEW.mods, ' '), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')''',
+        ('name', 'description', 'make', 'model', 'mods')),
+    'updates': ('''
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B')''',
+        ('title', 'content')),
+}
+
+
+def upgrade(conn):
+    for table, (expression, columns) in SEARCH_VECTORS.items():
+        conn.execute(text(
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector TSVECTOR'))
+        conn.execute(DDL(f'''
+CREATE OR REPLACE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {expression};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql'''))
+        conn.execute(DDL(f'''
+DROP TRIGGER IF EXISTS {table}_search ON {table};
+CREATE TRIGGER {table}_search BEFORE INSERT OR UPDATE OF {', '.join(columns)} ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector()'''))
+        # touching a searched column fires the trigger for every existing row
+        conn.execute(text(
+            f'UPDATE {table} SET {columns[0]} = {columns[0]} WHERE search_vector IS NULL'))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)'))
@@ -0,0 +1,35 @@
+'''Adds the trigram indexes behind autocomplete'''
+# app > migrations > m0006_autocomplete.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Trigram indexes for make, model, mod and username autocomplete'
+
+# table: columns given a trigram index
+TRIGRAM_INDEXES = {
+    'projects': ('make', 'model'),
+    'mod_additions': ('mod',),
+    'users': ('username',),
+}
+
+PROBES = {
+    'ix_projects_make_trgm': "SELECT make FROM projects WHERE make ILIKE 'for%'",
+    'ix_projects_model_trgm': "SELECT model FROM projects WHERE model ILIKE 'mus%'",
+    'ix_mod_additions_mod_trgm': "SELECT mod FROM mod_additions WHERE mod ILIKE 'tur%'",
+    'ix_users_username_trgm': "SELECT username FROM users WHERE username ILIKE 'pub%'",
+}
+
+# mods added before mod_additions existed, dated with their project so they stay out of recent feeds
+BACKFILL_MODS = text('''INSERT INTO mod_additions (id, project_pk, mod, created_at, last_edit)
+SELECT md5(random()::text || clock_timestamp()::text), projects.pk, mods.mod, projects.created_at, projects.created_at
+FROM projects, unnest(projects.mods) AS mods(mod)
+WHERE NOT EXISTS (
+    SELECT 1 FROM mod_additions WHERE mod_additions.project_pk = projects.pk AND mod_additions.mod = mods.mod)''')
+
+
+def upgrade(conn):
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    conn.execute(BACKFILL_MODS)
+    for table, columns in TRIGRAM_INDEXES.items():
+        for column in columns:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm '
+                              f'ON {table} USING gin ({column} gin_trgm_ops)'))
@@ -0,0 +1,30 @@
+'''Adds the local vehicle catalog table'''
+# app > migrations > m0007_vehicles.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Vehicle catalog loaded from a CarQuery dump'
+
+PROBES = {
+    'ix_vehicles_year_make_model':
+        "SELECT DISTINCT model FROM vehicles WHERE year = 2007 AND make_id = 'ford'",
+}
+
+
+def upgrade(conn):
+    # the drivetrain type already exists, projects.drivetrain uses it
+    conn.execute(text('''CREATE TABLE IF NOT EXISTS vehicles (
+        model_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        make_id TEXT NOT NULL,
+        make TEXT NOT NULL,
+        model TEXT NOT NULL,
+        trim TEXT,
+        horsepower INTEGER,
+        torque INTEGER,
+        weight INTEGER,
+        drivetrain drivetrain,
+        engine_size FLOAT,
+        sold_in_us BOOLEAN NOT NULL,
+        PRIMARY KEY (model_id))'''))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_vehicles_year_make_model '
+                      'ON vehicles (year, make_id, model)'))
@@ -0,0 +1,18 @@
+'''Replaces the followers project index with one that also orders by user'''
+# app > migrations > m0008_followers_project_user_index.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Followers index on (project_pk, user_pk) for keyset follower pages'
+
+PROBES = {
+    'ix_followers_project_pk_user_pk':
+        'SELECT user_pk FROM followers WHERE project_pk = 1 AND user_pk > 10 ORDER BY user_pk LIMIT 21',
+}
+
+DROPPED_INDEXES = ('ix_followers_project_pk',)
+
+
+def upgrade(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_followers_project_pk_user_pk '
+                      'ON followers (project_pk, user_pk)'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_followers_project_pk'))
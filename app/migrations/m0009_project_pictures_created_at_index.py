@@ -0,0 +1,18 @@
+'''Replaces the project pictures index with one that walks a project's pictures newest first'''
+# app > migrations > m0009_project_pictures_created_at_index.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Project pictures index on (project_pk, created_at, pk) for activity feeds'
+
+PROBES = {
+    'ix_project_pictures_project_pk_created_at':
+        'SELECT pk FROM project_pictures WHERE project_pk = 1 ORDER BY created_at DESC, pk DESC LIMIT 21',
+}
+
+DROPPED_INDEXES = ('ix_project_pictures_project_pk',)
+
+
+def upgrade(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_project_pictures_project_pk_created_at '
+                      'ON project_pictures (project_pk, created_at, pk)'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_project_pictures_project_pk'))
@@ -0,0 +1,72 @@
+'''Moves autocomplete onto a table of distinct make, model and mod values'''
+# app > migrations > m0010_autocomplete_terms.py
+from sqlalchemy import DDL, text
+
+DESCRIPTION = 'Distinct autocomplete terms with per field trigram indexes'
+
+TERM_FIELDS = ('makes', 'models', 'mods')
+
+PROBES = {
+    'ix_autocomplete_terms_makes_trgm':
+        "SELECT value FROM autocomplete_terms WHERE field = 'makes' AND value ILIKE 'for%'",
+    'ix_autocomplete_terms_models_trgm':
+        "SELECT value FROM autocomplete_terms WHERE field = 'models' AND value ILIKE 'mus%'",
+    'ix_autocomplete_terms_mods_trgm':
+        "SELECT value FROM autocomplete_terms WHERE field = 'mods' AND value ILIKE 'tur%'",
+}
+
+DROPPED_INDEXES = ('ix_projects_make_trgm', 'ix_projects_model_trgm', 'ix_mod_additions_mod_trgm')
+
+TERMS_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION projects_autocomplete_terms() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.private = 'PUBLIC' THEN
+        DELETE FROM autocomplete_terms WHERE uses = 1 AND (field, value) IN (
+            SELECT 'makes', OLD.make UNION SELECT 'models', OLD.model UNION SELECT 'mods', unnest(OLD.mods));
+        UPDATE autocomplete_terms SET uses = uses - 1 WHERE (field, value) IN (
+            SELECT 'makes', OLD.make UNION SELECT 'models', OLD.model UNION SELECT 'mods', unnest(OLD.mods));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.private = 'PUBLIC' THEN
+        INSERT INTO autocomplete_terms AS terms (field, value, uses)
+        SELECT new_terms.field, new_terms.value, 1 FROM (
+            SELECT 'makes', NEW.make UNION SELECT 'models', NEW.model UNION SELECT 'mods', unnest(NEW.mods)
+        ) AS new_terms (field, value)
+        WHERE new_terms.value <> ''
+        ON CONFLICT (field, value) DO UPDATE SET uses = terms.uses + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+TERMS_TRIGGER = DDL('''
+DROP TRIGGER IF EXISTS projects_autocomplete_terms ON projects;
+CREATE TRIGGER projects_autocomplete_terms AFTER INSERT OR DELETE OR UPDATE OF make, model, mods, private ON projects
+    FOR EACH ROW EXECUTE PROCEDURE projects_autocomplete_terms()''')
+
+# recounts every term, so running it again leaves the table exact
+BACKFILL_TERMS = text('''INSERT INTO autocomplete_terms (field, value, uses)
+SELECT terms.field, terms.value, count(*) FROM (
+    SELECT pk, 'makes', make FROM projects WHERE private = 'PUBLIC'
+    UNION SELECT pk, 'models', model FROM projects WHERE private = 'PUBLIC'
+    UNION SELECT pk, 'mods', unnest(mods) FROM projects WHERE private = 'PUBLIC'
+) AS terms (pk, field, value)
+WHERE terms.value <> ''
+GROUP BY terms.field, terms.value
+ON CONFLICT (field, value) DO UPDATE SET uses = excluded.uses''')
+
+
+def upgrade(conn):
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    conn.execute(text('''CREATE TABLE IF NOT EXISTS autocomplete_terms (
+        field TEXT NOT NULL,
+        value TEXT NOT NULL,
+        uses INTEGER NOT NULL,
+        PRIMARY KEY (field, value))'''))
+    conn.execute(TERMS_FUNCTION)
+    conn.execute(TERMS_TRIGGER)
+    conn.execute(BACKFILL_TERMS)
+    for field in TERM_FIELDS:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_autocomplete_terms_{field}_trgm ON autocomplete_terms '
+                          f"USING gin (value gin_trgm_ops) WHERE field = '{field}'"))
+    for name in DROPPED_INDEXES:
+        conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
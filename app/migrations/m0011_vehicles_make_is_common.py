@@ -0,0 +1,10 @@
+'''Adds CarQuery's common make flag to the vehicle catalog'''
+# app > migrations > m0011_vehicles_make_is_common.py
+from sqlalchemy import text
+
+DESCRIPTION = 'Vehicle make_is_common flag for listing common makes first'
+
+
+def upgrade(conn):
+    conn.execute(text(
+        'ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS make_is_common BOOLEAN NOT NULL DEFAULT false'))
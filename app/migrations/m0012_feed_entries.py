@@ -0,0 +1,81 @@
+'''Adds materialized activity feeds for users who follow many projects'''
+# app > migrations > m0012_feed_entries.py
+from sqlalchemy import DDL, text
+
+DESCRIPTION = 'Materialized feed entries and the triggers that fan items out to them'
+
+PROBES = {
+    'ix_feed_entries_user_pk_created_at':
+        'SELECT item_pk FROM feed_entries WHERE user_pk = 1 ORDER BY created_at DESC, kind DESC, item_pk DESC LIMIT 21',
+    'ix_feed_entries_kind_item_pk':
+        "SELECT user_pk FROM feed_entries WHERE kind = 'update' AND item_pk = 1",
+}
+
+# feed kind: table its items come from
+FEED_SOURCES = {
+    'update': 'updates',
+    'picture': 'project_pictures',
+    'mod': 'mod_additions',
+}
+
+ITEM_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION feed_entries_sync_item() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO feed_entries (user_pk, project_pk, kind, item_pk, created_at)
+        SELECT followers.user_pk, NEW.project_pk, TG_ARGV[0], NEW.pk, NEW.created_at
+        FROM followers JOIN users ON users.pk = followers.user_pk
+        WHERE followers.project_pk = NEW.project_pk AND users.feed_materialized;
+    ELSE
+        DELETE FROM feed_entries WHERE kind = TG_ARGV[0] AND item_pk = OLD.pk;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+FOLLOW_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION feed_entries_sync_follow() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF (SELECT feed_materialized FROM users WHERE pk = NEW.user_pk) THEN
+            INSERT INTO feed_entries (user_pk, project_pk, kind, item_pk, created_at)
+            SELECT NEW.user_pk, project_pk, 'update', pk, created_at FROM updates WHERE project_pk = NEW.project_pk
+            UNION ALL SELECT NEW.user_pk, project_pk, 'picture', pk, created_at FROM project_pictures
+                WHERE project_pk = NEW.project_pk
+            UNION ALL SELECT NEW.user_pk, project_pk, 'mod', pk, created_at FROM mod_additions
+                WHERE project_pk = NEW.project_pk
+            ON CONFLICT DO NOTHING;
+        END IF;
+    ELSE
+        DELETE FROM feed_entries WHERE user_pk = OLD.user_pk AND project_pk = OLD.project_pk;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+
+def upgrade(conn):
+    conn.execute(text(
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS feed_materialized BOOLEAN NOT NULL DEFAULT false'))
+    conn.execute(text('''CREATE TABLE IF NOT EXISTS feed_entries (
+        user_pk INTEGER NOT NULL REFERENCES users (pk) ON DELETE CASCADE,
+        project_pk INTEGER NOT NULL REFERENCES projects (pk) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        item_pk INTEGER NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (user_pk, project_pk, kind, item_pk))'''))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_feed_entries_user_pk_created_at '
+                      'ON feed_entries (user_pk, created_at, kind, item_pk)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_feed_entries_kind_item_pk '
+                      'ON feed_entries (kind, item_pk)'))
+    conn.execute(ITEM_FUNCTION)
+    conn.execute(FOLLOW_FUNCTION)
+    for kind, table in FEED_SOURCES.items():
+        conn.execute(DDL(f'''
+DROP TRIGGER IF EXISTS {table}_feed ON {table};
+CREATE TRIGGER {table}_feed AFTER INSERT OR DELETE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE feed_entries_sync_item('{kind}')'''))
+    conn.execute(DDL('''
+DROP TRIGGER IF EXISTS followers_feed ON followers;
+CREATE TRIGGER followers_feed AFTER INSERT OR DELETE ON followers
+    FOR EACH ROW EXECUTE PROCEDURE feed_entries_sync_follow()'''))
@@ -1,22 +1,19 @@
 '''Initializes SQLalchemy models from each module'''
 # app > models > __init__.py
 from flask_sqlalchemy import SQLAlchemy
-from flask_sqlalchemy.track_modifications import models_committed
 
-db = SQLAlchemy()
+from .routing import RoutingSession
 
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+from .events import events
+from .mixins import transaction
 from .users import *
 from .projects import *
 from .images import *
+from .activity import get_feed_page, sync_feeds_command
+from .counters import recount_command
+from .search import search_projects, search_updates
+from .autocomplete import suggest
+from .vehicles import Vehicle, import_vehicles_command
 
-
-@models_committed.connect
-def committed(sender, changes):
-    '''Calls the __commit_<change>__ method on a model when a certain commit happens'''
-    for obj, change in changes:
-        if change == 'insert' and hasattr(obj, '__commit_insert__'):
-            obj.__commit_insert__()
-        if change == 'udpate' and hasattr(obj, '__commit_update__'):
-            obj.__commit_update__()
-        if change == 'delete' and hasattr(obj, '__commit_delete__'):
-            obj.__commit_delete__()
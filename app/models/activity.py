@@ -0,0 +1,272 @@
+# app > models > activity.py
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, delete, event, func, literal, null, or_, select, text, true, tuple_, union_all, update
+
+from . import db
+from .enums import PrivacyStatus
+from .users import User, Follow
+from .projects import Project, Update, ModAddition
+from .images import ProjectPicture
+
+
+class FeedEntry(db.Model):
+    '''One item of a followed project in a materialized feed. Only users with feed_materialized set have entries'''
+    __tablename__ = 'feed_entries'
+    __table_args__ = (
+        # a page is one walk of the user's entries in feed order
+        db.Index('ix_feed_entries_user_pk_created_at',
+                 'user_pk', 'created_at', 'kind', 'item_pk'),
+        db.Index('ix_feed_entries_kind_item_pk', 'kind', 'item_pk'),
+    )
+
+    user_pk = db.Column(db.Integer, db.ForeignKey(
+        'users.pk', ondelete="cascade"), primary_key=True)
+    project_pk = db.Column(db.Integer, db.ForeignKey(
+        'projects.pk', ondelete="cascade"), primary_key=True)
+    kind = db.Column(db.Text, primary_key=True)
+    item_pk = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
+# feed kind: table its items come from
+FEED_SOURCES = {
+    'update': 'updates',
+    'picture': 'project_pictures',
+    'mod': 'mod_additions',
+}
+
+# fans a new item out to the materialized feeds of its project's followers, and removes a deleted one
+ITEM_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION feed_entries_sync_item() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO feed_entries (user_pk, project_pk, kind, item_pk, created_at)
+        SELECT followers.user_pk, NEW.project_pk, TG_ARGV[0], NEW.pk, NEW.created_at
+        FROM followers JOIN users ON users.pk = followers.user_pk
+        WHERE followers.project_pk = NEW.project_pk AND users.feed_materialized;
+    ELSE
+        DELETE FROM feed_entries WHERE kind = TG_ARGV[0] AND item_pk = OLD.pk;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+# fills a materialized feed with a newly followed project's items, and empties it of an unfollowed one's
+FOLLOW_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION feed_entries_sync_follow() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF (SELECT feed_materialized FROM users WHERE pk = NEW.user_pk) THEN
+            INSERT INTO feed_entries (user_pk, project_pk, kind, item_pk, created_at)
+            SELECT NEW.user_pk, project_pk, 'update', pk, created_at FROM updates WHERE project_pk = NEW.project_pk
+            UNION ALL SELECT NEW.user_pk, project_pk, 'picture', pk, created_at FROM project_pictures
+                WHERE project_pk = NEW.project_pk
+            UNION ALL SELECT NEW.user_pk, project_pk, 'mod', pk, created_at FROM mod_additions
+                WHERE project_pk = NEW.project_pk
+            ON CONFLICT DO NOTHING;
+        END IF;
+    ELSE
+        DELETE FROM feed_entries WHERE user_pk = OLD.user_pk AND project_pk = OLD.project_pk;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+
+def feed_trigger(kind, table):
+    '''Returns DDL creating the trigger that keeps materialized feeds current with the items of table'''
+    return DDL(f'''
+DROP TRIGGER IF EXISTS {table}_feed ON {table};
+CREATE TRIGGER {table}_feed AFTER INSERT OR DELETE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE feed_entries_sync_item('{kind}')''')
+
+
+FOLLOW_TRIGGER = DDL('''
+DROP TRIGGER IF EXISTS followers_feed ON followers;
+CREATE TRIGGER followers_feed AFTER INSERT OR DELETE ON followers
+    FOR EACH ROW EXECUTE PROCEDURE feed_entries_sync_follow()''')
+
+# the triggers sit on four tables, so they are made once every table exists
+for ddl in (ITEM_FUNCTION, FOLLOW_FUNCTION, FOLLOW_TRIGGER,
+            *(feed_trigger(kind, table) for kind, table in FEED_SOURCES.items())):
+    event.listen(db.metadata, 'after_create',
+                 ddl.execute_if(dialect='postgresql'))
+
+FILL_FEED = text('''INSERT INTO feed_entries (user_pk, project_pk, kind, item_pk, created_at)
+SELECT followers.user_pk, items.project_pk, items.kind, items.pk, items.created_at
+FROM followers JOIN (
+    SELECT project_pk, 'update' AS kind, pk, created_at FROM updates
+    UNION ALL SELECT project_pk, 'picture', pk, created_at FROM project_pictures
+    UNION ALL SELECT project_pk, 'mod', pk, created_at FROM mod_additions
+) AS items ON items.project_pk = followers.project_pk
+WHERE followers.user_pk = :user_pk
+ON CONFLICT DO NOTHING''')
+
+
+def encode_cursor(row):
+    '''Returns a feed cursor pointing just past row'''
+    return f'{row.created_at.isoformat()}~{row.kind}~{row.pk}'
+
+
+def decode_cursor(cursor):
+    '''Returns the (created_at, kind, pk) a feed cursor points past. Raises ValueError if malformed'''
+    created_at, kind, pk = cursor.split('~')
+    return datetime.fromisoformat(created_at), kind, int(pk)
+
+
+def _source(kind, model, title, body, followed, after, limit):
+    '''Newest rows of one feed source in the followed projects, already cut down to a page.
+
+    The rows are picked per project with a LATERAL subquery, so each project costs one backward walk of its
+    (project_pk, created_at, pk) index that stops after limit rows, however long the project's history is.
+    '''
+    latest = select(
+        literal(kind).label('kind'), model.pk, model.id, model.project_pk, model.created_at,
+        title.label('title'), body.label('body'),
+    ).where(model.project_pk == followed.c.project_pk)
+    if after:
+        created_at, _, _ = after
+        # the plain comparison is what lets the index bound the walk
+        latest = latest.where(model.created_at <= created_at, tuple_(
+            model.created_at, literal(kind), model.pk) < tuple_(*after))
+    latest = latest.order_by(model.created_at.desc(), model.pk.desc()).limit(
+        limit).lateral(f'latest_{kind}')
+    return select(latest).select_from(followed.join(latest, true())).order_by(
+        latest.c.created_at.desc(), latest.c.pk.desc()).limit(limit)
+
+
+def _materialized_feed(user_pk, after, limit):
+    '''A page of a user's materialized feed, one walk of their feed_entries in feed order'''
+    visible = or_(Project.private != PrivacyStatus.PRIVATE,
+                  Project.user_pk == user_pk)
+    entries = select(FeedEntry).join(Project, Project.pk == FeedEntry.project_pk).where(
+        FeedEntry.user_pk == user_pk, visible)
+    if after:
+        created_at, _, _ = after
+        entries = entries.where(FeedEntry.created_at <= created_at, tuple_(
+            FeedEntry.created_at, FeedEntry.kind, FeedEntry.item_pk) < tuple_(*after))
+    entries = entries.order_by(FeedEntry.created_at.desc(), FeedEntry.kind.desc(),
+                               FeedEntry.item_pk.desc()).limit(limit).subquery('entries')
+
+    # each entry matches exactly one of the sources, so coalesce picks its columns
+    return select(
+        entries.c.kind, entries.c.item_pk.label('pk'),
+        func.coalesce(Update.id, ProjectPicture.id,
+                      ModAddition.id).label('id'),
+        entries.c.project_pk, entries.c.created_at,
+        func.coalesce(Update.title, ProjectPicture.description,
+                      ModAddition.mod).label('title'),
+        func.coalesce(Update.content, ProjectPicture.extension).label('body'),
+    ).select_from(entries).outerjoin(
+        Update, (entries.c.kind == 'update') & (Update.pk == entries.c.item_pk)
+    ).outerjoin(
+        ProjectPicture, (entries.c.kind == 'picture') & (
+            ProjectPicture.pk == entries.c.item_pk)
+    ).outerjoin(
+        ModAddition, (entries.c.kind == 'mod') & (
+            ModAddition.pk == entries.c.item_pk)
+    ).subquery('feed')
+
+
+def get_feed_page(user_pk, cursor=None, per_page=20, materialized=False):
+    '''Returns a page of recent updates, pictures and mods across the projects a user follows, newest first,
+    and the cursor of the next page or None on the last page.
+
+    Rows have kind, pk, id, project_pk, created_at, title, body, project_id, project_name and username.
+    Projects made private since they were followed are left out unless the user owns them.
+
+    :param cursor: cursor returned with the previous page
+    :param materialized: the user's feed_materialized flag. Their feed_entries are read instead of every
+        followed project's history, which keeps the page one index walk however many projects they follow
+    '''
+    after = decode_cursor(cursor) if cursor else None
+    limit = per_page + 1
+    if materialized:
+        return _page(_materialized_feed(user_pk, after, limit), per_page)
+
+    followed = select(Follow.project_pk).join(Project, Project.pk == Follow.project_pk).where(
+        Follow.user_pk == user_pk,
+        or_(Project.private != PrivacyStatus.PRIVATE, Project.user_pk == user_pk)).subquery('followed')
+
+    # every source reads at most a page of rows per followed project
+    feed = union_all(
+        _source('update', Update, Update.title, Update.content,
+                followed, after, limit),
+        _source('picture', ProjectPicture, ProjectPicture.description, ProjectPicture.extension,
+                followed, after, limit),
+        _source('mod', ModAddition, ModAddition.mod, null(),
+                followed, after, limit),
+    ).subquery('feed')
+    return _page(feed, per_page)
+
+
+def _page(feed, per_page):
+    '''Runs a feed subquery with its project and owner columns and splits off the next page's cursor'''
+    rows = db.session.execute(
+        select(feed, Project.id.label('project_id'), Project.name.label('project_name'), User.username)
+        .join(Project, Project.pk == feed.c.project_pk)
+        .join(User, User.pk == Project.user_pk)
+        .order_by(feed.c.created_at.desc(), feed.c.kind.desc(), feed.c.pk.desc())
+        .limit(per_page + 1)).all()
+
+    if len(rows) > per_page:
+        return rows[:per_page], encode_cursor(rows[per_page - 1])
+    return rows, None
+
+
+def materialize_feed(user_pk):
+    '''Turns on the materialized feed of a user and fills it from every project they follow.
+    Running it again only adds missing entries, so it also repairs a feed
+    '''
+    db.session.execute(update(User).where(User.pk == user_pk).values(
+        feed_materialized=True).execution_options(synchronize_session=False))
+    db.session.execute(FILL_FEED, {'user_pk': user_pk})
+
+
+def dematerialize_feed(user_pk):
+    '''Turns off the materialized feed of a user and drops its entries'''
+    db.session.execute(update(User).where(User.pk == user_pk).values(
+        feed_materialized=False).execution_options(synchronize_session=False))
+    db.session.execute(delete(FeedEntry).where(FeedEntry.user_pk == user_pk).execution_options(
+        synchronize_session=False))
+
+
+def sync_materialized_feeds(threshold):
+    '''Materializes the feeds of users following at least threshold projects, drops those of users down to
+    under half of it, and commits. Returns the (materialized, dematerialized) user pks
+    '''
+    follows = select(Follow.user_pk, func.count().label('follows')).group_by(
+        Follow.user_pk).subquery('follows')
+    counts = select(User.pk, User.feed_materialized, func.coalesce(follows.c.follows, 0)).outerjoin(
+        follows, follows.c.user_pk == User.pk).where(or_(
+            User.feed_materialized, follows.c.follows >= threshold))
+
+    materialized, dematerialized = [], []
+    for user_pk, is_materialized, count in db.session.execute(counts).all():
+        if not is_materialized and count >= threshold:
+            materialize_feed(user_pk)
+            materialized.append(user_pk)
+        elif is_materialized and count < threshold // 2:
+            dematerialize_feed(user_pk)
+            dematerialized.append(user_pk)
+    db.session.commit()
+    return materialized, dematerialized
+
+
+@click.command('sync-feeds')
+@with_appcontext
+def sync_feeds_command():
+    '''Materializes the activity feeds of users above FEED_MATERIALIZE_THRESHOLD follows'''
+    from app import user_cache
+
+    materialized, dematerialized = sync_materialized_feeds(
+        current_app.config['FEED_MATERIALIZE_THRESHOLD'])
+    # cached users carry the flag the feed route reads
+    for user in User.query.filter(User.pk.in_(materialized + dematerialized)):
+        user_cache.bump(user)
+    click.echo(
+        f'Materialized {len(materialized)} feeds, dropped {len(dematerialized)}')
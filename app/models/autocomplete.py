@@ -0,0 +1,89 @@
+# app > models > autocomplete.py
+'''Prefix and fuzzy suggestions for makes, models, mods and usernames.
+
+Makes, models and mods are suggested from autocomplete_terms, one row per distinct value on public projects,
+which a trigger on projects keeps current. Each field has a partial pg_trgm GIN index over those values, and
+usernames one over users, which serves both the ILIKE prefix match and the % similarity match.
+'''
+from sqlalchemy import DDL, event, func, or_, select, text
+
+from . import db
+from .enums import PrivacyStatus
+from .users import User
+from .projects import Project
+
+# indexes declared with gin_trgm_ops need the extension before create_all makes them
+event.listen(db.metadata, 'before_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# fields suggested from autocomplete_terms
+TERM_FIELDS = ('makes', 'models', 'mods')
+
+# uses counts the public projects a value appears on, and a row is deleted when it reaches 0
+autocomplete_terms = db.Table(
+    'autocomplete_terms',
+    db.Column('field', db.Text, primary_key=True),
+    db.Column('value', db.Text, primary_key=True),
+    db.Column('uses', db.Integer, nullable=False),
+    *(db.Index(f'ix_autocomplete_terms_{field}_trgm', 'value', postgresql_using='gin',
+               postgresql_ops={'value': 'gin_trgm_ops'}, postgresql_where=text(f"field = '{field}'"))
+      for field in TERM_FIELDS),
+)
+
+TERMS_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION projects_autocomplete_terms() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.private = 'PUBLIC' THEN
+        DELETE FROM autocomplete_terms WHERE uses = 1 AND (field, value) IN (
+            SELECT 'makes', OLD.make UNION SELECT 'models', OLD.model UNION SELECT 'mods', unnest(OLD.mods));
+        UPDATE autocomplete_terms SET uses = uses - 1 WHERE (field, value) IN (
+            SELECT 'makes', OLD.make UNION SELECT 'models', OLD.model UNION SELECT 'mods', unnest(OLD.mods));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.private = 'PUBLIC' THEN
+        INSERT INTO autocomplete_terms AS terms (field, value, uses)
+        SELECT new_terms.field, new_terms.value, 1 FROM (
+            SELECT 'makes', NEW.make UNION SELECT 'models', NEW.model UNION SELECT 'mods', unnest(NEW.mods)
+        ) AS new_terms (field, value)
+        WHERE new_terms.value <> ''
+        ON CONFLICT (field, value) DO UPDATE SET uses = terms.uses + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+TERMS_TRIGGER = DDL('''
+DROP TRIGGER IF EXISTS projects_autocomplete_terms ON projects;
+CREATE TRIGGER projects_autocomplete_terms AFTER INSERT OR DELETE OR UPDATE OF make, model, mods, private ON projects
+    FOR EACH ROW EXECUTE PROCEDURE projects_autocomplete_terms()''')
+
+event.listen(Project.__table__, 'after_create',
+             TERMS_FUNCTION.execute_if(dialect='postgresql'))
+event.listen(Project.__table__, 'after_create',
+             TERMS_TRIGGER.execute_if(dialect='postgresql'))
+
+# field: (suggested column, filter picking the field's visible values)
+FIELDS = {
+    **{field: (autocomplete_terms.c.value, autocomplete_terms.c.field == field) for field in TERM_FIELDS},
+    'usernames': (User.username, User.private != PrivacyStatus.PRIVATE),
+}
+
+MIN_LENGTH = 2
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def suggest(field, q, limit=10):
+    '''Returns up to limit distinct values of field that start with q or are similar to it, prefix matches first.
+    Raises KeyError for an unknown field
+    '''
+    column, visible = FIELDS[field]
+    q = q.strip()
+    if len(q) < MIN_LENGTH:
+        return []
+
+    prefix = column.ilike(_escape_like(q) + '%', escape='\\')
+    stmt = select(column).where(visible, or_(prefix, column.op('%')(q))).order_by(
+        prefix.desc(), func.similarity(column, q).desc(), column).limit(limit)
+    return list(db.session.execute(stmt).scalars())
@@ -0,0 +1,65 @@
+# app > models > counters.py
+'''Triggers that keep the follower, comment, update and picture counters on projects in sync'''
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, event, text
+
+from . import db
+from .projects import Project, Update, Comment
+from .images import ProjectPicture
+from .users import Follow
+
+# counter column on projects: child table counted by it
+COUNTERS = {
+    'follower_count': Follow.__table__,
+    'comment_count': Comment.__table__,
+    'update_count': Update.__table__,
+    'picture_count': ProjectPicture.__table__,
+}
+
+# DDL runs the statement through %-formatting, so literal percent signs are doubled
+COUNTER_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION projects_count_children() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('UPDATE projects SET %%1$I = %%1$I + 1 WHERE pk = $1', TG_ARGV[0]) USING NEW.project_pk;
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE format('UPDATE projects SET %%1$I = %%1$I - 1 WHERE pk = $1', TG_ARGV[0]) USING OLD.project_pk;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql''')
+
+
+def counter_trigger(column, table):
+    '''Returns DDL creating the trigger that maintains column from inserts and deletes on table'''
+    return DDL(f'''
+DROP TRIGGER IF EXISTS {table.name}_count ON {table.name};
+CREATE TRIGGER {table.name}_count AFTER INSERT OR DELETE ON {table.name}
+    FOR EACH ROW EXECUTE PROCEDURE projects_count_children('{column}')''')
+
+
+event.listen(Project.__table__, 'after_create',
+             COUNTER_FUNCTION.execute_if(dialect='postgresql'))
+for column, table in COUNTERS.items():
+    event.listen(table, 'after_create', counter_trigger(
+        column, table).execute_if(dialect='postgresql'))
+
+
+RECOUNT = text('UPDATE projects SET ' + ', '.join(
+    f'{column} = (SELECT count(*) FROM {table.name} WHERE {table.name}.project_pk = projects.pk)'
+    for column, table in COUNTERS.items()))
+
+
+def recount():
+    '''Recomputes every project counter from its child table and commits'''
+    db.session.execute(RECOUNT)
+    db.session.commit()
+
+
+@click.command('recount-projects')
+@with_appcontext
+def recount_command():
+    '''Recomputes the follower, comment, update and picture counters on projects'''
+    recount()
+    click.echo('Project counters recomputed')
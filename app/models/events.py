@@ -0,0 +1,185 @@
+# app > models > events.py
+'''After-commit model events.
+
+Handlers are registered per model class and change ('insert', 'update' or 'delete'):
+
+    @events.on(Project, 'update')
+    def project_changed(project): ...
+
+    @events.on(Comment, 'insert', batch=True)
+    def comments_added(comments): ...
+
+Only classes with a handler, or with a __commit_insert__, __commit_update__ or __commit_delete__ method, are
+tracked. Changes are collected as they are flushed and delivered once the outermost transaction commits.
+Changes flushed inside a savepoint that rolls back are dropped, as is everything on a full rollback. Batch
+handlers get one call per model class and change per commit. Deferred handlers run on a background executor
+inside an app context. Because the instances belong to the committing thread's session, deferred handlers get a
+dict of each row's column values as of the flush instead.
+'''
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from .routing import RoutingSession
+
+CHANGES = ('insert', 'update', 'delete')
+PENDING_KEY = 'model_events'
+COMMITTED_KEY = 'committed_model_events'
+
+
+class EventBus(object):
+    '''Dispatches model changes to handlers after the transaction that made them commits'''
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self._handlers = {}
+        self._tracked = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MODEL_EVENTS_WORKERS', 2)
+        self.app = app
+        workers = app.config['MODEL_EVENTS_WORKERS']
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='model-events') if workers else None
+        app.extensions['model_events'] = self
+
+    def on(self, model, change, batch=False, defer=False):
+        '''Decorator registering a handler for change on model and its subclasses
+
+        :param batch: call the handler once per commit with a list instead of once per row
+        :param defer: run the handler on the background executor with column value dicts
+        '''
+        if change not in CHANGES:
+            raise ValueError(f'Unknown change {change!r}')
+
+        def register(handler):
+            self._handlers.setdefault((model, change), []).append(
+                (handler, batch, defer))
+            self._tracked.clear()
+            return handler
+        return register
+
+    def _handlers_for(self, cls, change):
+        for klass in cls.__mro__:
+            yield from self._handlers.get((klass, change), ())
+
+    def tracks(self, cls):
+        '''Returns the set of changes anything listens for on cls'''
+        changes = self._tracked.get(cls)
+        if changes is None:
+            changes = {change for change in CHANGES
+                       if hasattr(cls, f'__commit_{change}__') or any(self._handlers_for(cls, change))}
+            self._tracked[cls] = changes
+        return changes
+
+    def _snapshot(self, obj):
+        return {attr.key: getattr(obj, attr.key, None) for attr in inspect(type(obj)).column_attrs}
+
+    def collect(self, session):
+        '''Records the tracked changes of a flush against the transaction it was flushed in'''
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        pending = session.info.setdefault(PENDING_KEY, [])
+        for change, objs in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+            for obj in objs:
+                if change not in self.tracks(type(obj)):
+                    continue
+                if change == 'update' and not session.is_modified(obj, include_collections=False):
+                    continue
+                snapshot = self._snapshot(obj) if any(
+                    defer for _, _, defer in self._handlers_for(type(obj), change)) else None
+                pending.append((transaction, obj, change, snapshot))
+
+    def discard(self, session, transaction):
+        '''Drops the changes flushed in transaction or any savepoint inside it'''
+        def inside(txn):
+            while txn is not None:
+                if txn is transaction:
+                    return True
+                txn = txn.parent
+            return False
+        pending = session.info.get(PENDING_KEY)
+        if pending:
+            pending[:] = [entry for entry in pending if not inside(entry[0])]
+
+    def committed(self, session):
+        '''Marks pending changes as committed once the outermost transaction commits'''
+        if session.get_nested_transaction() is not None:
+            return
+        pending = session.info.pop(PENDING_KEY, None)
+        if pending:
+            session.info.setdefault(COMMITTED_KEY, []).extend(pending)
+
+    def deliver(self, session):
+        '''Dispatches every committed change. Runs after the transaction ends so handlers may query'''
+        pending = session.info.pop(COMMITTED_KEY, None)
+        if not pending:
+            return
+
+        # one entry per object and change, and an insert covers later updates in the same commit
+        changes = OrderedDict()
+        inserted = {id(obj) for _, obj, change, _ in pending if change == 'insert'}
+        for _, obj, change, snapshot in pending:
+            if change == 'update' and id(obj) in inserted:
+                continue
+            changes.setdefault((id(obj), change), (obj, change, snapshot))
+
+        batches = OrderedDict()
+        for obj, change, snapshot in changes.values():
+            hook = getattr(obj, f'__commit_{change}__', None)
+            if hook is not None:
+                self._call(hook)
+            for handler, batch, defer in self._handlers_for(type(obj), change):
+                arg = snapshot if defer else obj
+                if batch:
+                    batches.setdefault((handler, defer), []).append(arg)
+                else:
+                    self._dispatch(handler, arg, defer)
+        for (handler, defer), args in batches.items():
+            self._dispatch(handler, args, defer)
+
+    def _dispatch(self, handler, arg, defer):
+        if defer and self.executor is not None:
+            self.executor.submit(self._run_deferred, handler, arg)
+        else:
+            self._call(handler, arg)
+
+    def _run_deferred(self, handler, arg):
+        with self.app.app_context():
+            self._call(handler, arg)
+
+    def _call(self, handler, *args):
+        # the data is already committed, so a failing handler is logged rather than raised
+        try:
+            handler(*args)
+        except Exception:
+            current_app.logger.exception(
+                'Model event handler %r failed', handler)
+
+
+events = EventBus()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def collect_changes(session, flush_context):
+    events.collect(session)
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def discard_changes(session, previous_transaction):
+    events.discard(session, previous_transaction)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def commit_changes(session):
+    events.committed(session)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def deliver_changes(session, transaction):
+    if transaction.parent is None:
+        events.deliver(session)
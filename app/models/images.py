@@ -1,8 +1,10 @@
 # app > models > images.py
+from sqlalchemy import select, update
 from werkzeug.utils import secure_filename
 
 from . import db
-from .mixins import base, timestamps
+from .mixins import base, timestamps, transaction
+from .projects import Project
 
 
 class ImageBase(base, timestamps, object):
@@ -39,7 +41,34 @@ class ProfilePicture(ImageBase, db.Model):
 class ProjectPicture(ImageBase, db.Model):
     '''Model for pictures that are attached to projects'''
     __tablename__ = 'project_pictures'
+    __table_args__ = (
+        db.Index('ix_project_pictures_project_pk_created_at',
+                 'project_pk', 'created_at', 'pk'),
+    )
 
     project_pk = db.Column(db.Integer, db.ForeignKey(
         'projects.pk', ondelete="cascade"), nullable=False)
     description = db.Column(db.String(120))
+
+    @classmethod
+    def create(cls, filename, project, ip):
+        '''Adds a picture to a project and makes it the project's cover picture if it has none'''
+        with transaction():
+            picture = super().create(filename=filename, project=project, ip=ip)
+            db.session.execute(update(Project).where(
+                Project.pk == project.pk, Project.cover_picture_pk.is_(None)
+            ).values(cover_picture_pk=picture.pk).execution_options(synchronize_session=False))
+            db.session.expire(project, ['cover_picture_pk', 'cover_picture'])
+        return picture
+
+    def delete(self):
+        '''Deletes picture. If it was its project's cover, the oldest remaining picture becomes the cover'''
+        cls = type(self)
+        next_cover = select(cls.pk).where(
+            cls.project_pk == self.project_pk, cls.pk != self.pk
+        ).order_by(cls.pk).limit(1).scalar_subquery()
+        with transaction():
+            db.session.execute(update(Project).where(
+                Project.pk == self.project_pk, Project.cover_picture_pk == self.pk
+            ).values(cover_picture_pk=next_cover).execution_options(synchronize_session=False))
+            super().delete()
@@ -1,11 +1,44 @@
 # app > models > mixins.py
+from contextlib import ContextDecorator
 from datetime import datetime
+from sqlalchemy import tuple_
 from sqlalchemy.exc import NoResultFound
 
 from . import db
 from app.utils import generate_uuid_hex
 
 
+class transaction(ContextDecorator):
+    '''Context manager and decorator that groups model writes into a single commit.
+
+    Inside a transaction model methods flush instead of committing. The outermost block commits on exit and
+    rolls back on an exception. Nested blocks run in a savepoint, so an exception only undoes that block.
+    '''
+
+    @staticmethod
+    def active():
+        '''Returns True if a transaction block is open on the current session'''
+        return bool(db.session.info.get('transactions'))
+
+    def __enter__(self):
+        stack = db.session.info.setdefault('transactions', [])
+        stack.append(db.session.begin_nested() if stack else None)
+        return db.session
+
+    def __exit__(self, exc_type, exc, tb):
+        savepoint = db.session.info['transactions'].pop()
+        if savepoint is not None:
+            if exc_type is None:
+                savepoint.commit()
+            elif savepoint.is_active:
+                savepoint.rollback()
+        elif exc_type is None:
+            base._commit()
+        else:
+            db.session.rollback()
+        return False
+
+
 class base(object):
     '''Mixin for an auto increment int primary key and a unique hex UUID'''
     pk = db.Column(db.Integer, primary_key=True)
@@ -14,7 +47,10 @@ class base(object):
 
     @staticmethod
     def _commit():
-        '''Tries to commit session to db and rollsback session on exception'''
+        '''Tries to commit session to db and rollsback session on exception. Only flushes inside a transaction()'''
+        if transaction.active():
+            db.session.flush()
+            return
         try:
             db.session.commit()
         except:
@@ -60,6 +96,19 @@ class base(object):
         db.session.delete(self)
         self._commit()
 
+    @classmethod
+    def create_many(cls, rows):
+        '''Calls create() with each dict of arguments in rows and commits once. Returns the created objects'''
+        with transaction():
+            return [cls.create(**row) for row in rows]
+
+    @classmethod
+    def delete_many(cls, objs):
+        '''Deletes every object in objs and commits once'''
+        with transaction():
+            for obj in objs:
+                obj.delete()
+
 
 class timestamps(object):
     '''Mixin for creation date and auto last_edit date columns'''
@@ -68,3 +117,39 @@ class timestamps(object):
     last_edit = db.Column(db.DateTime, nullable=False,
                           default=datetime.utcnow, onupdate=datetime.utcnow)
     is_edited = db.Column(db.Boolean, default=False)
+
+
+class keyset(object):
+    '''Mixin for keyset pagination of a project's rows, newest first. Requires the timestamps mixin'''
+    PER_PAGE = 20
+
+    @staticmethod
+    def encode_cursor(row):
+        '''Returns a cursor pointing just past row'''
+        return f'{row.created_at.isoformat()}~{row.pk}'
+
+    @staticmethod
+    def decode_cursor(cursor):
+        '''Returns the (created_at, pk) a cursor points past. Raises ValueError if malformed'''
+        created_at, pk = cursor.split('~')
+        return datetime.fromisoformat(created_at), int(pk)
+
+    @classmethod
+    def get_page(cls, project_pk, cursor=None, per_page=None, options=()):
+        '''Returns a page of rows for a project and the cursor of the next page, or None on the last page
+
+        :param cursor: cursor returned with the previous page
+        :param per_page: number of rows per page, defaults to PER_PAGE
+        :param options: loader options applied to the query
+        '''
+        per_page = per_page or cls.PER_PAGE
+        query = cls.query.filter_by(project_pk=project_pk)
+        if cursor:
+            query = query.filter(tuple_(cls.created_at, cls.pk) <
+                                 tuple_(*cls.decode_cursor(cursor)))
+        rows = query.options(*options).order_by(
+            cls.created_at.desc(), cls.pk.desc()).limit(per_page + 1).all()
+
+        if len(rows) > per_page:
+            return rows[:per_page], cls.encode_cursor(rows[per_page - 1])
+        return rows, None
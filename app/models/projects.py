@@ -1,20 +1,31 @@
 # app > models > projects.py
 
-from sqlalchemy import CheckConstraint
-from sqlalchemy.dialects.postgresql import ARRAY, ENUM
+from sqlalchemy import CheckConstraint, delete, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, ENUM, TSVECTOR, insert as pg_insert
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import joinedload, selectinload
 
 from . import db
-from .mixins import base, timestamps
+from .mixins import base, timestamps, keyset
 from .enums import PrivacyStatus, Drivetrain
-from .users import User
+from .users import User, Follow
 from ..utils import assert_in_range
 
 
+
+class ModConflict(Exception):
+    '''Raised when the mod at an index is not the mod the caller expected to change'''
+
+
 class Project(base, timestamps, db.Model):
     '''Project car class. Each project car has one owner'''
     __tablename__ = 'projects'
+    __table_args__ = (
+        db.Index('ix_projects_user_pk_private', 'user_pk', 'private'),
+        db.Index('ix_projects_search_vector', 'search_vector',
+                 postgresql_using='gin'),
+    )
 
     user_pk = db.Column(db.Integer, db.ForeignKey(
         'users.pk', ondelete="cascade"), nullable=False)
@@ -37,8 +48,27 @@ class Project(base, timestamps, db.Model):
     drivetrain = db.Column(ENUM(Drivetrain))
     engine_size = db.Column(db.Float)
 
+    # maintained by triggers in counters.py
+    follower_count = db.Column(db.Integer, nullable=False,
+                               default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False,
+                              default=0, server_default='0')
+    update_count = db.Column(db.Integer, nullable=False,
+                             default=0, server_default='0')
+    picture_count = db.Column(db.Integer, nullable=False,
+                              default=0, server_default='0')
+
+    # maintained by a trigger in search.py
+    search_vector = db.deferred(db.Column(TSVECTOR))
+
+    # kept pointing at the oldest picture by ProjectPicture.create and delete
+    cover_picture_pk = db.Column(db.Integer, db.ForeignKey(
+        'project_pictures.pk', ondelete="set null", use_alter=True, name='fk_projects_cover_picture'))
+
     pictures = db.relationship(
-        'ProjectPicture', cascade="all,delete-orphan", backref='project')
+        'ProjectPicture', cascade="all,delete-orphan", backref='project', foreign_keys='ProjectPicture.project_pk')
+    cover_picture = db.relationship(
+        'ProjectPicture', foreign_keys=[cover_picture_pk], viewonly=True)
     updates = db.relationship(
         'Update', cascade="all,delete-orphan", backref='project')
     comments = db.relationship(
@@ -63,6 +93,29 @@ class Project(base, timestamps, db.Model):
             return project
         raise NoResultFound()
 
+    @classmethod
+    def get_for_page(cls, id):
+        '''Get project by id with everything the project page renders loaded in a fixed number of queries'''
+        project = cls.query.filter_by(id=id).options(
+            joinedload(cls.user),
+            selectinload(cls.pictures),
+        ).first()
+        if project:
+            return project
+        raise NoResultFound()
+
+    @classmethod
+    def get_listing(cls, user_pk, include_private=False):
+        '''Get a user's projects for their profile with each cover picture joined in the same query
+
+        :param include_private: include PRIVATE and UNLISTED projects, for the owner's own listing
+        '''
+        query = cls.query.filter_by(user_pk=user_pk).options(
+            joinedload(cls.cover_picture))
+        if not include_private:
+            query = query.filter_by(private=PrivacyStatus.PUBLIC)
+        return query.order_by(cls.created_at).all()
+
     @classmethod
     def create(cls, user_pk, name, description, model_id, private, year, make, model, horsepower, torque, weight, drivetrain, engine_size):
         '''Create new project '''
@@ -87,8 +140,16 @@ class Project(base, timestamps, db.Model):
         cls._commit()
         return project
 
+    def _write_follow(self, user, stmt):
+        '''Runs a single statement against followers and expires the collections and counter it changes'''
+        result = db.session.execute(stmt)
+        db.session.expire(self, ['followers', 'follower_count'])
+        db.session.expire(user, ['following'])
+        self._commit()
+        return bool(result.rowcount)
+
     def add_follow(self, user=None, id=None):
-        '''Add a user to a projects followers list
+        '''Add a user to a projects followers list. Returns False if the user was already following
 
         :param user: passed user to add to followers
         :param id: id of user to add to followers
@@ -96,42 +157,121 @@ class Project(base, timestamps, db.Model):
         if not user:
             user = User.get_by_id(id)
 
-        self.followers.append(user)
-        self._commit()
+        added = self._write_follow(user, pg_insert(Follow).values(
+            user_pk=user.pk, project_pk=self.pk).on_conflict_do_nothing())
+        user.follow_cache[self.pk] = True
+        return added
 
     def remove_follow(self, user=None, id=None):
-        '''Remove a user to a projects followers list
+        '''Remove a user from a projects followers list. Returns False if the user was not following
 
-        :param user: passed user to add to followers
-        :param id: id of user to add to followers
+        :param user: passed user to remove from followers
+        :param id: id of user to remove from followers
         '''
         if not user:
             user = User.get_by_id(id)
 
-        self.followers.remove(user)
-        self._commit()
+        removed = self._write_follow(user, delete(Follow).where(
+            Follow.user_pk == user.pk, Follow.project_pk == self.pk))
+        user.follow_cache[self.pk] = False
+        return removed
+
+    def get_followers_page(self, cursor=None, per_page=20):
+        '''Returns a page of (pk, username, profile_picture) rows for the project's followers ordered by user pk,
+        and the cursor of the next page or None on the last page. Only those columns are loaded.
+
+        :param cursor: cursor returned with the previous page
+        '''
+        query = select(User.pk, User.username, User.profile_picture).join(
+            Follow, Follow.user_pk == User.pk).where(Follow.project_pk == self.pk)
+        if cursor:
+            query = query.where(Follow.user_pk > int(cursor))
+        rows = db.session.execute(query.order_by(
+            Follow.user_pk).limit(per_page + 1)).all()
+
+        if len(rows) > per_page:
+            return rows[:per_page], str(rows[per_page - 1].pk)
+        return rows, None
+
+    def _update_mods(self, stmt):
+        '''Runs an UPDATE on this project's row and returns the number of rows changed'''
+        result = db.session.execute(
+            stmt.execution_options(synchronize_session=False))
+        db.session.expire(self, ['mods'])
+        return result.rowcount
 
     def add_mod(self, mod):
-        '''Add mod to projects mod list'''
+        '''Add mod to projects mod list with an atomic array_append and log it for activity feeds'''
         assert_in_range(len(mod), 1, 50)
-        self.mods.append(mod)
+        cls = type(self)
+        self._update_mods(update(cls).where(cls.pk == self.pk).values(
+            mods=func.array_append(cls.mods, mod)))
+        db.session.add(ModAddition(project_pk=self.pk, mod=mod))
         self._commit()
 
-    def delete_mod(self, index):
-        '''Takes index of mod to delete and deletes it from project.mods'''
-        self.mods.pop(index)
-        self._commit()
+    def delete_mod(self, index, expected=None):
+        '''Takes index of mod to delete and deletes it from project.mods without loading the row.
+
+        :param index: 0 based index of the mod to delete
+        :param expected: the mod the caller expects at index. Raises ModConflict if a different mod is there
+        Raises IndexError if there is no mod at index
+        '''
+        cls = type(self)
+        # postgres arrays are 1 based, so the mod at index is mods[index + 1]
+        stmt = update(cls).where(cls.pk == self.pk).values(
+            mods=cls.mods[1:index] + cls.mods[index + 2:func.array_length(cls.mods, 1)])
+        if expected is None:
+            stmt = stmt.where(func.array_length(cls.mods, 1) > index)
+        else:
+            stmt = stmt.where(cls.mods[index + 1] == expected)
 
+        if index >= 0 and self._update_mods(stmt):
+            # a mod no longer on the project drops out of feeds
+            db.session.execute(delete(ModAddition).where(
+                ModAddition.project_pk == self.pk,
+                func.array_position(select(cls.mods).where(cls.pk == self.pk).scalar_subquery(),
+                                    ModAddition.mod).is_(None)
+            ).execution_options(synchronize_session=False))
+            self._commit()
+            return
 
-class Update(base, timestamps, db.Model):
+        mods = db.session.execute(
+            select(cls.mods).where(cls.pk == self.pk)).scalar()
+        if index < 0 or index >= len(mods or []):
+            raise IndexError('mod index out of range')
+        raise ModConflict(f'Mod at index {index} is not {expected!r}')
+
+
+class ModAddition(base, timestamps, db.Model):
+    '''Log of mods added to a project, kept so new mods can show up in activity feeds'''
+    __tablename__ = 'mod_additions'
+    __table_args__ = (
+        db.Index('ix_mod_additions_project_pk_created_at',
+                 'project_pk', 'created_at', 'pk'),
+    )
+
+    project_pk = db.Column(db.Integer, db.ForeignKey(
+        'projects.pk', ondelete="cascade"), nullable=False)
+    mod = db.Column(db.String(50), nullable=False)
+
+
+class Update(base, timestamps, keyset, db.Model):
     '''Table that holds update posts to a project'''
     __tablename__ = 'updates'
+    __table_args__ = (
+        db.Index('ix_updates_project_pk_created_at',
+                 'project_pk', 'created_at', 'pk'),
+        db.Index('ix_updates_search_vector', 'search_vector',
+                 postgresql_using='gin'),
+    )
 
     project_pk = db.Column(db.Integer, db.ForeignKey(
         'projects.pk', ondelete="cascade"))
     title = db.Column(db.String(60))
     content = db.Column(db.String(1000), CheckConstraint(
         "LENGTH(content) > 0"), nullable=False)
+    # maintained by a trigger in search.py
+    search_vector = db.deferred(db.Column(TSVECTOR))
 
     @classmethod
     def create(cls, project_id, title, content):
@@ -144,9 +284,13 @@ class Update(base, timestamps, db.Model):
         return update
 
 
-class Comment(base, timestamps, db.Model):
+class Comment(base, timestamps, keyset, db.Model):
     '''Table that holds comments other users can make for a project '''
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_project_pk_created_at',
+                 'project_pk', 'created_at', 'pk'),
+    )
 
     user_pk = db.Column(db.Integer, db.ForeignKey(
         'users.pk', ondelete="cascade"), nullable=False)
@@ -166,3 +310,9 @@ class Comment(base, timestamps, db.Model):
         db.session.add(comment)
         cls._commit()
         return comment
+
+    @classmethod
+    def get_page(cls, project_pk, cursor=None, per_page=None):
+        '''Returns a page of a project's comments with their authors loaded, and the next page's cursor'''
+        return super().get_page(project_pk, cursor=cursor, per_page=per_page,
+                                options=[joinedload(cls.user)])
@@ -0,0 +1,94 @@
+# app > models > routing.py
+'''Read/write splitting between the primary database and a read replica.
+
+When SQLALCHEMY_BINDS has a 'replica' key, queries made while handling a GET or HEAD request read from it.
+Everything else uses the primary: flushes, INSERT/UPDATE/DELETE statements, other request methods, and work
+outside a request. Any write marks the user's session so their reads stay on the primary for
+REPLICA_STICKY_SECONDS, which lets them read their own writes. Reads also stay on the primary while the replica
+is more than REPLICA_MAX_LAG seconds behind.
+'''
+import threading
+import time
+
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+PRIMARY_UNTIL_KEY = '_primary_until'
+
+REPLICA_LAG = text('''SELECT CASE WHEN pg_is_in_recovery()
+    THEN coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END''')
+
+
+class ReplicaLag(object):
+    '''Per process record of how far behind the replica is, refreshed at most every REPLICA_LAG_CHECK_INTERVAL'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = float('-inf')
+        self._lagging = False
+
+    def lagging(self, engine):
+        '''Returns True if the replica is too far behind or could not be checked'''
+        config = current_app.config
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < config['REPLICA_LAG_CHECK_INTERVAL']:
+                return self._lagging
+            self._checked = now
+        try:
+            with engine.connect() as conn:
+                lag = conn.execute(REPLICA_LAG).scalar()
+            lagging = lag > config['REPLICA_MAX_LAG']
+        except SQLAlchemyError:
+            current_app.logger.exception('Replica lag check failed')
+            lagging = True
+        self._lagging = lagging
+        return lagging
+
+    def reset(self):
+        with self._lock:
+            self._checked = float('-inf')
+            self._lagging = False
+
+
+replica_lag = ReplicaLag()
+
+
+def mark_write():
+    '''Keeps the current user's reads on the primary for REPLICA_STICKY_SECONDS'''
+    if has_request_context():
+        session[PRIMARY_UNTIL_KEY] = time.time() + \
+            current_app.config['REPLICA_STICKY_SECONDS']
+
+
+def reads_primary():
+    '''Returns True if the current request must read from the primary'''
+    if not has_request_context() or request.method not in READ_METHODS:
+        return True
+    return session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+class RoutingSession(Session):
+    '''Session that sends reads made by GET and HEAD requests to the replica bind'''
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None and not reads_primary() and not replica_lag.lagging(replica):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def flushed(session, flush_context):
+    mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def executed(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_write()
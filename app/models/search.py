@@ -0,0 +1,119 @@
+# app > models > search.py
+'''Full text search over projects and updates.
+
+Each table has a search_vector column that a BEFORE trigger rebuilds whenever a searched column changes,
+and a GIN index over it. Queries are parsed with websearch_to_tsquery, so quotes, OR and -word work.
+'''
+from sqlalchemy import DDL, Float, cast, event, func, or_, select, tuple_
+
+from . import db
+from .enums import PrivacyStatus
+from .users import User
+from .projects import Project, Update
+
+SEARCH_CONFIG = 'english'
+
+# table: (function body building NEW.search_vector, columns that feed it)
+SEARCH_VECTORS = {
+    Project.__table__: ('''
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.make, '') || ' ' || coalesce(NEW.model, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(array_to_string(NEW.mods, ' '), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')''',
+        ('name', 'description', 'make', 'model', 'mods')),
+    Update.__table__: ('''
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B')''',
+        ('title', 'content')),
+}
+
+
+def search_function(table):
+    '''Returns DDL creating the trigger function that builds search_vector for table'''
+    expression, _ = SEARCH_VECTORS[table]
+    return DDL(f'''
+CREATE OR REPLACE FUNCTION {table.name}_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {expression};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql''')
+
+
+def search_trigger(table):
+    '''Returns DDL creating the trigger that keeps search_vector current on table'''
+    _, columns = SEARCH_VECTORS[table]
+    return DDL(f'''
+DROP TRIGGER IF EXISTS {table.name}_search ON {table.name};
+CREATE TRIGGER {table.name}_search BEFORE INSERT OR UPDATE OF {', '.join(columns)} ON {table.name}
+    FOR EACH ROW EXECUTE PROCEDURE {table.name}_search_vector()''')
+
+
+for table in SEARCH_VECTORS:
+    event.listen(table, 'after_create',
+                 search_function(table).execute_if(dialect='postgresql'))
+    event.listen(table, 'after_create',
+                 search_trigger(table).execute_if(dialect='postgresql'))
+
+
+def encode_cursor(row):
+    '''Returns a search cursor pointing just past row'''
+    return f'{row.rank!r}~{row.pk}'
+
+
+def decode_cursor(cursor):
+    '''Returns the (rank, pk) a search cursor points past. Raises ValueError if malformed'''
+    rank, pk = cursor.split('~')
+    return float(rank), int(pk)
+
+
+def _visible(viewer_pk):
+    '''Public projects, and every project of the viewer'''
+    visible = Project.private == PrivacyStatus.PUBLIC
+    if viewer_pk:
+        visible = or_(visible, Project.user_pk == viewer_pk)
+    return visible
+
+
+def _search(model, columns, joins, q, viewer_pk, cursor, per_page):
+    '''Returns a page of rows matching q on model ranked best first, and the next page's cursor'''
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    # ts_rank returns a real, widened so the rank in a cursor compares exactly
+    rank = cast(func.ts_rank(model.search_vector, query), Float(precision=53))
+    stmt = select(*columns, rank.label('rank'))
+    for target, onclause in joins:
+        stmt = stmt.join(target, onclause)
+    stmt = stmt.where(model.search_vector.op('@@')(query), _visible(viewer_pk))
+    if cursor:
+        stmt = stmt.where(tuple_(rank, model.pk) <
+                          tuple_(*decode_cursor(cursor)))
+    rows = db.session.execute(stmt.order_by(
+        rank.desc(), model.pk.desc()).limit(per_page + 1)).all()
+
+    if len(rows) > per_page:
+        return rows[:per_page], encode_cursor(rows[per_page - 1])
+    return rows, None
+
+
+def search_projects(q, viewer_pk=None, cursor=None, per_page=20):
+    '''Returns a page of projects matching q ranked best first, and the cursor of the next page or None.
+    Only public projects and the viewer's own are searched.
+
+    Rows have pk, id, name, description, year, make, model, username and rank.
+    '''
+    columns = (Project.pk, Project.id, Project.name, Project.description,
+               Project.year, Project.make, Project.model, User.username)
+    joins = [(User, User.pk == Project.user_pk)]
+    return _search(Project, columns, joins, q, viewer_pk, cursor, per_page)
+
+
+def search_updates(q, viewer_pk=None, cursor=None, per_page=20):
+    '''Returns a page of updates matching q ranked best first, and the cursor of the next page or None.
+    Only updates on public projects and the viewer's own are searched.
+
+    Rows have pk, title, content, created_at, project_id, project_name and rank.
+    '''
+    columns = (Update.pk, Update.title, Update.content, Update.created_at,
+               Project.id.label('project_id'), Project.name.label('project_name'))
+    joins = [(Project, Project.pk == Update.project_pk)]
+    return _search(Update, columns, joins, q, viewer_pk, cursor, per_page)
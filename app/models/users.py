@@ -2,11 +2,10 @@
 
 from datetime import datetime
 
-from flask import g
-from sqlalchemy import CheckConstraint
+from flask import g, has_app_context
+from sqlalchemy import CheckConstraint, exists, select
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.dialects.postgresql import ENUM
-from flask_bcrypt import Bcrypt
 from flask_login import UserMixin
 
 from . import db
@@ -14,14 +13,17 @@ from .mixins import base
 from .enums import PrivacyStatus
 from ..utils import assert_in_range
 
+from app import user_cache, hasher
 from app.bcolors import bcolors
 
-bcrypt = Bcrypt()
-
 
 class User(UserMixin, base, db.Model):
     '''User model'''
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_username_trgm', 'username', postgresql_using='gin',
+                 postgresql_ops={'username': 'gin_trgm_ops'}),
+    )
 
     username = db.Column(db.String(20), CheckConstraint(
         "LENGTH(username) > 4"), unique=True, nullable=False)
@@ -34,6 +36,9 @@ class User(UserMixin, base, db.Model):
                         nullable=False, default="PUBLIC")
     profile_picture = db.Column(
         db.Text, default="../default.png")
+    # set by sync-feeds for users who follow enough projects that their feed is kept in feed_entries
+    feed_materialized = db.Column(db.Boolean, nullable=False,
+                                  default=False, server_default='false')
 
     projects = db.relationship('Project', cascade="all,delete", backref='user')
     following = db.relationship(
@@ -44,7 +49,7 @@ class User(UserMixin, base, db.Model):
     def _generate_password(password):
         '''Returns hashed password if password is between length reqs'''
         assert_in_range(len(password), 8, 32)
-        return bcrypt.generate_password_hash(password).decode('UTF-8')
+        return hasher.generate_password_hash(password)
 
     def __repr__(self):
         return '<User %r>' % self.username
@@ -59,7 +64,8 @@ class User(UserMixin, base, db.Model):
 
     @classmethod
     def authenticate(cls, password, user=None, username=None, id=None):
-        '''Check if password hash matches and returns the user or None
+        '''Check if password hash matches and returns the user or None.
+        Rehashes the password if it was hashed with a different work factor than BCRYPT_LOG_ROUNDS
 
         :param user: Passed user object to validate password for
         :param id: Id of user to validate password for
@@ -71,9 +77,14 @@ class User(UserMixin, base, db.Model):
             if id:
                 user = cls.get_by_id(id)
 
-        if user:
-            return user if bcrypt.check_password_hash(user.password, password) else None
-        return None
+        if not user or not hasher.check_password_hash(user.password, password):
+            return None
+
+        if hasher.needs_rehash(user.password):
+            user.password = cls._generate_password(password=password)
+            cls._commit()
+            user_cache.bump(user)
+        return user
 
     def update_login_time(self):
         '''Update last login time'''
@@ -93,6 +104,7 @@ class User(UserMixin, base, db.Model):
         )
         db.session.add(user)
         cls._commit()
+        user_cache.bump(user)
         return user
 
     def edit(self, username=None, password=None, email=None, private=None):
@@ -100,17 +112,54 @@ class User(UserMixin, base, db.Model):
         hashed_password = self._generate_password(
             password=password) if password else None
 
-        return super().edit(
+        user = super().edit(
             username=username,
             password=hashed_password,
             email=email,
             private=private
         )
+        user_cache.bump(user)
+        return user
+
+    def delete(self):
+        '''Deletes user and drops them from the user cache'''
+        super().delete()
+        user_cache.bump(self)
+
+    @property
+    def follow_cache(self):
+        '''Dict of project pk to follow state already looked up for this user during the request'''
+        if not has_app_context():
+            return {}
+        return g.setdefault('follow_cache', {}).setdefault(self.pk, {})
+
+    def is_following(self, project):
+        '''Returns True if user follows project. Checked with an EXISTS query once per request'''
+        cache = self.follow_cache
+        if project.pk not in cache:
+            cache[project.pk] = db.session.query(exists().where(
+                Follow.user_pk == self.pk, Follow.project_pk == project.pk)).scalar()
+        return cache[project.pk]
+
+    def following_among(self, project_pks):
+        '''Returns the set of project_pks that user follows, looking up any not yet cached in one query'''
+        project_pks = set(project_pks)
+        cache = self.follow_cache
+        missing = project_pks - cache.keys()
+        if missing:
+            followed = set(db.session.execute(select(Follow.project_pk).where(
+                Follow.user_pk == self.pk, Follow.project_pk.in_(missing))).scalars())
+            cache.update({pk: pk in followed for pk in missing})
+        return {pk for pk in project_pks if cache[pk]}
 
 
 class Follow(db.Model):
     '''Table that connects a user to a project for the sake of following the project'''
     __tablename__ = 'followers'
+    __table_args__ = (
+        # followers pages walk a project's followers in user pk order
+        db.Index('ix_followers_project_pk_user_pk', 'project_pk', 'user_pk'),
+    )
 
     user_pk = db.Column(db.Integer, db.ForeignKey(
         'users.pk', ondelete="cascade"), primary_key=True)
@@ -0,0 +1,172 @@
+# app > models > vehicles.py
+'''Local copy of the CarQuery vehicle database that the new project form picks cars from'''
+import csv
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.dialects.postgresql import ENUM, insert as pg_insert
+
+from . import db
+from .enums import Drivetrain
+
+PS_TO_HP = 0.98632
+NM_TO_FT_LB = 0.737562
+KG_TO_LB = 2.20462
+
+IMPORT_BATCH = 1000
+
+
+class Vehicle(db.Model):
+    '''A year, make, model and trim from CarQuery with its specs already in the units projects use'''
+    __tablename__ = 'vehicles'
+    __table_args__ = (
+        db.Index('ix_vehicles_year_make_model', 'year', 'make_id', 'model'),
+    )
+
+    # CarQuery's model_id, stored on projects as Project.model_id
+    model_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    year = db.Column(db.Integer, nullable=False)
+    make_id = db.Column(db.Text, nullable=False)
+    make = db.Column(db.Text, nullable=False)
+    model = db.Column(db.Text, nullable=False)
+    trim = db.Column(db.Text)
+
+    horsepower = db.Column(db.Integer)
+    torque = db.Column(db.Integer)
+    weight = db.Column(db.Integer)
+    drivetrain = db.Column(ENUM(Drivetrain))
+    engine_size = db.Column(db.Float)
+    sold_in_us = db.Column(db.Boolean, nullable=False, default=False)
+    # CarQuery's make_is_common, so the picker can list the common makes first
+    make_is_common = db.Column(db.Boolean, nullable=False,
+                               default=False, server_default='false')
+
+    def __repr__(self):
+        return '<Vehicle %r>' % self.model_id
+
+    def to_dict(self):
+        return {
+            'model_id': self.model_id,
+            'year': self.year,
+            'make': self.make,
+            'model': self.model,
+            'trim': self.trim,
+            'horsepower': self.horsepower,
+            'torque': self.torque,
+            'weight': self.weight,
+            'drivetrain': self.drivetrain.value if self.drivetrain else None,
+            'engine_size': self.engine_size,
+        }
+
+    @classmethod
+    def get_years(cls, sold_in_us=True):
+        '''Returns every catalog year, newest first'''
+        query = db.session.query(cls.year).distinct()
+        if sold_in_us:
+            query = query.filter(cls.sold_in_us.is_(True))
+        return [year for year, in query.order_by(cls.year.desc())]
+
+    @classmethod
+    def get_makes(cls, year, sold_in_us=True):
+        '''Returns (make_id, make) for every make in a year, common makes first, each group ordered by name'''
+        query = db.session.query(cls.make_id, cls.make, cls.make_is_common).filter_by(
+            year=year).distinct()
+        if sold_in_us:
+            query = query.filter(cls.sold_in_us.is_(True))
+        return [(make_id, make) for make_id, make, _ in query.order_by(cls.make_is_common.desc(), cls.make)]
+
+    @classmethod
+    def get_models(cls, year, make_id, sold_in_us=True):
+        '''Returns the model names for a year and make'''
+        query = db.session.query(cls.model).filter_by(
+            year=year, make_id=make_id).distinct()
+        if sold_in_us:
+            query = query.filter(cls.sold_in_us.is_(True))
+        return [model for model, in query.order_by(cls.model)]
+
+    @classmethod
+    def get_trims(cls, year, make_id, model, sold_in_us=True):
+        '''Returns the vehicles for a year, make and model ordered by trim'''
+        query = cls.query.filter_by(year=year, make_id=make_id, model=model)
+        if sold_in_us:
+            query = query.filter(cls.sold_in_us.is_(True))
+        return query.order_by(cls.trim, cls.model_id).all()
+
+
+def _number(value):
+    '''Returns value from the dump as a float, or None when blank'''
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_drivetrain(value):
+    '''Maps CarQuery's free text model_drive to a Drivetrain, defaulting to FWD'''
+    drive = (value or '').lower()
+    if 'front' in drive:
+        return Drivetrain.FWD
+    if 'rear' in drive:
+        return Drivetrain.RWD
+    if 'all' in drive or '4wd' in drive or 'awd' in drive:
+        return Drivetrain.AWD
+    return Drivetrain.FWD
+
+
+def parse_row(row):
+    '''Converts a CarQuery dump row into Vehicle columns, converting PS to hp, Nm to ft/lb, kg to lb and cc to L'''
+    power = _number(row.get('model_engine_power_ps'))
+    torque = _number(row.get('model_engine_torque_nm'))
+    weight = _number(row.get('model_weight_kg'))
+    cc = _number(row.get('model_engine_cc'))
+    make_id = row['model_make_id'].strip().lower()
+    return {
+        'model_id': int(row['model_id']),
+        'year': int(row['model_year']),
+        'make_id': make_id,
+        'make': (row.get('model_make_display') or make_id.replace('-', ' ').title()).strip(),
+        'model': row['model_name'].strip(),
+        'trim': (row.get('model_trim') or '').strip() or None,
+        'horsepower': round(power * PS_TO_HP) if power else None,
+        'torque': round(torque * NM_TO_FT_LB) if torque else None,
+        'weight': round(weight * KG_TO_LB) if weight else None,
+        'drivetrain': parse_drivetrain(row.get('model_drive')),
+        'engine_size': round(cc / 1000, 1) if cc else None,
+        'sold_in_us': str(row.get('model_sold_in_us', '')).strip() == '1',
+        'make_is_common': str(row.get('make_is_common', '')).strip() == '1',
+    }
+
+
+def import_vehicles(rows):
+    '''Upserts CarQuery dump rows into vehicles in batches and commits once. Returns the number of rows'''
+    table = Vehicle.__table__
+    count = 0
+    batch = []
+
+    def write():
+        stmt = pg_insert(table).values(batch)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.model_id],
+            set_={column.name: stmt.excluded[column.name]
+                  for column in table.columns if not column.primary_key}))
+
+    for row in rows:
+        batch.append(parse_row(row))
+        count += 1
+        if len(batch) == IMPORT_BATCH:
+            write()
+            batch = []
+    if batch:
+        write()
+    db.session.commit()
+    return count
+
+
+@click.command('import-vehicles')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_vehicles_command(path):
+    '''Loads a CarQuery CSV dump into the vehicle catalog'''
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        count = import_vehicles(csv.DictReader(f))
+    click.echo(f'Imported {count} vehicles')
@@ -0,0 +1,142 @@
+# app > passwords.py
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    '''Raised when the password pool queue is full or a hash takes too long'''
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('UTF-8'), bcrypt.gensalt(rounds)).decode('UTF-8')
+
+
+def _check_password(pw_hash, password):
+    return bcrypt.checkpw(password.encode('UTF-8'), pw_hash.encode('UTF-8'))
+
+
+class PasswordHasher(object):
+    '''Runs bcrypt hashing and verification with a host wide cap on hashes in flight.
+
+    Gunicorn sync workers serve one request at a time, so the cap has to span workers to mean anything. Each hash
+    takes a slot row in the SQLite file at PASSWORD_POOL_DB and at most PASSWORD_POOL_QUEUE slots may be held on
+    the host, anything past that raises HasherBusy without waiting. A slot is held until its hash has actually
+    finished, even when the caller gave up after PASSWORD_POOL_TIMEOUT seconds. Hashes run in a per-worker
+    process pool of PASSWORD_POOL_WORKERS, or inline when that is 0.
+    '''
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pid = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('PASSWORD_POOL_WORKERS', os.cpu_count() or 1)
+        app.config.setdefault('PASSWORD_POOL_QUEUE', 32)
+        app.config.setdefault('PASSWORD_POOL_TIMEOUT', 10)
+        app.config.setdefault('PASSWORD_POOL_DB', os.path.join(
+            tempfile.gettempdir(), 'modlog_password_slots.sqlite3'))
+        self.app = app
+        app.extensions['password_hasher'] = self
+
+    @property
+    def rounds(self):
+        return self.app.config['BCRYPT_LOG_ROUNDS']
+
+    def _connect(self):
+        '''Returns a SQLite connection for this thread, creating the table on first use'''
+        path = self.app.config['PASSWORD_POOL_DB']
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.key == (os.getpid(), path):
+            return conn
+
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS slots (token TEXT PRIMARY KEY, taken REAL NOT NULL)')
+        self._local.conn = conn
+        self._local.key = (os.getpid(), path)
+        return conn
+
+    def _acquire(self):
+        '''Takes a slot and returns its token. Raises HasherBusy if every slot on the host is taken'''
+        conn = self._connect()
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # slots left behind by a worker killed mid hash
+            conn.execute('DELETE FROM slots WHERE taken < ?',
+                         (now - 2 * self.app.config['PASSWORD_POOL_TIMEOUT'],))
+            taken = conn.execute('SELECT COUNT(*) FROM slots').fetchone()[0]
+            if taken >= self.app.config['PASSWORD_POOL_QUEUE']:
+                conn.execute('COMMIT')
+                raise HasherBusy('Password pool queue is full')
+            conn.execute(
+                'INSERT INTO slots (token, taken) VALUES (?, ?)', (token, now))
+            conn.execute('COMMIT')
+        except HasherBusy:
+            raise
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return token
+
+    def _release(self, token):
+        self._connect().execute('DELETE FROM slots WHERE token = ?', (token,))
+
+    def _get_executor(self):
+        '''Returns the pool for this process. Pools are not shared across a fork'''
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.app.config['PASSWORD_POOL_WORKERS'])
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        token = self._acquire()
+        if not self.app.config['PASSWORD_POOL_WORKERS']:
+            try:
+                return func(*args)
+            finally:
+                self._release(token)
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except:
+            self._release(token)
+            raise
+        # the slot stays taken until the hash is done, not just until this caller stops waiting
+        future.add_done_callback(lambda future: self._release(token))
+        try:
+            return future.result(timeout=self.app.config['PASSWORD_POOL_TIMEOUT'])
+        except TimeoutError as e:
+            raise HasherBusy('Password hash timed out') from e
+
+    def generate_password_hash(self, password):
+        '''Returns a bcrypt hash of password using the configured work factor'''
+        return self._run(_hash_password, password, self.rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        '''Returns True if password matches pw_hash'''
+        return self._run(_check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        '''Returns True if pw_hash was made with a different work factor than the configured one'''
+        try:
+            return int(pw_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
@@ -0,0 +1,83 @@
+# app > pool.py
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    '''QueuePool that records how long each checkout waited, including time spent opening a new connection'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.waits += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    @property
+    def stats(self):
+        '''Checkout and wait counters for this pool'''
+        with self._wait_lock:
+            waits, total, longest = self.waits, self.wait_total, self.wait_max
+        return {
+            'size': self.size(),
+            'checked_in': self.checkedin(),
+            'checked_out': self.checkedout(),
+            'overflow': max(self.overflow(), 0),
+            'max_overflow': self._max_overflow,
+            'checkouts': waits,
+            'wait_avg_ms': round(total / waits * 1000, 3) if waits else 0,
+            'wait_max_ms': round(longest * 1000, 3),
+        }
+
+
+class PoolMonitor(object):
+    '''Times connection pool checkouts, pre-warms pools when a worker boots and reports pool stats.
+
+    Must be initialized before the db so the engines are created with TimedQueuePool. Engines configured with
+    another poolclass, such as NullPool behind PgBouncer, are left alone.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_POOL_PREWARM', 0)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'poolclass': TimedQueuePool, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+        app.extensions['pool_monitor'] = self
+
+    def prewarm(self, engines, count):
+        '''Opens count connections in each pooled engine and returns them to the pool'''
+        for engine in engines.values():
+            if not isinstance(engine.pool, QueuePool):
+                continue
+            connections = []
+            try:
+                for _ in range(min(count, engine.pool.size())):
+                    connections.append(engine.connect())
+            finally:
+                for conn in connections:
+                    conn.close()
+
+    def stats(self, engines):
+        '''Returns {bind key: pool stats} for every engine'''
+        stats = {}
+        for key, engine in engines.items():
+            pool = engine.pool
+            stats[key or 'default'] = pool.stats if isinstance(pool, TimedQueuePool) else {
+                'pool': type(pool).__name__, 'status': pool.status()}
+        return stats
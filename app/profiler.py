@@ -0,0 +1,193 @@
+# app > profiler.py
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import current_app, g, request, request_started, request_tearing_down
+from flask.cli import with_appcontext
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame_name(name, filename, line):
+    '''Returns a readable frame label, with paths inside the project made relative to it'''
+    path = os.path.abspath(filename)
+    if path.startswith(ROOT + os.sep):
+        path = os.path.relpath(path, ROOT)
+    return f'{name} ({path}:{line})'
+
+
+def collapsed_stacks(samples):
+    '''Returns samples in the collapsed stack format flamegraph.pl and speedscope read, one stack per line'''
+    return ''.join(f'{";".join(frame_name(*frame) for frame in stack)} {count}\n'
+                   for stack, count in samples.most_common())
+
+
+def speedscope(samples, name, interval, duration):
+    '''Returns samples as a speedscope sampled profile, weighted in seconds'''
+    frames, indexes = [], {}
+    stacks, weights = [], []
+    for stack, count in samples.most_common():
+        for frame in stack:
+            if frame not in indexes:
+                indexes[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+        stacks.append([indexes[frame] for frame in stack])
+        weights.append(count * interval)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'modlog',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': duration,
+            'samples': stacks,
+            'weights': weights,
+        }],
+    }
+
+
+class Sampler(threading.Thread):
+    '''Records the stack of one thread every interval seconds until stopped'''
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='modlog-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class SamplingProfiler(object):
+    '''Statistical profiler for individual requests, safe to leave on in production.
+
+    A request is profiled when it carries a PROFILE_HEADER token signed with the app's secret key, see the
+    profile-token command, or otherwise with probability PROFILE_SAMPLE_RATE. A thread samples the request's
+    stack every PROFILE_INTERVAL seconds and the result is written to PROFILE_DIR in PROFILE_FORMAT, collapsed or
+    speedscope, named after the endpoint and duration. Only the newest PROFILE_KEEP files are kept.
+    '''
+    SALT = 'modlog-profile'
+    SAMPLER_KEY = '_profile_sampler'
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_INTERVAL', 0.005)
+        app.config.setdefault('PROFILE_DIR', os.path.join(
+            tempfile.gettempdir(), 'modlog_profiles'))
+        app.config.setdefault('PROFILE_FORMAT', 'collapsed')
+        app.config.setdefault('PROFILE_HEADER', 'X-Profile-Token')
+        app.config.setdefault('PROFILE_TOKEN_MAX_AGE', 3600)
+        app.config.setdefault('PROFILE_KEEP', 200)
+        self.app = app
+
+        request_started.connect(self._request_started, app)
+        request_tearing_down.connect(self._request_finished, app)
+        app.extensions['profiler'] = self
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(self.app.secret_key, salt=self.SALT)
+
+    def generate_token(self):
+        '''Returns a token that profiles any request carrying it for PROFILE_TOKEN_MAX_AGE seconds'''
+        return self._serializer().dumps('profile')
+
+    def valid_token(self, token):
+        try:
+            return self._serializer().loads(token, max_age=self.app.config['PROFILE_TOKEN_MAX_AGE']) == 'profile'
+        except BadSignature:
+            return False
+
+    def _wanted(self):
+        token = request.headers.get(self.app.config['PROFILE_HEADER'])
+        if token:
+            return self.valid_token(token)
+        rate = self.app.config['PROFILE_SAMPLE_RATE']
+        return rate > 0 and random.random() < rate
+
+    def _request_started(self, sender, **extra):
+        if not self._wanted():
+            return
+        sampler = Sampler(threading.get_ident(),
+                          sender.config['PROFILE_INTERVAL'])
+        setattr(g, self.SAMPLER_KEY, (sampler, time.perf_counter()))
+        sampler.start()
+
+    def _request_finished(self, sender, **extra):
+        profiling = g.pop(self.SAMPLER_KEY, None)
+        if profiling is None:
+            return
+        sampler, start = profiling
+        sampler.stop()
+        try:
+            self.write(sampler.samples, request.endpoint or 'unmatched',
+                       time.perf_counter() - start)
+        except OSError:
+            sender.logger.exception('Failed to write request profile')
+
+    def write(self, samples, endpoint, duration):
+        '''Writes a profile to PROFILE_DIR and returns its path'''
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        name = f'{endpoint}-{duration * 1000:.0f}ms-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}'
+        if self.app.config['PROFILE_FORMAT'] == 'speedscope':
+            path = os.path.join(directory, name + '.speedscope.json')
+            with open(path, 'w') as f:
+                json.dump(speedscope(samples, name, self.app.config['PROFILE_INTERVAL'], duration), f)
+        else:
+            path = os.path.join(directory, name + '.collapsed')
+            with open(path, 'w') as f:
+                f.write(collapsed_stacks(samples))
+        self._prune(directory)
+        return path
+
+    def _prune(self, directory):
+        '''Deletes all but the newest PROFILE_KEEP profiles'''
+        paths = sorted((entry.path for entry in os.scandir(directory) if entry.is_file()),
+                       key=os.path.getmtime, reverse=True)
+        for path in paths[self.app.config['PROFILE_KEEP']:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+@click.command('profile-token')
+@with_appcontext
+def profile_token_command():
+    '''Prints a token that profiles requests sent with it in the profile header'''
+    profiler = current_app.extensions['profiler']
+    click.echo(f'{current_app.config["PROFILE_HEADER"]}: {profiler.generate_token()}')
+    click.echo(
+        f'Valid for {current_app.config["PROFILE_TOKEN_MAX_AGE"]} seconds')
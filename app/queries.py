@@ -0,0 +1,149 @@
+# app > queries.py
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_app_context, has_request_context, request, request_started, request_finished
+from sqlalchemy import event
+
+
+class TooManyQueries(AssertionError):
+    '''Raised at the end of a request over the query limits when QUERY_LIMITS_RAISE is set'''
+
+
+# collapses the placeholders of an expanded IN list so lists of any length share a shape
+_IN_LIST = re.compile(r'IN \((?:%\(\w+\)s(?:, )?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    '''Returns statement with whitespace and IN lists normalized, so repeats of one query compare equal'''
+    return _IN_LIST.sub('IN (...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class QueryStats(object):
+    '''Statements run, time spent in the database and how often each statement shape repeated'''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = Counter()
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, limit):
+        '''Returns (shape, times) for every shape run more than limit times, the signature of an N+1'''
+        return [(shape, times) for shape, times in self.shapes.most_common() if times > limit]
+
+
+class QueryCounter(object):
+    '''Counts SQL statements and database time per request, and flags requests over the limits.
+
+    A request over QUERY_COUNT_LIMIT statements, or running any one statement shape more than
+    QUERY_REPEAT_LIMIT times, logs a warning. With QUERY_LIMITS_RAISE set it raises TooManyQueries instead.
+    Other extensions that need statement timings register with add_listener rather than timing statements again.
+    '''
+    STATS_KEY = '_query_stats'
+
+    def __init__(self, app=None):
+        self.app = None
+        self._captures = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._engines = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''Must run after the db is initialized, since it listens on each of the app's engines'''
+        from .models import db
+
+        app.config.setdefault('QUERY_COUNT_LIMIT', 100)
+        app.config.setdefault('QUERY_REPEAT_LIMIT', 10)
+        app.config.setdefault('QUERY_LIMITS_RAISE', False)
+        self.app = app
+
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine not in self._engines:
+                    event.listen(engine, 'before_cursor_execute',
+                                 self._before_execute)
+                    event.listen(engine, 'after_cursor_execute',
+                                 self._after_execute)
+                    self._engines.add(engine)
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        app.extensions['query_counter'] = self
+
+    def add_listener(self, callback):
+        '''Calls callback(conn, cursor, statement, parameters, context, executemany, duration) after every
+        statement, with duration in seconds
+        '''
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    @property
+    def stats(self):
+        '''QueryStats for the current request, or None outside a request'''
+        return g.get(self.STATS_KEY) if has_app_context() else None
+
+    # the start time lives on the statement's execution context, which is dropped with it when the statement raises
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_query_start', None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        for callback in self._listeners:
+            callback(conn, cursor, statement, parameters,
+                     context, executemany, duration)
+        for stats in self._captures:
+            stats.add(statement, duration)
+        if has_request_context():
+            stats = g.get(self.STATS_KEY)
+            if stats is not None:
+                stats.add(statement, duration)
+
+    def _request_started(self, sender, **extra):
+        setattr(g, self.STATS_KEY, QueryStats())
+
+    def _request_finished(self, sender, response, **extra):
+        stats = g.get(self.STATS_KEY)
+        if stats is None:
+            return
+        problems = []
+        if stats.count > sender.config['QUERY_COUNT_LIMIT']:
+            problems.append(f'{stats.count} queries')
+        for shape, times in stats.repeated(sender.config['QUERY_REPEAT_LIMIT']):
+            problems.append(f'possible N+1, ran {times} times: {shape}')
+        if not problems:
+            return
+
+        message = f'{request.method} {request.path} ({request.endpoint}) took {stats.count} queries in ' \
+                  f'{stats.duration * 1000:.1f}ms: ' + '; '.join(problems)
+        if sender.config['QUERY_LIMITS_RAISE']:
+            raise TooManyQueries(message)
+        sender.logger.warning(message)
+
+    @contextmanager
+    def capture(self):
+        '''Context manager yielding QueryStats for every statement run inside the block'''
+        stats = QueryStats()
+        with self._lock:
+            self._captures = self._captures + [stats]
+        try:
+            yield stats
+        finally:
+            with self._lock:
+                self._captures = [
+                    capture for capture in self._captures if capture is not stats]
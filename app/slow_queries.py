@@ -0,0 +1,143 @@
+# app > slow_queries.py
+import json
+import logging
+import os
+import random
+import tempfile
+import traceback
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def redact(parameters):
+    '''Returns parameters with every value replaced by its type name, so no user data reaches the log'''
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return None if parameters is None else f'<{type(parameters).__name__}>'
+
+
+def call_site():
+    '''Returns "path:line in function" for the innermost app frame outside this module, or None'''
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(APP_ROOT) and path != os.path.abspath(__file__):
+            return f'{os.path.relpath(path, os.path.dirname(APP_ROOT))}:{frame.lineno} in {frame.name}'
+    return None
+
+
+class SlowQueryLog(object):
+    '''Opt-in log of statements slower than SLOW_QUERY_THRESHOLD milliseconds.
+
+    Each entry records the SQL, its redacted parameters, the route and the app call site that ran it, as a JSON
+    line in the rotating SLOW_QUERY_LOG_FILE. SLOW_QUERY_EXPLAIN_RATE of the slow SELECTs are run again under
+    EXPLAIN (ANALYZE, BUFFERS) on a separate cursor inside a savepoint, which repeats the query's cost, so keep
+    the rate low. Statement durations come from the query counter, which must be initialized first.
+    '''
+
+    def __init__(self, app=None):
+        self.app = None
+        self.logger = logging.getLogger('modlog.slow_queries')
+        self.logger.propagate = False
+        self._handler_path = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from . import query_counter
+
+        app.config.setdefault('SLOW_QUERY_LOG_ENABLED', False)
+        app.config.setdefault('SLOW_QUERY_THRESHOLD', 200)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN_RATE', 0.0)
+        app.config.setdefault('SLOW_QUERY_LOG_FILE', os.path.join(
+            tempfile.gettempdir(), 'modlog_slow_queries.log'))
+        app.config.setdefault('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024)
+        app.config.setdefault('SLOW_QUERY_LOG_BACKUPS', 3)
+        self.app = app
+
+        query_counter.add_listener(self._after_execute)
+        app.extensions['slow_query_log'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['SLOW_QUERY_LOG_ENABLED']
+
+    @property
+    def path(self):
+        return self.app.config['SLOW_QUERY_LOG_FILE']
+
+    def _get_logger(self):
+        '''Returns the logger, pointing its rotating handler at the configured file'''
+        if self._handler_path != self.path:
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(self.path, maxBytes=self.app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                                          backupCount=self.app.config['SLOW_QUERY_LOG_BACKUPS'])
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self._handler_path = self.path
+        return self.logger
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany, duration):
+        duration *= 1000
+        if not self.enabled or duration < self.app.config['SLOW_QUERY_THRESHOLD']:
+            return
+
+        entry = {
+            'at': datetime.utcnow().isoformat(),
+            'duration_ms': round(duration, 3),
+            'statement': statement,
+            'parameters': redact(parameters),
+            'route': f'{request.method} {request.path} ({request.endpoint})' if has_request_context() else None,
+            'call_site': call_site(),
+            'plan': None,
+        }
+        if not executemany and statement.lstrip().upper().startswith('SELECT') and \
+                random.random() < self.app.config['SLOW_QUERY_EXPLAIN_RATE']:
+            entry['plan'] = self.explain(cursor.connection, statement, parameters)
+        self._get_logger().info(json.dumps(entry, default=str))
+
+    def explain(self, dbapi_conn, statement, parameters):
+        '''Returns the EXPLAIN (ANALYZE, BUFFERS) plan of statement, or the error that stopped it.
+
+        Runs on its own cursor inside a savepoint, so a failure leaves the caller's transaction usable.
+        '''
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(
+                    'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + statement, parameters)
+                plan = cursor.fetchone()[0]
+            except Exception:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                raise
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        except Exception as e:
+            return {'error': str(e)}
+        finally:
+            cursor.close()
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def entries(self, limit=100):
+        '''Returns up to limit of the newest entries in the current log file, newest first'''
+        try:
+            with open(self.path) as f:
+                lines = deque(f, maxlen=limit)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
@@ -0,0 +1,37 @@
+// Suggests values for any input with a data-autocomplete="<field>" attribute through a datalist
+const SUGGEST_DELAY = 150;
+const suggestTimers = new WeakMap();
+
+function datalistFor(input) {
+  // Returns the datalist attached to input, creating it on first use
+  let id = input.attr("list");
+  if (!id) {
+    id = `${input.attr("id") || input.attr("name")}-suggestions`;
+    input.attr("list", id).after(`<datalist id="${id}"></datalist>`);
+  }
+  return $(`#${id}`);
+}
+
+async function suggest(input) {
+  const q = input.val().trim();
+  if (q.length < 2) {
+    return;
+  }
+  const res = await axios.get(`/autocomplete/${input.data("autocomplete")}`, { params: { q: q } });
+  if (input.val().trim() !== q) {
+    // a newer request will fill the list
+    return;
+  }
+  datalistFor(input)
+    .empty()
+    .append(res.data.suggestions.map((value) => $("<option>").attr("value", value)));
+}
+
+$(document).on("input", "[data-autocomplete]", (e) => {
+  const input = $(e.currentTarget);
+  clearTimeout(suggestTimers.get(e.currentTarget));
+  suggestTimers.set(
+    e.currentTarget,
+    setTimeout(() => suggest(input), SUGGEST_DELAY)
+  );
+});
@@ -0,0 +1,112 @@
+# app > throttle.py
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class LoginThrottle(object):
+    '''Token bucket limiter for login attempts, keyed by client IP and by username.
+
+    Bucket state lives in a SQLite file so every gunicorn worker on the host shares it. Limits are
+    configured as (attempts, seconds) tuples in LOGIN_THROTTLE_IP_LIMIT and LOGIN_THROTTLE_USER_LIMIT.
+    '''
+    PRUNE_EVERY = 1000
+
+    def __init__(self, app=None):
+        self.app = None
+        self._local = threading.local()
+        self._calls = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOGIN_THROTTLE_ENABLED', True)
+        app.config.setdefault('LOGIN_THROTTLE_DB', os.path.join(
+            tempfile.gettempdir(), 'modlog_throttle.sqlite3'))
+        app.config.setdefault('LOGIN_THROTTLE_IP_LIMIT', (30, 60))
+        app.config.setdefault('LOGIN_THROTTLE_USER_LIMIT', (10, 300))
+        self.app = app
+        app.extensions['login_throttle'] = self
+
+    def _connect(self):
+        '''Returns a SQLite connection for this thread, creating the tables on first use'''
+        path = self.app.config['LOGIN_THROTTLE_DB']
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.key == (os.getpid(), path):
+            return conn
+
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._local.conn = conn
+        self._local.key = (os.getpid(), path)
+        return conn
+
+    def _limits(self, ip, username):
+        limits = []
+        if ip:
+            limits.append(('ip:' + ip, self.app.config['LOGIN_THROTTLE_IP_LIMIT']))
+        if username:
+            limits.append(('user:' + username.strip().lower(),
+                           self.app.config['LOGIN_THROTTLE_USER_LIMIT']))
+        return limits
+
+    def allow(self, ip=None, username=None):
+        '''Takes a token from the IP and username buckets. Returns False without taking any if either is empty'''
+        if not self.app.config['LOGIN_THROTTLE_ENABLED']:
+            return True
+
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            buckets = []
+            for key, (capacity, period) in self._limits(ip, username):
+                row = conn.execute(
+                    'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = capacity
+                if row:
+                    tokens = min(capacity, row[0] +
+                                 (now - row[1]) * capacity / period)
+                buckets.append((key, tokens))
+
+            allowed = all(tokens >= 1 for _, tokens in buckets)
+            for key, tokens in buckets:
+                conn.execute('INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                             'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                             (key, tokens - 1 if allowed else tokens, now))
+            conn.execute('INSERT INTO counters (name, value) VALUES (?, 1) '
+                         'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+                         ('accepted' if allowed else 'rejected',))
+
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def _prune(self, conn, now):
+        '''Deletes buckets that have been idle long enough to be full again'''
+        longest = max(period for _, period in (
+            self.app.config['LOGIN_THROTTLE_IP_LIMIT'], self.app.config['LOGIN_THROTTLE_USER_LIMIT']))
+        conn.execute('DELETE FROM buckets WHERE updated < ?', (now - longest,))
+
+    @property
+    def counters(self):
+        '''Accepted and rejected login attempts across all workers'''
+        rows = self._connect().execute('SELECT name, value FROM counters').fetchall()
+        return {'accepted': 0, 'rejected': 0, **dict(rows)}
+
+    def reset(self):
+        '''Empties every bucket and counter'''
+        conn = self._connect()
+        conn.execute('DELETE FROM buckets')
+        conn.execute('DELETE FROM counters')
@@ -1,9 +1,11 @@
+import hmac
 import os
 import uuid
 from functools import wraps
 from PIL import Image
 
-from flask import abort, g
+from flask import abort, current_app, g, request
+from flask_login import current_user
 
 
 def owner_required(func):
@@ -16,6 +18,34 @@ def owner_required(func):
     return inner
 
 
+def internal_only(func):
+    '''Decorator to return a 404 unless the request comes from INTERNAL_IPS or carries INTERNAL_TOKEN'''
+    @wraps(func)
+    def inner(*args, **kwargs):
+        token = current_app.config.get('INTERNAL_TOKEN')
+        if request.remote_addr not in current_app.config['INTERNAL_IPS'] and not (
+                token and hmac.compare_digest(request.headers.get('X-Internal-Token', ''), token)):
+            abort(404)
+        return func(*args, **kwargs)
+    return inner
+
+
+def admin_required(func):
+    '''Decorator to return a 404 unless the logged in user is named in ADMIN_USERNAMES'''
+    @wraps(func)
+    def inner(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.username not in current_app.config['ADMIN_USERNAMES']:
+            abort(404)
+        return func(*args, **kwargs)
+    return inner
+
+
+def wants_json():
+    '''Returns True if the request is from a script asking for JSON rather than a page'''
+    # axios sends application/json, text/plain, */* by default, which accepts html too
+    return request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+
+
 def assert_in_range(value, min, max):
     '''Returns True if value is within min and max range'''
     if value < min:
@@ -2,10 +2,31 @@
 from os import environ
 from enum import Enum
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
 
 load_dotenv()
 
 
+def engine_options(pool_size=5, max_overflow=10, pool_timeout=10, pool_recycle=1800, statement_timeout=30000,
+                   pgbouncer=False):
+    '''Returns SQLALCHEMY_ENGINE_OPTIONS.
+
+    In PgBouncer mode the app keeps no pool of its own and sends no startup options, which PgBouncer rejects.
+    Set the statement timeout on the database role instead. psycopg2 never uses server side prepared
+    statements, so transaction pooling needs nothing else.
+    '''
+    if pgbouncer:
+        return {'poolclass': NullPool}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': True,
+        'connect_args': {'options': f'-c statement_timeout={statement_timeout}'},
+    }
+
+
 class DefaultConfig(object):
     # General Config
     SECRET_KEY = environ.get(
@@ -14,16 +35,103 @@ class DefaultConfig(object):
     UPLOAD_FOLDER = 'app/static/assets/uploads'
     DEBUG_TB_INTERCEPT_REDIRECTS = False
 
+    # Seconds between last_login writes for a user
+    LAST_SEEN_FLUSH_INTERVAL = int(environ.get('LAST_SEEN_FLUSH_INTERVAL', 60))
+
+    # Logged in user cache
+    USER_CACHE_SIZE = int(environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(environ.get('USER_CACHE_TTL', 60))
+    # per user version stamps every worker on the host checks before using a cached user
+    USER_CACHE_VERSIONS_DB = environ.get(
+        'USER_CACHE_VERSIONS_DB', '/tmp/modlog_user_versions.sqlite3')
+
+    # Activity feed pages
+    FEED_CACHE_SIZE = int(environ.get('FEED_CACHE_SIZE', 512))
+    FEED_CACHE_TTL = int(environ.get('FEED_CACHE_TTL', 30))
+    FEED_PER_PAGE = 20
+    # users following at least this many projects get a materialized feed from the sync-feeds command
+    FEED_MATERIALIZE_THRESHOLD = int(
+        environ.get('FEED_MATERIALIZE_THRESHOLD', 1000))
+
+    # Autocomplete suggestions
+    AUTOCOMPLETE_CACHE_SIZE = int(environ.get('AUTOCOMPLETE_CACHE_SIZE', 256))
+    AUTOCOMPLETE_CACHE_TTL = int(environ.get('AUTOCOMPLETE_CACHE_TTL', 300))
+
+    # Password hashing
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_POOL_WORKERS = int(environ.get('PASSWORD_POOL_WORKERS', 2))
+    PASSWORD_POOL_QUEUE = int(environ.get('PASSWORD_POOL_QUEUE', 16))
+    PASSWORD_POOL_TIMEOUT = 10
+    # slots for hashes in flight, shared by every worker on the host
+    PASSWORD_POOL_DB = environ.get(
+        'PASSWORD_POOL_DB', '/tmp/modlog_password_slots.sqlite3')
+
+    # Login throttle as (attempts, seconds)
+    LOGIN_THROTTLE_ENABLED = True
+    LOGIN_THROTTLE_DB = environ.get(
+        'LOGIN_THROTTLE_DB', '/tmp/modlog_throttle.sqlite3')
+    LOGIN_THROTTLE_IP_LIMIT = (30, 60)
+    LOGIN_THROTTLE_USER_LIMIT = (10, 300)
+
+    # Seconds browsers and proxies may reuse vehicle catalog responses
+    CATALOG_MAX_AGE = 86400
+
     # Database
     SQLALCHEMY_DATABASE_URI = ('postgresql://')
     SQLALCHEMY_ECHO = False
-    SQLALCHEMY_TRACK_MODIFICATIONS = True
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # threads that run deferred model event handlers, see app/models/events.py
+    MODEL_EVENTS_WORKERS = 2
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=int(environ.get('DB_POOL_SIZE', 5)),
+        max_overflow=int(environ.get('DB_MAX_OVERFLOW', 10)),
+        statement_timeout=int(environ.get('DB_STATEMENT_TIMEOUT', 30000)),
+        pgbouncer=bool(environ.get('PGBOUNCER')))
+    # connections each worker opens per pool at boot
+    SQLALCHEMY_POOL_PREWARM = int(environ.get('DB_POOL_PREWARM', 2))
+    # read replica used by GET requests when set, see app/models/routing.py
+    if environ.get('REPLICA_DATABASE_URL'):
+        SQLALCHEMY_BINDS = {'replica': environ.get('REPLICA_DATABASE_URL').replace(
+            'postgres://', 'postgresql://', 1)}
+    REPLICA_MAX_LAG = int(environ.get('REPLICA_MAX_LAG', 5))
+    REPLICA_LAG_CHECK_INTERVAL = 5
+    REPLICA_STICKY_SECONDS = int(environ.get('REPLICA_STICKY_SECONDS', 10))
+    # per request statement limits, over either one logs a warning, see app/queries.py
+    QUERY_COUNT_LIMIT = 100
+    QUERY_REPEAT_LIMIT = 10
+    QUERY_LIMITS_RAISE = False
+    # request latency histograms, summed across workers through the METRICS_DB file and served at /metrics
+    METRICS_ENABLED = True
+    METRICS_DB = environ.get('METRICS_DB', '/tmp/modlog_metrics.sqlite3')
+    METRICS_FLUSH_INTERVAL = 10
+    # requests sent with a `flask profile-token` header, or this fraction of all requests, are sampled into PROFILE_DIR
+    PROFILE_SAMPLE_RATE = float(environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = environ.get('PROFILE_DIR', '/tmp/modlog_profiles')
+    PROFILE_FORMAT = environ.get('PROFILE_FORMAT', 'collapsed')
+    # apply pending app/migrations when a worker boots
+    MIGRATE_ON_START = True
+
+    # /_internal endpoints answer these addresses, or any request with an X-Internal-Token header matching
+    INTERNAL_IPS = ('127.0.0.1', '::1')
+    INTERNAL_TOKEN = environ.get('INTERNAL_TOKEN')
+    # users allowed into admin views such as /_internal/slow-queries, comma separated in the environment
+    ADMIN_USERNAMES = tuple(
+        name for name in environ.get('ADMIN_USERNAMES', '').split(',') if name)
+
+    # opt-in log of statements over SLOW_QUERY_THRESHOLD ms, a sample of the SELECTs with EXPLAIN ANALYZE plans
+    SLOW_QUERY_LOG_ENABLED = bool(environ.get('SLOW_QUERY_LOG'))
+    SLOW_QUERY_THRESHOLD = int(environ.get('SLOW_QUERY_THRESHOLD', 200))
+    SLOW_QUERY_EXPLAIN_RATE = float(environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.01))
+    SLOW_QUERY_LOG_FILE = environ.get(
+        'SLOW_QUERY_LOG_FILE', '/tmp/modlog_slow_queries.log')
 
     # Dropzone
     DROPZONE_ALLOWED_FILE_TYPE = 'image'
     DROPZONE_MAX_FILES = 15
     DROPZONE_ENABLE_CSRF = True
     DROPZONE_MAX_FILE_SIZE = 10
+    DROPZONE_UPLOAD_MULTIPLE = True
+    DROPZONE_PARALLEL_UPLOADS = 5
 
 
 class ProdConfig(DefaultConfig):
@@ -32,6 +140,14 @@ class ProdConfig(DefaultConfig):
     SECRET_KEY = environ.get(
         'SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = (environ.get('DATABASE_URL'))
+    # Heroku closes idle connections, so recycle well before that
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=int(environ.get('DB_POOL_SIZE', 5)),
+        max_overflow=int(environ.get('DB_MAX_OVERFLOW', 10)),
+        pool_recycle=300,
+        statement_timeout=int(environ.get('DB_STATEMENT_TIMEOUT', 30000)),
+        pgbouncer=bool(environ.get('PGBOUNCER')))
+    PROXY_FIX_X_FOR = 1
 
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace(
@@ -44,10 +160,29 @@ class DevConfig(DefaultConfig):
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_DATABASE_URI = (
         environ.get('DATABASE_URL', 'postgresql:///modlog'))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=5)
+    SQLALCHEMY_POOL_PREWARM = 0
+
+    BCRYPT_LOG_ROUNDS = 10
 
 
 class TestConfig(DefaultConfig):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = 'postgresql:///modlog_test'
+    # one database under both binds so replica routing runs in tests
+    SQLALCHEMY_BINDS = {'replica': SQLALCHEMY_DATABASE_URI}
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=2, max_overflow=5, statement_timeout=10000)
+    SQLALCHEMY_POOL_PREWARM = 1
     UPLOAD_FOLDER = 'tests/uploads'
+    LAST_SEEN_FLUSH_INTERVAL = 0
+    FEED_CACHE_SIZE = 0
+    AUTOCOMPLETE_CACHE_SIZE = 0
+    MODEL_EVENTS_WORKERS = 0
+    QUERY_LIMITS_RAISE = True
+    METRICS_ENABLED = False
+    SLOW_QUERY_LOG_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_POOL_WORKERS = 0
+    LOGIN_THROTTLE_ENABLED = False
@@ -1,9 +1,10 @@
 import os
 import unittest
+from contextlib import contextmanager
 from flask_login import FlaskLoginClient
 
 from app import create_app
-from app import models
+from app import models, query_counter
 from .seed import *
 
 
@@ -54,6 +55,14 @@ class BaseTestCase(unittest.TestCase):
             raise
         print('passed...')
 
+    @contextmanager
+    def assertMaxQueries(self, count):
+        '''Fails if the block runs more than count SQL statements'''
+        with query_counter.capture() as stats:
+            yield stats
+        self.assertLessEqual(stats.count, count, f'{stats.count} queries ran, expected at most {count}:\n' +
+                             '\n'.join(stats.statements))
+
 
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
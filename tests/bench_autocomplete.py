@@ -0,0 +1,85 @@
+'''Autocomplete latency benchmark over a generated catalog.
+
+Not part of the test suite. Fills the configured database with PROJECTS public projects drawn from a few thousand
+generated makes, models and mods, then times suggest() for each field, skipping the suggestion cache, and prints
+p50/p99 per query against the TARGET_MS p99 budget. Run against a scratch database, it is wiped first:
+
+    FLASK_CONFIG=config.TestConfig python -m tests.bench_autocomplete
+'''
+import os
+import statistics
+import time
+
+os.environ.setdefault('FLASK_CONFIG', 'config.TestConfig')
+
+from sqlalchemy import text
+
+from app import create_app
+from app.models import db, suggest
+
+PROJECTS = 100_000
+RUNS = 200
+TARGET_MS = 20
+
+QUERIES = [('makes', 'fo'), ('makes', 'chev'), ('makes', 'toyta'), ('models', 'mu'), ('models', 'model 1'),
+           ('mods', 'tu'), ('mods', 'turbo kit'), ('mods', 'exhuast'), ('usernames', 'bench')]
+
+# makes, models and mods are picked by pk so the catalog is the same on every run, with a long tail of values
+SEED = text('''
+INSERT INTO users (id, username, password, email, private, last_login)
+    VALUES (md5('bench'), 'bench_user', repeat('x', 60), 'bench@example.com', 'PUBLIC', now());
+INSERT INTO projects (id, user_pk, name, description, make, model, year, mods, private, created_at, last_edit)
+    SELECT md5('project' || n), 1, 'Project ' || n, 'A build',
+        (ARRAY['Ford', 'Chevrolet', 'Dodge', 'Toyota', 'Honda', 'Nissan'])[1 + n % 6] || ' ' || n % 300,
+        CASE WHEN n % 7 = 0 THEN 'Mustang' ELSE 'Model ' || n % 3000 END,
+        (1970 + n % 50)::text,
+        ARRAY[(ARRAY['Turbo kit', 'Exhaust', 'Intake', 'Coilovers', 'Tune'])[1 + n % 5] || ' ' || n % 2000,
+              'Turbo kit'],
+        'PUBLIC', now(), now()
+    FROM generate_series(1, :projects) n;
+ANALYZE;
+''')
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        # the seed runs far longer than the configured statement_timeout
+        conn.execute(text('SET LOCAL statement_timeout = 0'))
+        conn.execute(SEED, {'projects': PROJECTS})
+
+
+def bench(field, q):
+    '''Returns the sorted latencies in ms of suggesting values of field for q'''
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        suggest(field, q)
+        times.append((time.perf_counter() - start) * 1000)
+        db.session.rollback()
+    return sorted(times)
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        seed()
+        terms = db.session.execute(
+            text('SELECT count(*) FROM autocomplete_terms')).scalar()
+        print(f'Seeded {PROJECTS} projects, {terms} distinct terms, in {time.perf_counter() - start:.1f}s')
+
+        slow = []
+        for field, q in QUERIES:
+            times = bench(field, q)
+            p99 = times[min(len(times) - 1, int(len(times) * .99))]
+            print(f'{field:10} {q!r:12} p50 {statistics.median(times):6.2f}ms  p99 {p99:6.2f}ms')
+            if p99 >= TARGET_MS:
+                slow.append(f'{field} {q!r}')
+        if slow:
+            raise SystemExit(f'p99 at or over {TARGET_MS}ms: {", ".join(slow)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''Activity feed latency benchmark for a user following FOLLOWED projects.
+
+Not part of the test suite. Fills the configured database with PROJECTS projects, each with a history of
+updates, pictures and mods, and one user following FOLLOWED of them. It times uncached first and second feed
+pages read both ways, through the per project LATERAL query and from the materialized feed_entries, prints
+p50/p99 for each, and exits non-zero when the way the app would pick for this user has a p99 at or over
+TARGET_MS. Run against a scratch database, it is wiped first:
+
+    FLASK_CONFIG=config.TestConfig python -m tests.bench_feed
+'''
+import os
+import statistics
+import time
+
+os.environ.setdefault('FLASK_CONFIG', 'config.TestConfig')
+
+from sqlalchemy import text
+
+from app import create_app
+from app.models import db, get_feed_page
+from app.models.activity import materialize_feed
+
+PROJECTS = 10_000
+FOLLOWED = 5_000
+UPDATES_PER_PROJECT = 20
+PICTURES_PER_PROJECT = 2
+MODS_PER_PROJECT = 5
+RUNS = 100
+TARGET_MS = 50
+
+# user 1 owns every project, user 2 follows every other one, items are spread over the last year
+SEED = text('''
+INSERT INTO users (id, username, password, email, private, last_login)
+    VALUES (md5('owner'), 'bench_owner', repeat('x', 60), 'owner@example.com', 'PUBLIC', now()),
+           (md5('follower'), 'bench_follower', repeat('x', 60), 'follower@example.com', 'PUBLIC', now());
+INSERT INTO projects (id, user_pk, name, description, make, model, year, mods, private, created_at, last_edit)
+    SELECT md5('project' || n), 1, 'Project ' || n, 'A build', 'Ford', 'Mustang', '1990', ARRAY[]::varchar[],
+        'PUBLIC', now(), now()
+    FROM generate_series(1, :projects) n;
+INSERT INTO followers (user_pk, project_pk)
+    SELECT 2, n * 2 FROM generate_series(1, :followed) n;
+INSERT INTO updates (id, project_pk, title, content, created_at, last_edit)
+    SELECT md5('update' || n), 1 + n % :projects, 'Update ' || n, 'Worked on the car',
+        now() - (n * 31536000.0 / (:projects * :updates)) * interval '1 second', now()
+    FROM generate_series(1, :projects * :updates) n;
+INSERT INTO project_pictures (id, project_pk, upload_ip, extension, description, created_at, last_edit)
+    SELECT md5('picture' || n), 1 + n % :projects, '127.0.0.1', 'jpg', 'Picture ' || n,
+        now() - (n * 31536000.0 / (:projects * :pictures)) * interval '1 second', now()
+    FROM generate_series(1, :projects * :pictures) n;
+INSERT INTO mod_additions (id, project_pk, mod, created_at, last_edit)
+    SELECT md5('mod' || n), 1 + n % :projects, 'Mod ' || n,
+        now() - (n * 31536000.0 / (:projects * :mods)) * interval '1 second', now()
+    FROM generate_series(1, :projects * :mods) n;
+ANALYZE;
+''')
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        # the seed runs far longer than the configured statement_timeout
+        conn.execute(text('SET LOCAL statement_timeout = 0'))
+        conn.execute(SEED, {'projects': PROJECTS, 'followed': FOLLOWED, 'updates': UPDATES_PER_PROJECT,
+                            'pictures': PICTURES_PER_PROJECT, 'mods': MODS_PER_PROJECT})
+
+
+def bench(materialized, pages=2):
+    '''Returns the sorted latencies in ms per page of reading the follower's first pages'''
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        cursor = None
+        for _ in range(pages):
+            _, cursor = get_feed_page(2, cursor=cursor, materialized=materialized)
+        times.append((time.perf_counter() - start) * 1000 / pages)
+        db.session.rollback()
+    return sorted(times)
+
+
+def report(name, times):
+    p99 = times[min(len(times) - 1, int(len(times) * .99))]
+    print(f'{name:12} p50 {statistics.median(times):7.2f}ms  p99 {p99:7.2f}ms')
+    return p99
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        seed()
+        print(f'Seeded {PROJECTS} projects, {FOLLOWED} followed, in {time.perf_counter() - start:.1f}s')
+        p99 = {False: report('lateral', bench(materialized=False))}
+
+        start = time.perf_counter()
+        db.session.execute(text('SET LOCAL statement_timeout = 0'))
+        materialize_feed(2)
+        db.session.commit()
+        print(f'Materialized the feed in {time.perf_counter() - start:.1f}s')
+        p99[True] = report('materialized', bench(materialized=True))
+
+        # the way get_feed_page is called for this user once sync-feeds has run
+        picked = FOLLOWED >= app.config['FEED_MATERIALIZE_THRESHOLD']
+        if p99[picked] >= TARGET_MS:
+            raise SystemExit(f'{"materialized" if picked else "lateral"} p99 at or over {TARGET_MS}ms')
+
+
+if __name__ == '__main__':
+    main()
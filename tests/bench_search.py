@@ -0,0 +1,100 @@
+'''Search latency benchmark over a generated corpus.
+
+Not part of the test suite. Fills the configured database with PROJECTS projects and UPDATES updates of
+generated text, then times ranked search pages and prints p50/p99 per query, exiting non-zero when a
+query's p99 reaches TARGET_MS. Run against a scratch database, it is wiped first:
+
+    FLASK_CONFIG=config.TestConfig python -m tests.bench_search
+'''
+import os
+import statistics
+import time
+
+os.environ.setdefault('FLASK_CONFIG', 'config.TestConfig')
+
+from sqlalchemy import text
+
+from app import create_app
+from app.models import db, search_projects, search_updates
+
+PROJECTS = 10_000
+UPDATES = 1_000_000
+RUNS = 50
+TARGET_MS = 100
+
+WORDS = ['turbo', 'supercharger', 'intake', 'exhaust', 'coilovers', 'brakes', 'clutch', 'differential',
+         'tune', 'dyno', 'wheels', 'tires', 'rust', 'paint', 'interior', 'swap', 'headers', 'camshaft',
+         'injectors', 'intercooler', 'alignment', 'gearbox', 'radiator', 'wiring', 'seats', 'spoiler']
+MAKES = ['Ford', 'Chevrolet', 'Dodge', 'Honda', 'Toyota', 'Nissan', 'Subaru', 'Mazda', 'BMW', 'Porsche']
+
+QUERIES = ['turbo', 'turbo intercooler', '"camshaft swap"', 'rust -paint', 'mustang', 'dyno or tune']
+
+# the text is picked from WORDS by pk so the corpus is the same on every run
+SEED = text('''
+INSERT INTO users (id, username, password, email, private, last_login)
+    VALUES (md5('bench'), 'bench_user', repeat('x', 60), 'bench@example.com', 'PUBLIC', now());
+INSERT INTO projects (id, user_pk, name, description, make, model, year, mods, private, created_at, last_edit)
+    SELECT md5('project' || n), 1, 'Project ' || n,
+        'A ' || (:makes)[1 + n % cardinality(:makes)] || ' build with ' || (:words)[1 + n % cardinality(:words)],
+        (:makes)[1 + n % cardinality(:makes)], CASE WHEN n % 7 = 0 THEN 'Mustang' ELSE 'Coupe' END,
+        (1970 + n % 50)::text, ARRAY[(:words)[1 + n % 13]], CASE WHEN n % 10 = 0 THEN 'PRIVATE' ELSE 'PUBLIC' END::privacystatus,
+        now(), now()
+    FROM generate_series(1, :projects) n;
+INSERT INTO updates (id, project_pk, title, content, created_at, last_edit)
+    SELECT md5('update' || n), 1 + n % :projects,
+        initcap((:words)[1 + n % cardinality(:words)]) || ' day',
+        'Spent the weekend on the ' || (:words)[1 + (n / 7) % cardinality(:words)] || ' and the '
+            || (:words)[1 + (n / 11) % cardinality(:words)] || ', next up is the '
+            || (:words)[1 + (n / 13) % cardinality(:words)] || '.',
+        now() - n * interval '1 minute', now()
+    FROM generate_series(1, :updates) n;
+ANALYZE;
+''')
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        # the seed runs far longer than the configured statement_timeout
+        conn.execute(text('SET LOCAL statement_timeout = 0'))
+        conn.execute(SEED, {'words': WORDS, 'makes': MAKES,
+                            'projects': PROJECTS, 'updates': UPDATES})
+
+
+def bench(search, q, pages=2):
+    '''Returns the sorted latencies in ms of fetching the first pages of results for q'''
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        cursor = None
+        for _ in range(pages):
+            _, cursor = search(q, cursor=cursor)
+            if not cursor:
+                break
+        times.append((time.perf_counter() - start) * 1000 / pages)
+        db.session.rollback()
+    return sorted(times)
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        seed()
+        print(f'Seeded {PROJECTS} projects and {UPDATES} updates in {time.perf_counter() - start:.1f}s')
+
+        slow = []
+        for search in (search_projects, search_updates):
+            for q in QUERIES:
+                times = bench(search, q)
+                p99 = times[min(len(times) - 1, int(len(times) * .99))]
+                print(f'{search.__name__:16} {q!r:24} p50 {statistics.median(times):7.2f}ms  p99 {p99:7.2f}ms')
+                if p99 >= TARGET_MS:
+                    slow.append(f'{search.__name__} {q!r}')
+        if slow:
+            raise SystemExit(f'p99 at or over {TARGET_MS}ms: {", ".join(slow)}')
+
+
+if __name__ == '__main__':
+    main()
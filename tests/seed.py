@@ -2,6 +2,7 @@ from app import models
 from app.models.images import ProjectPicture
 
 
+@models.transaction()
 def seed_users(c: object):
     ''' Seeds users into database for testing
     :param c: must be self
@@ -35,6 +36,7 @@ def seed_users(c: object):
     c.private_user2.edit(private='PRIVATE')
 
 
+@models.transaction()
 def seed_projects(c: object):
     '''Seeds projects into database for testing. Must call 'seed_users(self)' before this function
 
@@ -246,5 +248,4 @@ def seed_all(c):
         },
     ]
 
-    for comment in comment_data:
-        models.Comment.create(**comment)
+    models.Comment.create_many(comment_data)
@@ -0,0 +1,116 @@
+from tests import BaseTestCase
+from app.models.enums import Drivetrain
+from app.models.vehicles import Vehicle, import_vehicles, parse_row, parse_drivetrain
+
+ROWS = [
+    {'model_id': '15175', 'model_make_id': 'ford', 'model_name': 'Shelby GT500', 'model_trim': '',
+     'model_year': '2007', 'model_engine_cc': '5409', 'model_engine_power_ps': '507',
+     'model_engine_torque_nm': '664', 'model_weight_kg': '1742', 'model_drive': 'Rear',
+     'model_sold_in_us': '1', 'make_is_common': '1'},
+    {'model_id': '15176', 'model_make_id': 'ford', 'model_name': 'Mustang', 'model_trim': 'GT',
+     'model_year': '2007', 'model_engine_cc': '4606', 'model_engine_power_ps': '304',
+     'model_engine_torque_nm': '434', 'model_weight_kg': '', 'model_drive': 'Rear Wheel Drive',
+     'model_sold_in_us': '1', 'make_is_common': '1'},
+    {'model_id': '15177', 'model_make_id': 'land-rover', 'model_name': 'Defender', 'model_trim': '',
+     'model_year': '2007', 'model_engine_cc': '', 'model_engine_power_ps': '',
+     'model_engine_torque_nm': '', 'model_weight_kg': '', 'model_drive': '4WD',
+     'model_sold_in_us': '1', 'make_is_common': '0'},
+    {'model_id': '15178', 'model_make_id': 'ford', 'model_name': 'Ka', 'model_trim': '',
+     'model_year': '2007', 'model_drive': 'Front', 'model_sold_in_us': '0', 'make_is_common': '1'},
+    {'model_id': '69569', 'model_make_id': 'ford', 'model_name': 'Mustang', 'model_trim': 'GT',
+     'model_year': '2017', 'model_drive': 'Rear', 'model_sold_in_us': '1', 'make_is_common': '1'},
+]
+
+
+class VehicleModelTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        import_vehicles(ROWS)
+
+    def test_parse_row(self):
+        row = parse_row(ROWS[0])
+        self.assertEqual(row['horsepower'], 500)
+        self.assertEqual(row['torque'], 490)
+        self.assertEqual(row['weight'], 3840)
+        self.assertEqual(row['engine_size'], 5.4)
+        self.assertEqual(row['make'], 'Ford')
+        self.assertIsNone(row['trim'])
+
+        row = parse_row(ROWS[2])
+        self.assertEqual(row['make'], 'Land Rover')
+        self.assertIsNone(row['horsepower'])
+        self.assertIsNone(row['engine_size'])
+
+        self.assertEqual(parse_drivetrain('All Wheel Drive'), Drivetrain.AWD)
+        self.assertEqual(parse_drivetrain(''), Drivetrain.FWD)
+
+    def test_import(self):
+        self.assertEqual(Vehicle.query.count(), 5)
+
+        # importing again updates in place
+        changed = dict(ROWS[1], model_trim='GT Premium')
+        self.assertEqual(import_vehicles([changed]), 1)
+        self.assertEqual(Vehicle.query.count(), 5)
+        self.assertEqual(Vehicle.query.get(15176).trim, 'GT Premium')
+
+    def test_lookups(self):
+        self.assertEqual(Vehicle.get_years(), [2017, 2007])
+        self.assertEqual(Vehicle.get_makes(2007), [
+                         ('ford', 'Ford'), ('land-rover', 'Land Rover')])
+        # the Ka was not sold in the US
+        self.assertEqual(Vehicle.get_models(2007, 'ford'),
+                         ['Mustang', 'Shelby GT500'])
+        self.assertEqual(Vehicle.get_models(2007, 'ford', sold_in_us=False),
+                         ['Ka', 'Mustang', 'Shelby GT500'])
+        trims = Vehicle.get_trims(2007, 'ford', 'Mustang')
+        self.assertEqual([trim.model_id for trim in trims], [15176])
+
+        # common makes are listed first, even ahead of an uncommon make earlier in the alphabet
+        import_vehicles([{'model_id': '15179', 'model_make_id': 'alpina', 'model_name': 'B7',
+                          'model_year': '2007', 'model_sold_in_us': '1', 'make_is_common': '0'}])
+        self.assertEqual(Vehicle.get_makes(2007), [
+                         ('ford', 'Ford'), ('alpina', 'Alpina'), ('land-rover', 'Land Rover')])
+
+
+class CatalogRoutesTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        import_vehicles(ROWS)
+        self.client = self.app.test_client()
+
+    def test_routes(self):
+        resp = self.client.get('/catalog/years')
+        self.assertEqual(resp.json, {'years': [2017, 2007]})
+        self.assertTrue(resp.cache_control.public)
+        self.assertEqual(resp.cache_control.max_age,
+                         self.app.config['CATALOG_MAX_AGE'])
+
+        resp = self.client.get('/catalog/makes?year=2007')
+        self.assertEqual(resp.json['makes'][0], {'id': 'ford', 'display': 'Ford'})
+
+        resp = self.client.get('/catalog/models?year=2007&make=ford')
+        self.assertEqual(resp.json['models'], ['Mustang', 'Shelby GT500'])
+
+        resp = self.client.get(
+            '/catalog/trims?year=2007&make=ford&model=Shelby GT500')
+        self.assertEqual(resp.json['trims'][0]['horsepower'], 500)
+        self.assertEqual(resp.json['trims'][0]['drivetrain'], 'RWD')
+
+        self.assertEqual(self.client.get('/catalog/makes').status_code, 400)
+        self.assertEqual(self.client.get(
+            '/catalog/makes?year=new').status_code, 400)
+
+    def test_etag(self):
+        resp = self.client.get('/catalog/makes?year=2007')
+        etag = resp.headers['ETag']
+
+        resp = self.client.get('/catalog/makes?year=2007',
+                               headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b'')
+
+        resp = self.client.get('/catalog/makes?year=2017',
+                               headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
@@ -0,0 +1,98 @@
+from tests import BaseTestCase, seed_users, seed_projects
+from app.models import db, events, transaction, Project, Update, Comment
+
+
+class EventBusTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        seed_projects(self)
+        self.calls = []
+        self._handlers = dict(events._handlers)
+
+    def tearDown(self):
+        events._handlers = self._handlers
+        events._tracked.clear()
+        super().tearDown()
+
+    def test_insert_update_delete(self):
+        events.on(Update, 'insert')(lambda obj: self.calls.append(('insert', obj.title)))
+        events.on(Update, 'update')(lambda obj: self.calls.append(('update', obj.title)))
+        events.on(Update, 'delete')(lambda obj: self.calls.append(('delete', obj.title)))
+
+        update = Update.create(self.public_project1.id, 'First', 'content')
+        self.assertEqual(self.calls, [('insert', 'First')])
+
+        update.edit(title='Second')
+        update.delete()
+        self.assertEqual(self.calls, [('insert', 'First'), ('update', 'Second'), ('delete', 'Second')])
+
+    def test_untracked(self):
+        # models without handlers are never collected
+        Comment.create(self.public_user1.id, self.public_project1.id, 'hi')
+        self.assertFalse(events.tracks(Comment))
+        self.assertEqual(events.tracks(Project), set())
+
+    def test_batch(self):
+        events.on(Comment, 'insert', batch=True)(lambda objs: self.calls.append(len(objs)))
+        Comment.create_many([{'user_id': self.public_user1.id, 'project_id': self.public_project1.id,
+                              'content': str(i)} for i in range(3)])
+        self.assertEqual(self.calls, [3])
+
+    def test_waits_for_outer_commit(self):
+        events.on(Update, 'insert')(lambda obj: self.calls.append(obj.title))
+        with transaction():
+            Update.create(self.public_project1.id, 'Kept', 'content')
+            try:
+                with transaction():
+                    Update.create(self.public_project1.id, 'Undone', 'content')
+                    raise ValueError
+            except ValueError:
+                pass
+            self.assertEqual(self.calls, [])
+        self.assertEqual(self.calls, ['Kept'])
+
+        try:
+            with transaction():
+                Update.create(self.public_project1.id, 'Rolled back', 'content')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.calls, ['Kept'])
+
+    def test_insert_then_update(self):
+        events.on(Update, 'insert')(lambda obj: self.calls.append('insert'))
+        events.on(Update, 'update')(lambda obj: self.calls.append('update'))
+        with transaction():
+            update = Update.create(self.public_project1.id, 'First', 'content')
+            update.edit(title='Second')
+        self.assertEqual(self.calls, ['insert'])
+
+    def test_deferred(self):
+        # MODEL_EVENTS_WORKERS is 0 in tests, so deferred handlers run inline with column dicts
+        events.on(Update, 'insert', defer=True)(lambda row: self.calls.append(row))
+        update = Update.create(self.public_project1.id, 'Title', 'content')
+        self.assertEqual(self.calls[0]['pk'], update.pk)
+        self.assertEqual(self.calls[0]['title'], 'Title')
+
+    def test_commit_hooks(self):
+        Update.__commit_update__ = lambda obj: self.calls.append(obj.pk)
+        events._tracked.clear()
+        try:
+            self.public_project1_update = Update.create(
+                self.public_project1.id, 'Title', 'content')
+            self.public_project1_update.edit(title='New title')
+        finally:
+            del Update.__commit_update__
+        self.assertEqual(self.calls, [self.public_project1_update.pk])
+
+    def test_failing_handler(self):
+        def fail(obj):
+            raise RuntimeError
+
+        events.on(Update, 'insert')(fail)
+        events.on(Update, 'insert')(lambda obj: self.calls.append(obj.title))
+        with self.assertLogs(self.app.logger, 'ERROR'):
+            Update.create(self.public_project1.id, 'Title', 'content')
+        self.assertEqual(self.calls, ['Title'])
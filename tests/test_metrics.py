@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from app import metrics
+from app.metrics import format_labels
+from tests import BaseTestCase, seed_all
+
+
+class MetricsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_all(self)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app.config['METRICS_ENABLED'] = True
+        self.app.config['METRICS_DB'] = os.path.join(
+            self.tmp.name, 'metrics.sqlite3')
+        self.app.config['METRICS_FLUSH_INTERVAL'] = 0
+        metrics.reset()
+        self.client = self.app.test_client(user=self.public_user1)
+
+    def tearDown(self):
+        self.app.config['METRICS_ENABLED'] = False
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_server_timing(self):
+        resp = self.client.get(f'/p/{self.public_project1.id}')
+        timing = resp.headers['Server-Timing']
+        for phase in ['db;desc=', 'render;dur=', 'app;dur=', 'total;dur=']:
+            self.assertIn(phase, timing)
+
+    def test_histograms(self):
+        for _ in range(3):
+            self.client.get(f'/p/{self.public_project1.id}')
+        samples = metrics.collect()
+        labels = format_labels((('endpoint', 'project.show'), ('phase', 'total')))
+        self.assertEqual(3, samples[('modlog_request_duration_seconds_count', labels)])
+        self.assertEqual(3, samples[('modlog_request_duration_seconds_bucket', labels + ',le="+Inf"')])
+        self.assertGreater(samples[('modlog_request_duration_seconds_sum', labels)], 0)
+
+    def test_shared_store(self):
+        self.client.get(f'/p/{self.public_project1.id}')
+        # another worker's flushed rows are summed into the scrape
+        metrics._connect().execute('INSERT INTO samples (process, name, labels, value) VALUES (?, ?, ?, ?)', (
+            'other', 'modlog_requests_total',
+            format_labels((('endpoint', 'project.show'), ('method', 'GET'), ('status', 200))), 4))
+        samples = metrics.collect()
+        self.assertEqual(5, samples[('modlog_requests_total', format_labels(
+            (('endpoint', 'project.show'), ('method', 'GET'), ('status', 200))))])
+
+    def test_metrics_route(self):
+        self.client.get(f'/p/{self.public_project1.id}')
+        resp = self.client.get('/metrics')
+        self.assertEqual(200, resp.status_code)
+        body = resp.data.decode()
+        self.assertIn('# TYPE modlog_request_duration_seconds histogram', body)
+        self.assertIn('modlog_request_duration_seconds_bucket{endpoint="project.show",phase="db",le="0.005"}', body)
+        self.assertIn('modlog_cache_hits_total{cache="user"}', body)
+        self.assertIn('modlog_login_attempts_total{result="accepted"}', body)
+
+        resp = self.client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        self.assertEqual(404, resp.status_code)
+
+    def test_disabled(self):
+        self.app.config['METRICS_ENABLED'] = False
+        resp = self.client.get(f'/p/{self.public_project1.id}')
+        self.assertNotIn('Server-Timing', resp.headers)
+        self.assertEqual(404, self.client.get('/metrics').status_code)
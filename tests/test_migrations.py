@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import text
+
+from tests import BaseTestCase, seed_users, seed_projects
+from app.models import db
+from app.migrations import upgrade, check_indexes, get_migrations
+
+
+class MigrationsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        seed_projects(self)
+
+    def test_upgrade(self):
+        # already applied on app start, and safe to run against the current schema
+        self.assertEqual(upgrade(db.engine), [])
+        for version, migration in get_migrations():
+            with db.engine.begin() as conn:
+                migration.upgrade(conn)
+
+        self.assertEqual(self.public_project1.comment_count, 4)
+
+    def test_upgrade_matches_create_all(self):
+        # triggers and their functions are written out twice, on the models for create_all and frozen in the
+        # migrations, so a database built either way must end up with the same definitions
+        def schema():
+            with db.engine.connect() as conn:
+                return {
+                    'functions': dict(conn.execute(text("""SELECT p.proname, pg_get_functiondef(p.oid)
+                        FROM pg_proc p JOIN pg_namespace n ON n.oid = p.pronamespace
+                        JOIN pg_language l ON l.oid = p.prolang
+                        WHERE n.nspname = 'public' AND l.lanname = 'plpgsql'""")).all()),
+                    'triggers': dict(conn.execute(text(
+                        'SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger WHERE NOT tgisinternal')).all()),
+                    'indexes': dict(conn.execute(text(
+                        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = 'public'")).all()),
+                }
+
+        created = schema()
+        for version, migration in get_migrations():
+            with db.engine.begin() as conn:
+                migration.upgrade(conn)
+        upgraded = schema()
+        for kind in created:
+            self.assertEqual(created[kind], upgraded[kind], f'{kind} differ')
+
+    def test_upgrade_without_statement_timeout(self):
+        timeouts = []
+        migration = SimpleNamespace(DESCRIPTION='Test', upgrade=lambda conn: timeouts.append(
+            conn.execute(text('SHOW statement_timeout')).scalar()))
+        try:
+            with mock.patch('app.migrations.get_migrations', return_value=[(99999, migration)]):
+                self.assertEqual(upgrade(db.engine), [99999])
+        finally:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    text('DELETE FROM schema_versions WHERE version = 99999'))
+        self.assertEqual(timeouts, ['0'])
+
+    def test_indexes_used(self):
+        for name, used in check_indexes(db.engine).items():
+            self.assertTrue(used, f'{name} not used by its probe query')
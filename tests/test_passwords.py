@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+from tests import BaseTestCase
+from app import hasher
+from app.passwords import HasherBusy
+
+
+class PasswordHasherTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app.config['PASSWORD_POOL_DB'] = os.path.join(
+            self.tmp.name, 'slots.sqlite3')
+
+    def tearDown(self):
+        self.app.config['PASSWORD_POOL_QUEUE'] = 32
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_hash(self):
+        pw_hash = hasher.generate_password_hash('password123')
+        self.assertTrue(hasher.check_password_hash(pw_hash, 'password123'))
+        self.assertFalse(hasher.check_password_hash(pw_hash, 'password124'))
+        # every slot is given back once its hash is done
+        self.assertEqual(0, hasher._connect().execute(
+            'SELECT COUNT(*) FROM slots').fetchone()[0])
+
+    def test_queue_full(self):
+        self.app.config['PASSWORD_POOL_QUEUE'] = 1
+        token = hasher._acquire()
+        try:
+            # slots taken by any worker on the host count against the cap
+            with self.assertRaises(HasherBusy):
+                hasher.generate_password_hash('password123')
+        finally:
+            hasher._release(token)
+        self.assertTrue(hasher.generate_password_hash('password123'))
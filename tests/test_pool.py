@@ -0,0 +1,48 @@
+from sqlalchemy import text
+
+from tests import BaseTestCase
+from app import pool_monitor
+from app.models import db
+from app.pool import TimedQueuePool
+
+
+class PoolMonitorTestCase(BaseTestCase):
+
+    def test_pool_class(self):
+        self.assertIsInstance(db.engine.pool, TimedQueuePool)
+        self.assertEqual(db.engine.pool.size(), 2)
+        timeout = db.session.execute(text('SHOW statement_timeout')).scalar()
+        self.assertEqual(timeout, '10s')
+
+    def test_stats(self):
+        with db.engine.connect():
+            stats = pool_monitor.stats(db.engines)['default']
+            self.assertGreaterEqual(stats['checked_out'], 1)
+        stats = pool_monitor.stats(db.engines)
+        self.assertIn('replica', stats)
+        self.assertGreater(stats['default']['checkouts'], 0)
+        self.assertGreaterEqual(
+            stats['default']['wait_max_ms'], stats['default']['wait_avg_ms'])
+
+    def test_prewarm(self):
+        pool_monitor.prewarm(db.engines, 2)
+        self.assertEqual(db.engines['replica'].pool.checkedout(), 0)
+        self.assertGreaterEqual(db.engines['replica'].pool.checkedin(), 2)
+
+    def test_internal_only(self):
+        client = self.app.test_client()
+        resp = client.get('/_internal/pool')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('checked_out', resp.json['default'])
+
+        resp = client.get('/_internal/pool',
+                          environ_base={'REMOTE_ADDR': '203.0.113.9'})
+        self.assertEqual(resp.status_code, 404)
+
+        self.app.config['INTERNAL_TOKEN'] = 'secret'
+        try:
+            resp = client.get('/_internal/pool', environ_base={'REMOTE_ADDR': '203.0.113.9'},
+                              headers={'X-Internal-Token': 'secret'})
+            self.assertEqual(resp.status_code, 200)
+        finally:
+            self.app.config['INTERNAL_TOKEN'] = None
@@ -1,7 +1,8 @@
 from sqlalchemy.exc import NoResultFound, IntegrityError, DataError
 
 from tests import BaseTestCase, seed_users
-from app.models import User
+from app import last_seen, user_cache
+from app.models import User, db
 
 
 class UserModelTestCase(BaseTestCase):
@@ -59,6 +60,28 @@ class UserModelTestCase(BaseTestCase):
             id=self.public_user1.id, password='Password123')
         self.assertIs(test3, None)
 
+    def test_rehash(self):
+        self.app.config['BCRYPT_LOG_ROUNDS'] = 5
+        try:
+            test1 = User.authenticate(
+                user=self.public_user1, password='Password')
+        finally:
+            self.app.config['BCRYPT_LOG_ROUNDS'] = 4
+        self.assertIs(test1, self.public_user1)
+        self.assertTrue(self.public_user1.password.startswith('$2b$05$'))
+
+        test2 = User.authenticate(
+            user=self.public_user1, password='Password')
+        self.assertIs(test2, self.public_user1)
+
+    def test_last_seen(self):
+        before = self.public_user1.last_login
+        last_seen.record(self.public_user1)
+        last_seen.flush()
+
+        db.session.refresh(self.public_user1)
+        self.assertGreater(self.public_user1.last_login, before)
+
     def test_signup(self):
         # good - unique signup
         test1 = User.signup(
@@ -142,3 +165,47 @@ class UserModelTestCase(BaseTestCase):
         self.public_user2.delete()
         with self.assertRaises(NoResultFound):
             test1 = User.get_by_username(self.public_user2.username)
+
+
+class UserCacheTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+
+    def test_get_user(self):
+        user_cache.cache.clear()
+        user_cache.get_user(self.public_user1.id)
+        db.session.remove()
+
+        hits = user_cache.stats['hits']
+        test1 = user_cache.get_user(self.public_user1.id)
+        self.assertEqual(user_cache.stats['hits'], hits + 1)
+        self.assertEqual(test1.username, self.public_user1.username)
+        self.assertIn(test1, db.session)
+
+    def test_bump(self):
+        user_cache.get_user(self.public_user1.id)
+        self.public_user1.edit(username='2public_user1')
+
+        misses = user_cache.stats['misses']
+        test1 = user_cache.get_user(self.public_user1.id)
+        self.assertEqual(user_cache.stats['misses'], misses + 1)
+        self.assertEqual(test1.username, '2public_user1')
+
+    def test_bump_from_other_worker(self):
+        user_cache.get_user(self.public_user1.id)
+        # another worker's bump only reaches this one through the shared versions file
+        user_cache._connect().execute('INSERT INTO versions (user_id, version) VALUES (?, 1) '
+                                      'ON CONFLICT(user_id) DO UPDATE SET version = version + 1',
+                                      (self.public_user1.id,))
+        misses = user_cache.stats['misses']
+        user_cache.get_user(self.public_user1.id)
+        self.assertEqual(user_cache.stats['misses'], misses + 1)
+
+    def test_deleted_user(self):
+        user_id = self.public_user2.id
+        user_cache.get_user(user_id)
+        self.public_user2.delete()
+        with self.assertRaises(NoResultFound):
+            user_cache.get_user(user_id)
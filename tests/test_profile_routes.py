@@ -31,6 +31,11 @@ class TestWithoutUser(BaseTestCase):
                 'route': '/u/following',
                 'code': 200,
                 'assert': redirect
+            },
+            {
+                'route': '/u/feed',
+                'code': 200,
+                'assert': redirect
             }
         ]
         with self.client as client:
@@ -65,6 +70,16 @@ class TestWithPublicUser(BaseTestCase):
                 'route': '/u/following',
                 'code': 200,
                 'assert': b'<h1>Followed Projects</h1>'
+            },
+            {
+                'route': '/u/feed',
+                'code': 200,
+                'assert': b'<h1>Feed</h1>'
+            },
+            {
+                'route': '/u/feed?cursor=bad',
+                'code': 400,
+                'assert': b''
             }
         ]
         with self.client as client:
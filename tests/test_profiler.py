@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+from collections import Counter
+
+from tests import BaseTestCase, seed_all
+from app import profiler
+from app.profiler import collapsed_stacks
+
+
+class SamplingProfilerTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_all(self)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app.config['PROFILE_DIR'] = self.tmp.name
+        self.app.config['PROFILE_INTERVAL'] = 0.001
+        self.client = self.app.test_client(user=self.public_user1)
+        self.route = f'/p/{self.public_project1.id}'
+
+    def tearDown(self):
+        self.app.config['PROFILE_SAMPLE_RATE'] = 0.0
+        self.app.config['PROFILE_FORMAT'] = 'collapsed'
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_collapsed_stacks(self):
+        samples = Counter({(('main', 'run.py', 1), ('show', 'app/routes.py', 10)): 3})
+        self.assertEqual('main (run.py:1);show (app/routes.py:10) 3\n',
+                         collapsed_stacks(samples))
+
+    def test_token(self):
+        self.client.get(self.route, headers={
+            'X-Profile-Token': profiler.generate_token()})
+        profiles = os.listdir(self.tmp.name)
+        self.assertEqual(1, len(profiles))
+        self.assertTrue(profiles[0].startswith('project.show-'))
+        self.assertTrue(profiles[0].endswith('.collapsed'))
+
+    def test_bad_token(self):
+        self.client.get(self.route, headers={'X-Profile-Token': 'nope'})
+        self.client.get(self.route)
+        self.assertEqual([], os.listdir(self.tmp.name))
+
+    def test_sample_rate(self):
+        self.app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        self.app.config['PROFILE_FORMAT'] = 'speedscope'
+        self.client.get(self.route)
+        profiles = os.listdir(self.tmp.name)
+        self.assertEqual(1, len(profiles))
+        with open(os.path.join(self.tmp.name, profiles[0])) as f:
+            profile = json.load(f)
+        self.assertEqual('sampled', profile['profiles'][0]['type'])
+        self.assertEqual(len(profile['profiles'][0]['samples']),
+                         len(profile['profiles'][0]['weights']))
+
+    def test_prune(self):
+        self.app.config['PROFILE_KEEP'] = 2
+        try:
+            for endpoint in ['a', 'b', 'c']:
+                profiler.write(Counter(), endpoint, 0.01)
+        finally:
+            self.app.config['PROFILE_KEEP'] = 200
+        self.assertEqual(2, len(os.listdir(self.tmp.name)))
+
+    def test_command(self):
+        result = self.app.test_cli_runner().invoke(args=['profile-token'])
+        token = result.output.split()[1]
+        self.assertTrue(profiler.valid_token(token))
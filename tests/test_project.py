@@ -1,7 +1,13 @@
 from sqlalchemy.exc import NoResultFound, IntegrityError, DataError
 
 from tests import BaseTestCase, seed_users, seed_projects
-from app.models import Project, Update, Comment
+from app.models import Project, Update, Comment, db, transaction
+from app.models.projects import ModConflict, ModAddition
+from app.models.images import ProjectPicture
+from app.models.activity import FeedEntry, get_feed_page, sync_materialized_feeds
+from app.models.search import search_projects, search_updates
+from app.models.autocomplete import suggest
+from app.models.counters import recount
 
 
 class ProjectModelTestCase(BaseTestCase):
@@ -33,6 +39,13 @@ class ProjectModelTestCase(BaseTestCase):
         with self.assertRaises(NoResultFound):
             test3 = Project.get_by_id('NOTANID')
 
+    def test_get_for_page(self):
+        test1 = Project.get_for_page(self.public_project1.id)
+        self.assertIs(test1, self.public_project1)
+
+        with self.assertRaises(NoResultFound):
+            test2 = Project.get_for_page('NOTANID')
+
     def test_w2p(self):
         test = self.public_project1.w2p
         self.assertEqual(test, 7.8)
@@ -61,11 +74,50 @@ class ProjectModelTestCase(BaseTestCase):
         with self.assertRaises(IndexError):
             self.public_project2.delete_mod(10)
 
+        # good - expected mod matches
+        self.public_project2.add_mod('Mod1')
+        self.public_project2.add_mod('Mod2')
+        self.public_project2.delete_mod(0, expected='Mod1')
+        self.assertEqual(self.public_project2.mods, ['Mod2'])
+
+        # bad - stale index
+        with self.assertRaises(ModConflict):
+            self.public_project2.delete_mod(0, expected='Mod1')
+        self.assertEqual(self.public_project2.mods, ['Mod2'])
+
     def test_add_follow(self):
         # good
-        self.public_project2.add_follow(self.public_user1)
+        self.assertTrue(self.public_project2.add_follow(self.public_user1))
         self.assertIn(self.public_user1, self.public_project2.followers)
 
+        # good - following again is a no-op
+        self.assertFalse(self.public_project2.add_follow(self.public_user1))
+        self.assertEqual(self.public_project2.follower_count, 1)
+
+    def test_get_followers_page(self):
+        self.public_project2.add_follow(self.public_user1)
+        self.public_project2.add_follow(self.private_user1)
+
+        page1, cursor = self.public_project2.get_followers_page(per_page=1)
+        self.assertEqual([row.username for row in page1], ['public_user1'])
+
+        page2, cursor = self.public_project2.get_followers_page(
+            cursor=cursor, per_page=1)
+        self.assertEqual([row.username for row in page2], ['private_user1'])
+        self.assertIsNone(cursor)
+
+    def test_is_following(self):
+        self.assertFalse(self.public_user1.is_following(self.public_project2))
+        self.public_project2.add_follow(self.public_user1)
+        self.assertTrue(self.public_user1.is_following(self.public_project2))
+
+        test1 = self.public_user1.following_among(
+            [self.public_project1.pk, self.public_project2.pk])
+        self.assertEqual(test1, {self.public_project2.pk})
+
+        self.public_project2.remove_follow(self.public_user1)
+        self.assertFalse(self.public_user1.is_following(self.public_project2))
+
     def test_remove_follow(self):
         # good
         self.public_project2.add_follow(self.public_user1)
@@ -73,9 +125,51 @@ class ProjectModelTestCase(BaseTestCase):
         self.public_project2.remove_follow(self.public_user1)
         self.assertNotIn(self.public_user1, self.public_project2.followers)
 
-        # bad - user not following
-        with self.assertRaises(ValueError):
-            self.public_project2.remove_follow(self.public_user1)
+        # good - removing again is a no-op
+        self.assertFalse(
+            self.public_project2.remove_follow(self.public_user1))
+
+    def test_counters(self):
+        self.assertEqual(self.public_project1.comment_count, 4)
+        self.assertEqual(self.public_project1.update_count, 1)
+        self.assertEqual(self.public_project1.picture_count, 0)
+
+        self.public_project1.add_follow(self.public_user2)
+        self.assertEqual(self.public_project1.follower_count, 1)
+
+        self.public_project1_comment1.delete()
+        self.assertEqual(self.public_project1.comment_count, 3)
+
+        db.session.execute(
+            Project.__table__.update().values(comment_count=0, follower_count=5))
+        recount()
+        self.assertEqual(self.public_project1.comment_count, 3)
+        self.assertEqual(self.public_project1.follower_count, 1)
+
+    def test_cover_picture(self):
+        self.assertIsNone(self.public_project1.cover_picture)
+
+        first = ProjectPicture.create('first.png', self.public_project1, '127.0.0.1')
+        second = ProjectPicture.create('second.jpg', self.public_project1, '127.0.0.1')
+        self.assertIs(self.public_project1.cover_picture, first)
+
+        first.delete()
+        self.assertIs(self.public_project1.cover_picture, second)
+
+        second.delete()
+        self.assertIsNone(self.public_project1.cover_picture_pk)
+
+    def test_get_listing(self):
+        ProjectPicture.create('cover.png', self.public_project1, '127.0.0.1')
+        user_pk = self.public_user1.pk
+        db.session.expunge_all()
+
+        listing = Project.get_listing(user_pk)
+        self.assertTrue(all(project.private.value == 'PUBLIC' for project in listing))
+        self.assertEqual(listing[0].cover_picture.extension, 'png')
+
+        everything = Project.get_listing(user_pk, include_private=True)
+        self.assertGreaterEqual(len(everything), len(listing))
 
     def test_edit(self):
         # good - change name, description
@@ -103,6 +197,27 @@ class ProjectModelTestCase(BaseTestCase):
         with self.assertRaises(AttributeError):
             self.public_project2.edit(bad_param='TestFail')
 
+    def test_transaction(self):
+        # bad - exception rolls back the whole block
+        with self.assertRaises(ValueError):
+            with transaction():
+                self.public_project1.edit(name='RolledBack')
+                raise ValueError()
+        self.assertEqual(self.public_project1.name, 'PublicProject1')
+
+        # good - nested block rolls back to its savepoint only
+        with transaction():
+            self.public_project1.edit(name='Committed')
+            try:
+                with transaction():
+                    self.public_project2.edit(name='RolledBack')
+                    raise ValueError()
+            except ValueError:
+                pass
+        db.session.expire_all()
+        self.assertEqual(self.public_project1.name, 'Committed')
+        self.assertEqual(self.public_project2.name, 'PublicProject2')
+
     def test_delete(self):
         self.public_project1.delete()
         with self.assertRaises(NoResultFound):
@@ -113,6 +228,195 @@ class ProjectModelTestCase(BaseTestCase):
             test1 = Project.get_by_id(self.public_project2.id)
 
 
+class ActivityFeedTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        seed_projects(self)
+        self.public_project1.add_follow(self.public_user2)
+        self.private_project1.add_follow(self.public_user2)
+
+    def test_get_feed_page(self):
+        ProjectPicture.create('car.png', self.public_project1, '127.0.0.1')
+        self.public_project1.add_mod('Turbo')
+
+        rows, cursor = get_feed_page(self.public_user2.pk)
+        self.assertIsNone(cursor)
+        # the private project is followed but not visible
+        self.assertEqual({row.project_pk for row in rows},
+                         {self.public_project1.pk})
+        self.assertEqual(sorted(row.kind for row in rows),
+                         ['mod', 'mod', 'picture', 'update'])
+        self.assertEqual(rows[0].title, 'Turbo')
+        self.assertEqual([row.created_at for row in rows],
+                         sorted((row.created_at for row in rows), reverse=True))
+
+        paged = []
+        cursor = None
+        while True:
+            page, cursor = get_feed_page(
+                self.public_user2.pk, cursor=cursor, per_page=1)
+            paged.extend(page)
+            if not cursor:
+                break
+        self.assertEqual([(row.kind, row.pk) for row in paged],
+                         [(row.kind, row.pk) for row in rows])
+
+        self.assertEqual(get_feed_page(self.public_user1.pk), ([], None))
+        with self.assertRaises(ValueError):
+            get_feed_page(self.public_user2.pk, cursor='bad')
+
+    def test_materialized_feed(self):
+        user_pk = self.public_user2.pk
+        ProjectPicture.create('car.png', self.public_project1, '127.0.0.1')
+        self.public_project1.add_mod('Turbo')
+
+        def pages(materialized):
+            rows, cursor = [], None
+            while True:
+                page, cursor = get_feed_page(
+                    user_pk, cursor=cursor, per_page=1, materialized=materialized)
+                rows.extend((row.kind, row.pk, row.title, row.body, row.project_name) for row in page)
+                if not cursor:
+                    return rows
+
+        self.assertEqual(sync_materialized_feeds(2), ([user_pk], []))
+        self.assertEqual(pages(True), pages(False))
+
+        # later follows, items and unfollows are kept in step by the triggers
+        Update.create(self.public_project2.id, 'Paint', 'Before the follow')
+        self.public_project2.add_follow(self.public_user2)
+        Update.create(self.public_project1.id, 'Dyno', 'After the follow')
+        self.public_project1.add_mod('Intercooler')
+        self.public_project1.delete_mod(len(self.public_project1.mods) - 1, expected='Intercooler')
+        self.assertIn('Before the follow', [row[3] for row in pages(True)])
+        self.assertEqual(pages(True), pages(False))
+
+        self.public_project2.remove_follow(self.public_user2)
+        self.assertEqual(pages(True), pages(False))
+
+        self.assertEqual(sync_materialized_feeds(10), ([], [user_pk]))
+        self.assertEqual(FeedEntry.query.count(), 0)
+
+    def test_deleted_mod_leaves_feed(self):
+        self.public_project1.add_mod('Turbo')
+        self.public_project1.delete_mod(len(self.public_project1.mods) - 1, expected='Turbo')
+
+        rows, _ = get_feed_page(self.public_user2.pk)
+        self.assertNotIn('Turbo', [row.title for row in rows if row.kind == 'mod'])
+        self.assertEqual(ModAddition.query.filter_by(
+            project_pk=self.public_project1.pk, mod='Turbo').count(), 0)
+
+
+class SearchTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        seed_projects(self)
+
+    def test_search_projects(self):
+        rows, cursor = search_projects('mustang')
+        self.assertIsNone(cursor)
+        # PrivateProject1 is also a Mustang but only its owner finds it
+        self.assertEqual([row.name for row in rows], ['PublicProject2'])
+
+        rows, _ = search_projects('mustang', viewer_pk=self.private_user1.pk)
+        self.assertEqual({row.name for row in rows},
+                         {'PublicProject2', 'PrivateProject1'})
+
+        # kept current on write, including mods added with array_append
+        self.public_project1.add_mod('Whipple supercharger')
+        rows, _ = search_projects('supercharger')
+        self.assertEqual([row.name for row in rows], ['PublicProject1'])
+
+        self.assertEqual(search_projects('"no such car"'), ([], None))
+
+    def test_search_ranked_pages(self):
+        self.public_project2.edit(description='Ford Ford Ford')
+        rows, _ = search_projects('ford')
+        self.assertEqual(rows[0].name, 'PublicProject2')
+        self.assertEqual([row.rank for row in rows],
+                         sorted((row.rank for row in rows), reverse=True))
+
+        paged = []
+        cursor = None
+        while True:
+            page, cursor = search_projects('ford', cursor=cursor, per_page=1)
+            paged.extend(page)
+            if not cursor:
+                break
+        self.assertEqual([row.pk for row in paged], [row.pk for row in rows])
+
+        with self.assertRaises(ValueError):
+            search_projects('ford', cursor='bad')
+
+    def test_search_updates(self):
+        Update.create(self.public_project1.id, 'Turbo day', 'Bolted the turbos on')
+        Update.create(self.private_project1.id, 'Turbo', 'Secret turbo')
+
+        rows, _ = search_updates('turbo')
+        self.assertEqual([row.project_name for row in rows], ['PublicProject1'])
+        self.assertEqual(rows[0].title, 'Turbo day')
+
+        # every match is ranked, so an older better match still comes ahead of newer ones
+        Update.create(self.public_project2.id, 'Paint', 'Then the turbo')
+        rows, _ = search_updates('turbo')
+        self.assertEqual([row.title for row in rows], ['Turbo day', 'Paint'])
+
+
+class AutocompleteTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        seed_projects(self)
+
+    def test_suggest(self):
+        # Buick only belongs to a private project
+        self.assertEqual(suggest('makes', 'bu'), [])
+        self.assertEqual(suggest('makes', 'fo'), ['Ford'])
+        self.assertEqual(suggest('models', 'MUS'), ['Mustang'])
+
+        self.public_project1.add_mod('Turbocharger')
+        self.public_project2.add_mod('Turbo timer')
+        self.public_project1.add_mod('Big turbo kit')
+        self.assertEqual(suggest('mods', 'turbo')[:2],
+                         ['Turbo timer', 'Turbocharger'])
+        self.assertIn('Big turbo kit', suggest('mods', 'turbo'))
+
+        # fuzzy matches catch typos
+        self.assertIn('Mustang', suggest('models', 'mustnag'))
+
+        self.assertEqual(suggest('usernames', 'public_'),
+                         ['public_user1', 'public_user2'])
+        self.assertEqual(suggest('usernames', 'private_'), [])
+        # like wildcards in the query are matched literally
+        self.assertEqual(suggest('makes', '%%'), [])
+        self.assertEqual(suggest('makes', 'f'), [])
+        with self.assertRaises(KeyError):
+            suggest('passwords', 'ab')
+
+    def test_suggest_kept_current(self):
+        self.public_project1.add_mod('Turbocharger')
+        self.public_project2.add_mod('Turbocharger')
+        self.public_project1.delete_mod(1)
+        self.assertEqual(suggest('mods', 'turbo'), ['Turbocharger'])
+        self.public_project2.delete_mod(1)
+        self.assertEqual(suggest('mods', 'turbo'), [])
+
+        # Ford stays while any public project has it
+        self.public_project1.edit(private='PRIVATE')
+        self.assertEqual(suggest('makes', 'fo'), ['Ford'])
+        self.public_project2.edit(make='Dodge')
+        self.assertEqual(suggest('makes', 'fo'), [])
+        self.assertEqual(suggest('makes', 'do'), ['Dodge'])
+
+        self.private_project2.edit(private='PUBLIC')
+        self.assertEqual(suggest('makes', 'bu'), ['Buick'])
+
+
 class UpdateModelTestCase(BaseTestCase):
 
     def setUp(self):
@@ -151,6 +455,45 @@ class UpdateModelTestCase(BaseTestCase):
         update.delete()
         self.assertNotIn(update, self.public_project1.updates)
 
+    def test_create_many(self):
+        updates = Update.create_many([
+            {'project_id': self.public_project1.id,
+                'title': '', 'content': 'This is update 1'},
+            {'project_id': self.public_project1.id,
+                'title': '', 'content': 'This is update 2'},
+        ])
+        for update in updates:
+            self.assertIn(update, self.public_project1.updates)
+
+        # bad - one failing row rolls back the batch
+        with self.assertRaises(NoResultFound):
+            Update.create_many([
+                {'project_id': self.public_project1.id,
+                    'title': '', 'content': 'This is update 3'},
+                {'project_id': 'NOTANID', 'title': '', 'content': 'This is update 4'},
+            ])
+        self.assertEqual(self.public_project1.update_count, 3)
+
+        Update.delete_many(updates)
+        self.assertEqual(self.public_project1.update_count, 1)
+
+    def test_get_page(self):
+        update = Update.create(project_id=self.public_project1.id,
+                               title='', content='This is a newer update')
+
+        page1, cursor = Update.get_page(self.public_project1.pk, per_page=1)
+        self.assertEqual(page1, [update])
+        self.assertIsNotNone(cursor)
+
+        page2, cursor = Update.get_page(
+            self.public_project1.pk, cursor=cursor, per_page=1)
+        self.assertEqual(page2, [self.public_project1_update])
+        self.assertIsNone(cursor)
+
+        # bad - malformed cursor
+        with self.assertRaises(ValueError):
+            Update.get_page(self.public_project1.pk, cursor='NOTACURSOR')
+
 
 class CommentModelTestCase(BaseTestCase):
 
@@ -1,4 +1,11 @@
+import io
+import os
+
 from flask import g
+from PIL import Image, UnidentifiedImageError
+
+from app import feed_cache
+from app.models.images import ProjectPicture
 from tests import BaseTestCase, seed_all
 
 
@@ -24,14 +31,6 @@ class TestWithoutUser(BaseTestCase):
                 'route': f'/p/{self.public_project1.id}/edit',
                 'code': 403,
                 'assert': b'',
-            }, {
-                'route': f'/p/{self.public_project1.id}/add-follow',
-                'code': 200,
-                'assert': redirect,
-            }, {
-                'route': f'/p/{self.public_project1.id}/remove-follow',
-                'code': 200,
-                'assert': redirect,
             }, {
                 'route': f'/p/{self.private_project1.id}',
                 'code': 403,
@@ -40,19 +39,42 @@ class TestWithoutUser(BaseTestCase):
                 'route': f'/p/{self.private_project1.id}/edit',
                 'code': 403,
                 'assert': b'',
+            },
+        ]
+        with self.client as client:
+            for test in test_data:
+                self.check_get_request(client, test['route'], test)
+
+    def test_follow(self):
+        redirect = b'alert-message">Please log in to access this page.</div>'
+        test_data = [
+            {
+                'route': f'/p/{self.public_project1.id}/add-follow',
+                'data': {},
+                'code': 200,
+                'assert': redirect,
+            }, {
+                'route': f'/p/{self.public_project1.id}/remove-follow',
+                'data': {},
+                'code': 200,
+                'assert': redirect,
             }, {
                 'route': f'/p/{self.private_project1.id}/add-follow',
+                'data': {},
                 'code': 403,
                 'assert': b'',
             }, {
                 'route': f'/p/{self.private_project1.id}/remove-follow',
+                'data': {},
                 'code': 403,
                 'assert': b'',
             },
         ]
         with self.client as client:
             for test in test_data:
-                self.check_get_request(client, test['route'], test)
+                self.check_post_request(client, test['route'], test)
+                # following changes state, so a link or prefetch must not trigger it
+                self.assertEqual(client.get(test['route']).status_code, 405)
 
     def test_new(self):
         test_data = [
@@ -327,6 +349,30 @@ class TestWithPublicUser(BaseTestCase):
             for test in test_data:
                 self.check_get_request(client, test['route'], test)
 
+    def test_follow(self):
+        first_page = (self.public_user1.pk, None, feed_cache.per_page)
+        with self.client as client:
+            route = f'/p/{self.public_project2.id}/add-follow'
+            feed_cache.cache.set(first_page, ([], None))
+            client.post(route)
+            self.assertIsNone(feed_cache.cache.get(first_page))
+
+            headers = {'Accept': 'application/json'}
+            for _ in range(2):
+                resp = client.post(route, headers=headers)
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.json, {'following': True, 'followers': 1})
+
+            resp = client.post(
+                f'/p/{self.public_project2.id}/remove-follow', headers=headers)
+            self.assertEqual(resp.json, {'following': False, 'followers': 0})
+
+            # axios' default Accept header also accepts html
+            resp = client.post(route, headers={'Accept': 'application/json, text/plain, */*'})
+            self.assertEqual(resp.json, {'following': True, 'followers': 1})
+            resp = client.post(route, headers={'Accept': 'text/html,application/xhtml+xml,*/*;q=0.8'})
+            self.assertEqual(resp.status_code, 302)
+
     def test_new(self):
         test_data = [
             {
@@ -665,6 +711,26 @@ class TestWithPublicUser(BaseTestCase):
                           self.private_project2.comments)
 
 
+    def test_add_picture_rollback(self):
+        path = os.path.join(self.app.config['UPLOAD_FOLDER'], 'project_pictures')
+        os.makedirs(os.path.join(path, 'thumbnails'), exist_ok=True)
+        before = set(os.listdir(path)) | set(os.listdir(os.path.join(path, 'thumbnails')))
+
+        png = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(png, 'PNG')
+        png.seek(0)
+        data = {'file': [(png, 'good.png'), (io.BytesIO(b'not an image'), 'bad.png')]}
+        with self.assertRaises(UnidentifiedImageError):
+            self.client.post(f'/p/{self.public_project1.id}/add-picture', data=data,
+                             content_type='multipart/form-data')
+
+        # the good picture's row and files go with the failed batch
+        self.assertEqual(ProjectPicture.query.filter_by(
+            project_pk=self.public_project1.pk).count(), 0)
+        after = set(os.listdir(path)) | set(os.listdir(os.path.join(path, 'thumbnails')))
+        self.assertEqual(before, after)
+
+
 class TestWithPrivateUser(BaseTestCase):
     def setUp(self):
         super().setUp()
@@ -0,0 +1,74 @@
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+from app import query_counter
+from app.models import db
+from app.queries import TooManyQueries, statement_shape
+from tests import BaseTestCase, seed_all
+
+
+class QueryCounterTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_all(self)
+        self.client = self.app.test_client(user=self.public_user1)
+
+    def tearDown(self):
+        self.app.config['QUERY_COUNT_LIMIT'] = 100
+        self.app.config['QUERY_REPEAT_LIMIT'] = 10
+        super().tearDown()
+
+    def test_statement_shape(self):
+        self.assertEqual(statement_shape('SELECT  *\n FROM users WHERE pk IN (%(pk_1_1)s, %(pk_1_2)s)'),
+                         'SELECT * FROM users WHERE pk IN (...)')
+        self.assertEqual(statement_shape('SELECT * FROM users WHERE pk IN (%(pk_1_1)s)'),
+                         statement_shape('SELECT * FROM users WHERE pk IN (%(pk_1_1)s, %(pk_1_2)s, %(pk_1_3)s)'))
+
+    def test_capture(self):
+        with query_counter.capture() as stats:
+            for _ in range(3):
+                db.session.execute(text('SELECT 1'))
+        self.assertEqual(3, stats.count)
+        self.assertEqual([('SELECT 1', 3)], stats.repeated(2))
+        self.assertGreater(stats.duration, 0)
+
+    def test_failed_statement(self):
+        with query_counter.capture() as stats:
+            with self.assertRaises(ProgrammingError):
+                db.session.execute(text('SELECT * FROM no_such_table'))
+            db.session.rollback()
+            db.session.execute(text('SELECT 1'))
+        self.assertEqual(['SELECT 1'], stats.statements)
+
+    def test_request_stats(self):
+        self.client.get(f'/p/{self.public_project1.id}')
+        self.assertGreater(g._query_stats.count, 0)
+
+    def test_count_limit(self):
+        self.app.config['QUERY_COUNT_LIMIT'] = 0
+        with self.assertRaises(TooManyQueries):
+            self.client.get(f'/p/{self.public_project1.id}')
+
+    def test_repeat_limit(self):
+        self.app.config['QUERY_REPEAT_LIMIT'] = 0
+        with self.assertRaises(TooManyQueries):
+            self.client.get(f'/p/{self.public_project1.id}')
+
+    def test_warns(self):
+        self.app.config['QUERY_LIMITS_RAISE'] = False
+        self.app.config['QUERY_COUNT_LIMIT'] = 0
+        try:
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                resp = self.client.get(f'/p/{self.public_project1.id}')
+        finally:
+            self.app.config['QUERY_LIMITS_RAISE'] = True
+        self.assertEqual(200, resp.status_code)
+        self.assertIn('project.show', logs.output[0])
+
+    def test_page_queries(self):
+        # bounded regardless of how many rows the seed data puts on each page
+        for route in ['/', f'/p/{self.public_project1.id}', f'/u/{self.public_user1.username}', '/u/following', '/u/feed']:
+            with self.assertMaxQueries(15):
+                self.client.get(route)
@@ -32,6 +32,31 @@ class TestWithoutUser(BaseTestCase):
                 'code': 200,
                 'assert': redirect
             },
+            {
+                'route': '/search?q=publicproject1',
+                'code': 200,
+                'assert': b'>PublicProject1</a>'
+            },
+            {
+                'route': '/search?q=privateproject1',
+                'code': 200,
+                'assert': b'No projects match'
+            },
+            {
+                'route': '/search?q=mustang&type=nothing',
+                'code': 400,
+                'assert': b''
+            },
+            {
+                'route': '/autocomplete/makes?q=fo',
+                'code': 200,
+                'assert': b'"suggestions":["Ford"]'
+            },
+            {
+                'route': '/autocomplete/passwords?q=fo',
+                'code': 404,
+                'assert': b''
+            },
         ]
         with self.client as client:
             for test in test_data:
@@ -0,0 +1,60 @@
+from tests import BaseTestCase, seed_users, seed_projects
+from app.models import db, Project
+from app.models.routing import PRIMARY_UNTIL_KEY, replica_lag
+
+
+class RoutingSessionTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        seed_projects(self)
+        self.primary = db.engines[None]
+        self.replica = db.engines['replica']
+        replica_lag.reset()
+
+    def tearDown(self):
+        self.app.config['REPLICA_MAX_LAG'] = 5
+        replica_lag.reset()
+        super().tearDown()
+
+    def test_binds(self):
+        self.assertIsNot(self.primary, self.replica)
+        # outside a request everything uses the primary
+        self.assertIs(db.session.get_bind(Project.__mapper__), self.primary)
+
+    def test_get_reads_replica(self):
+        with self.app.test_request_context('/', method='GET'):
+            self.assertIs(db.session.get_bind(Project.__mapper__), self.replica)
+        with self.app.test_request_context('/', method='HEAD'):
+            self.assertIs(db.session.get_bind(Project.__mapper__), self.replica)
+        with self.app.test_request_context('/', method='POST'):
+            self.assertIs(db.session.get_bind(Project.__mapper__), self.primary)
+
+    def test_read_your_writes(self):
+        with self.app.test_request_context('/', method='GET'):
+            from flask import session
+            # a write made while handling a GET goes to the primary and pins later reads to it
+            self.public_project1.add_mod('Intake')
+            self.assertIn(PRIMARY_UNTIL_KEY, session)
+            self.assertIs(db.session.get_bind(Project.__mapper__), self.primary)
+            self.assertIn('Intake', self.public_project1.mods)
+
+    def test_lagging_replica(self):
+        self.app.config['REPLICA_MAX_LAG'] = -1
+        with self.app.test_request_context('/', method='GET'):
+            self.assertIs(db.session.get_bind(Project.__mapper__), self.primary)
+
+    def test_routes(self):
+        client = self.app.test_client(user=self.public_user1)
+        resp = client.get(f'/p/{self.public_project1.id}')
+        self.assertEqual(resp.status_code, 200)
+        with client.session_transaction() as session:
+            self.assertNotIn(PRIMARY_UNTIL_KEY, session)
+
+        client.post(f'/p/{self.public_project1.id}/add-mod',
+                    data={'mod': 'Headers'})
+        with client.session_transaction() as session:
+            self.assertIn(PRIMARY_UNTIL_KEY, session)
+        resp = client.get(f'/p/{self.public_project1.id}')
+        self.assertIn(b'Headers', resp.data)
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+from sqlalchemy import text
+
+from tests import BaseTestCase, seed_users
+from app import slow_query_log
+from app.models import db
+from app.slow_queries import redact
+
+
+class SlowQueryLogTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        seed_users(self)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app.config['SLOW_QUERY_LOG_ENABLED'] = True
+        self.app.config['SLOW_QUERY_THRESHOLD'] = 20
+        self.app.config['SLOW_QUERY_EXPLAIN_RATE'] = 0.0
+        self.app.config['SLOW_QUERY_LOG_FILE'] = os.path.join(
+            self.tmp.name, 'slow.log')
+
+    def tearDown(self):
+        self.app.config['SLOW_QUERY_LOG_ENABLED'] = False
+        self.app.config['ADMIN_USERNAMES'] = ()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_redact(self):
+        self.assertEqual(redact({'username': 'public_user1', 'pk': 3, 'bio': None}),
+                         {'username': '<str>', 'pk': '<int>', 'bio': None})
+        self.assertEqual(redact([{'pk': 1}, {'pk': 2}]),
+                         [{'pk': '<int>'}, {'pk': '<int>'}])
+
+    def test_threshold(self):
+        db.session.execute(text('SELECT 1'))
+        db.session.execute(text('SELECT pg_sleep(:seconds)'), {'seconds': 0.05})
+        entries = slow_query_log.entries()
+        self.assertEqual(1, len(entries))
+        self.assertIn('pg_sleep', entries[0]['statement'])
+        self.assertEqual({'seconds': '<float>'}, entries[0]['parameters'])
+        self.assertGreaterEqual(entries[0]['duration_ms'], 50)
+        self.assertIsNone(entries[0]['plan'])
+        self.assertIsNone(entries[0]['route'])
+
+    def test_explain(self):
+        self.app.config['SLOW_QUERY_EXPLAIN_RATE'] = 1.0
+        db.session.execute(text('SELECT pg_sleep(0.05)'))
+        plan = slow_query_log.entries()[0]['plan']
+        self.assertIn('Plan', plan[0])
+        self.assertIn('Shared Hit Blocks', plan[0]['Plan'])
+        # the caller's transaction is still usable after the explain
+        self.assertEqual(1, db.session.execute(text('SELECT 1')).scalar())
+
+    def test_disabled(self):
+        self.app.config['SLOW_QUERY_LOG_ENABLED'] = False
+        db.session.execute(text('SELECT pg_sleep(0.05)'))
+        self.assertEqual([], slow_query_log.entries())
+
+    def test_route(self):
+        self.app.config['SLOW_QUERY_THRESHOLD'] = 0
+        client = self.app.test_client(user=self.public_user1)
+        self.assertEqual(404, client.get('/_internal/slow-queries').status_code)
+
+        self.app.config['ADMIN_USERNAMES'] = (self.public_user1.username,)
+        client.get(f'/u/{self.public_user1.username}')
+        entry = slow_query_log.entries()[0]
+        self.assertIn('(profile.show)', entry['route'])
+        self.assertTrue(entry['call_site'].startswith('app/'))
+
+        resp = client.get('/_internal/slow-queries')
+        self.assertEqual(200, resp.status_code)
+        self.assertIn(b'<h1>Slow queries</h1>', resp.data)
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+from tests import BaseTestCase
+from app import throttle
+
+
+class LoginThrottleTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app.config['LOGIN_THROTTLE_ENABLED'] = True
+        self.app.config['LOGIN_THROTTLE_DB'] = os.path.join(
+            self.tmp.name, 'throttle.sqlite3')
+        self.app.config['LOGIN_THROTTLE_IP_LIMIT'] = (3, 60)
+        self.app.config['LOGIN_THROTTLE_USER_LIMIT'] = (2, 60)
+
+    def tearDown(self):
+        self.app.config['LOGIN_THROTTLE_ENABLED'] = False
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_username_limit(self):
+        self.assertTrue(throttle.allow(ip='10.0.0.1', username='user1'))
+        self.assertTrue(throttle.allow(ip='10.0.0.2', username='User1'))
+        self.assertFalse(throttle.allow(ip='10.0.0.3', username='user1'))
+        self.assertTrue(throttle.allow(ip='10.0.0.3', username='user2'))
+
+    def test_ip_limit(self):
+        for username in ['user1', 'user2', 'user3']:
+            self.assertTrue(throttle.allow(ip='10.0.0.1', username=username))
+        self.assertFalse(throttle.allow(ip='10.0.0.1', username='user4'))
+
+    def test_counters(self):
+        throttle.allow(ip='10.0.0.1', username='user1')
+        throttle.allow(ip='10.0.0.1', username='user1')
+        throttle.allow(ip='10.0.0.1', username='user1')
+        self.assertEqual(throttle.counters, {'accepted': 2, 'rejected': 1})
+
+    def test_login_route(self):
+        data = {'username': 'user1', 'password': 'Password'}
+        with self.app.test_client() as client:
+            client.post('/login', data=data)
+            client.post('/login', data=data)
+            resp = client.post('/login', data=data)
+        self.assertEqual(resp.status_code, 429)